@@ -1,24 +1,92 @@
 import streamlit as st
-import gspread
 import os
 from datetime import datetime
 import glob
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-import pandas as pd
-import io
 import json
 import tempfile
 import requests
 import concurrent.futures
 import threading
+import hmac
+import hashlib
+
+from registros import RegistroPlaca, obtener_esquema, medir_memoria_resultados, ordenar_por_fecha, periodo_marcas, filtrar_periodo
+from indice_placas import ultimo_por_placa, normalizar_placa
+from duplicados import consolidar_duplicados
+from servicio_indice import ServicioIndice, RUTA_INSTANTANEA
+from perfilado import perfilar
+from instantanea_columnar import exportar_instantanea
+from cache_resultados import CacheResultados, clave_consulta, version_hojas
+from particiones import inicio_mes
+from planificador import MAX_RESULTADOS, planificar
+from exportacion_zip import MAX_REGISTROS_ZIP, crear_excel, datos_excel, exportar_zip
+from cliente_sheets_async import conectar_sheets
+
+# Registros del historial que se traen cada vez que se pide ver más
+TAMANO_PAGINA_HISTORIAL = 20
+
+# Token para las herramientas de administración (?admin=<token> en la URL); sin token quedan desactivadas
+TOKEN_ADMIN = os.environ.get('RRV_ADMIN_TOKEN')
+
+# API de RRVSAC (se puede apuntar a un servidor de prueba, ver prueba_carga.py)
+URL_API_RRVSAC = os.environ.get('RRV_API_URL', 'https://plataforma.rrvsac.com/api/vehicles')
+
+# Períodos de la búsqueda por placa: meses hacia atrás (contando el actual), None para todo o 'rango' para elegir fechas
+PERIODOS = {
+    "Todo el historial": None,
+    "Últimos 3 meses": 3,
+    "Últimos 6 meses": 6,
+    "Último año": 12,
+    "Rango de fechas": 'rango'
+}
+
+@st.cache_resource
+def obtener_servicio_indice(credenciales_path):
+    """Un solo índice de placas por proceso, compartido por todas las sesiones y precargado en segundo plano"""
+    return ServicioIndice(credenciales_path).iniciar()
+
+@st.cache_resource
+def obtener_cliente_sheets(credenciales_path):
+    """Un solo cliente de Google Sheets por proceso para las búsquedas sin índice y el perfilado
+
+    La app se vuelve a crear en cada rerun: un cliente por rerun dejaría abiertos su hilo y su sesión HTTP.
+    """
+    return conectar_sheets(credenciales_path)
+
+@st.cache_resource
+def obtener_cache_resultados():
+    """Un solo caché de búsquedas por proceso, compartido por todas las sesiones"""
+    return CacheResultados()
+
+def archivo_credenciales(credenciales):
+    """Archivo con las credenciales de st.secrets: la ruta depende solo del contenido y se escribe una vez
+    
+    Así la ruta (clave de obtener_servicio_indice) es la misma en cada rerun y no se crea un archivo por rerun.
+    """
+    contenido = json.dumps(credenciales, sort_keys=True)
+    huella = hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+    ruta = os.path.join(tempfile.gettempdir(), f"rrv_credenciales_{huella}.json")
+    if not os.path.exists(ruta):
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    return ruta
 
 class BuscadorPlacasWeb:
     def __init__(self):
         self.gc = None
         self.credenciales_path = None
+        self.cache = obtener_cache_resultados()
         if 'resultados_actuales' not in st.session_state:
             st.session_state.resultados_actuales = []
+            # Último registro de cada placa encontrada y la consulta que los produjo (para traer el historial al pedirlo):
+            # ('placas', (claves, periodo, amplia)), ('campos', (filtros, desde, hasta)) o None si los registros ya están completos
+            st.session_state.estado_actual = []
+            st.session_state.consulta_actual = None
+            st.session_state.total_registros = 0
+            st.session_state.limite_historial = TAMANO_PAGINA_HISTORIAL
         self.detectar_credenciales()
     
     def detectar_credenciales(self):
@@ -26,11 +94,9 @@ class BuscadorPlacasWeb:
         # Primero intentar desde Streamlit secrets (para producción en Streamlit Cloud)
         try:
             if hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
-                # Crear archivo temporal con las credenciales
+                # Archivo fijo por contenido con las credenciales (el servicio del índice se cachea por su ruta)
                 credentials = dict(st.secrets['gcp_service_account'])
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                    json.dump(credentials, f)
-                    self.credenciales_path = f.name
+                self.credenciales_path = archivo_credenciales(credentials)
                 return
         except Exception:
             pass
@@ -46,29 +112,52 @@ class BuscadorPlacasWeb:
             if not self.credenciales_path or not os.path.exists(self.credenciales_path):
                 raise FileNotFoundError("Archivo de conexión no encontrado")
             
-            self.gc = gspread.service_account(filename=self.credenciales_path)
+            self.gc = obtener_cliente_sheets(self.credenciales_path)
             return True
         except Exception as e:
             st.error(f"Error de conexión: {str(e)}")
             return False
     
-    def buscar_placas_en_drive(self, placa_buscar):
-        """Busca una placa en todas las hojas RRV"""
+    def buscar_placas_en_drive(self, placa_buscar, usar_cache=True, limite=None, periodo=None):
+        """Busca una placa en todas las hojas RRV: (registros del más reciente al más antiguo, total de coincidencias)
+        
+        Con período solo cuentan los registros de esas fechas. Con límite, si coinciden más de `limite` placas
+        (consulta muy amplia) solo se devuelven los `limite` registros más recientes, sin ordenar el resto;
+        una sola placa con mucho historial se devuelve completa.
+        Si ninguna hoja RRV cambió desde una búsqueda igual, devuelve sus resultados sin volver a recorrerlas
+        (usar_cache=False fuerza el recorrido, por ejemplo para perfilarlo).
+        """
         if not self.gc:
             if not self.conectar_google_sheets():
-                return []
+                return [], 0
         
         try:
             with st.spinner('Buscando en Google Sheets...'):
-                todas_las_hojas = self.gc.openall()
-                hojas_rrv = [hoja for hoja in todas_las_hojas if "RRV" in hoja.title]
+                consulta = (clave_consulta(placa_buscar), limite, periodo)
+                hojas_rrv = None
+                version = self.cache.version_vigente() if usar_cache else None
+                if version is None:
+                    hojas_rrv = [hoja for hoja in self.gc.openall() if "RRV" in hoja.title]
+                    version = version_hojas(hojas_rrv)
+                    self.cache.recordar_version(version)
+                if usar_cache and version is not None:
+                    guardados = self.cache.obtener(consulta, version)
+                    if guardados is not None:
+                        return guardados
+                if hojas_rrv is None:
+                    hojas_rrv = [hoja for hoja in self.gc.openall() if "RRV" in hoja.title]
+                    version = version_hojas(hojas_rrv)
+                    self.cache.recordar_version(version)
                 
                 if not hojas_rrv:
                     st.warning("No se encontraron hojas con 'RRV' en el nombre")
-                    return []
+                    return [], 0
                 
                 resultados = []
                 progress_bar = st.progress(0)
+                # Con el cliente asíncrono todas las pestañas se descargan a la vez antes de recorrerlas
+                if hasattr(self.gc, 'precargar'):
+                    self.gc.precargar(hojas_rrv)
                 
                 for idx, hoja in enumerate(hojas_rrv):
                     try:
@@ -87,6 +176,7 @@ class BuscadorPlacasWeb:
                                     filas_datos, encabezados, placa_buscar, hoja.title, worksheet.title
                                 )
                                 
+                                filas_encontradas = filtrar_periodo(filas_encontradas, periodo)
                                 if filas_encontradas:
                                     resultados.extend(filas_encontradas)
                                     
@@ -99,155 +189,63 @@ class BuscadorPlacasWeb:
                     progress_bar.progress((idx + 1) / len(hojas_rrv))
                 
                 progress_bar.empty()
-                return resultados
+                # Un solo registro por servicio aunque esté copiado en varias hojas o pestañas
+                resultados = consolidar_duplicados(resultados)
+                total = len(resultados)
+                amplia = limite and len({normalizar_placa(registro.placa) for registro in resultados}) > limite
+                resultados = self.ordenar_resultados_cronologicamente(resultados, limite if amplia else None)
+                self.cache.guardar(consulta, version, resultados, total)
+                return resultados, total
                 
         except Exception as e:
             st.error(f"Error durante la búsqueda: {str(e)}")
-            return []
+            return [], 0
     
     def buscar_placa_en_hoja(self, filas_datos, encabezados, placa_buscar, nombre_spreadsheet, nombre_worksheet):
         """Busca una placa en una hoja específica"""
         resultados = []
         
-        # Buscar columnas de placa
-        columnas_placa = []
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if any(palabra in encabezado_lower for palabra in ['placa', 'patente', 'matricula', 'vehiculo', 'numero de vehiculo']):
-                columnas_placa.append(i)
-        
-        if not columnas_placa:
-            columnas_placa = list(range(min(3, len(encabezados))))
+        # Un solo esquema por pestaña: encabezados internados y columnas clave ya resueltas
+        esquema = obtener_esquema(encabezados)
+        placa_buscar = placa_buscar.upper()
         
         # Buscar la placa
         for num_fila, fila in enumerate(filas_datos, start=2):
-            for col_placa in columnas_placa:
+            for col_placa in esquema.columnas_placa:
                 if col_placa < len(fila):
                     valor_celda = str(fila[col_placa]).strip()
-                    if placa_buscar.upper() in valor_celda.upper():
-                        # Encontrar columnas específicas
-                        fecha_col = self.encontrar_columna_fecha(encabezados)
-                        proyecto_col = self.encontrar_columna_proyecto(encabezados)
-                        empresa_col = self.encontrar_columna_empresa(encabezados)
-                        sistema_col = self.encontrar_columna_sistema(encabezados)
-                        trabajo_col = self.encontrar_columna_trabajo(encabezados)
-                        
-                        resultado = {
-                            'hoja': nombre_spreadsheet,
-                            'pestana': nombre_worksheet,
-                            'fila': num_fila,
-                            'placa': valor_celda,
-                            'fecha': fila[fecha_col] if fecha_col < len(fila) else "No disponible",
-                            'proyecto': fila[proyecto_col] if proyecto_col < len(fila) else "No disponible",
-                            'empresa': fila[empresa_col] if empresa_col < len(fila) else "No disponible",
-                            'sistema': fila[sistema_col] if sistema_col < len(fila) else "No disponible",
-                            'trabajo': fila[trabajo_col] if trabajo_col < len(fila) else "No disponible",
-                            'datos_completos': fila,
-                            'encabezados': encabezados
-                        }
-                        resultados.append(resultado)
+                    if placa_buscar in valor_celda.upper():
+                        resultados.append(RegistroPlaca(
+                            esquema, nombre_spreadsheet, nombre_worksheet, num_fila, col_placa, fila
+                        ))
                         break
         
         return resultados
     
-    def encontrar_columna_fecha(self, encabezados):
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if any(palabra in encabezado_lower for palabra in ['fecha', 'date', 'dia', 'hora', 'fecha de ingreso']):
-                return i
-        return 1 if len(encabezados) > 1 else 0
-    
-    def encontrar_columna_proyecto(self, encabezados):
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if 'proyecto' in encabezado_lower:
-                return i
-        return 2 if len(encabezados) > 2 else 0
-    
-    def encontrar_columna_empresa(self, encabezados):
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if any(palabra in encabezado_lower for palabra in ['empresa', 'nombre', 'cliente']):
-                return i
-        return 3 if len(encabezados) > 3 else 0
-    
-    def encontrar_columna_sistema(self, encabezados):
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if 'sistema' in encabezado_lower:
-                return i
-        return 4 if len(encabezados) > 4 else 0
-    
-    def encontrar_columna_trabajo(self, encabezados):
-        for i, encabezado in enumerate(encabezados):
-            encabezado_lower = str(encabezado).lower()
-            if any(palabra in encabezado_lower for palabra in ['tipo de trabajo', 'estado', 'status', 'situacion', 'condicion']):
-                return i
-        return 5 if len(encabezados) > 5 else 0
-    
-    def ordenar_resultados_cronologicamente(self, resultados):
-        """Ordena los resultados por fecha de manera cronológica"""
-        def parsear_fecha(fecha_str):
-            """Intenta parsear diferentes formatos de fecha"""
-            if not fecha_str or fecha_str == "No disponible":
-                return datetime.min
-            
-            fecha_str = str(fecha_str).strip()
-            
-            # Limpiar la fecha de caracteres extra
-            fecha_str = fecha_str.replace('  ', ' ').strip()
-            
-            # Formatos comunes de fecha (ordenados de más específico a más general)
-            formatos = [
-                '%d/%m/%Y %H:%M:%S',
-                '%d/%m/%Y %H:%M',
-                '%d/%m/%Y',
-                '%Y-%m-%d %H:%M:%S',
-                '%Y-%m-%d %H:%M',
-                '%Y-%m-%d',
-                '%d-%m-%Y %H:%M:%S',
-                '%d-%m-%Y %H:%M',
-                '%d-%m-%Y',
-                '%m/%d/%Y %H:%M:%S',
-                '%m/%d/%Y %H:%M',
-                '%m/%d/%Y',
-                '%d/%m/%y %H:%M:%S',
-                '%d/%m/%y %H:%M',
-                '%d/%m/%y',
-                '%d.%m.%Y %H:%M:%S',
-                '%d.%m.%Y %H:%M',
-                '%d.%m.%Y'
-            ]
-            
-            for formato in formatos:
-                try:
-                    return datetime.strptime(fecha_str, formato)
-                except ValueError:
-                    continue
-            
-            # Si no se puede parsear, intentar con dateutil
-            try:
-                from dateutil import parser
-                return parser.parse(fecha_str)
-            except:
-                pass
-            
-            # Si no se puede parsear, devolver fecha mínima
-            return datetime.min
+    def buscar_placas(self, indice, placa_buscar, limite=MAX_RESULTADOS, periodo=None):
+        """Busca en el índice de placas si ya está disponible; si no, recorre las hojas en Google Sheets
         
-        # Ordenar por fecha (más reciente primero)
-        resultados_ordenados = sorted(
-            resultados, 
-            key=lambda x: parsear_fecha(x['fecha']), 
-            reverse=True
-        )
-        
-        return resultados_ordenados
+        Devuelve (placas, registros, total): con índice solo las placas encontradas (los registros se traen
+        al pedir el historial y el total es None); sin índice, los `limite` registros más recientes del
+        período ya ordenados y el total de coincidencias.
+        """
+        if indice is None:
+            return (None,) + self.buscar_placas_en_drive(placa_buscar, limite=limite, periodo=periodo)
+        return indice.buscar_claves(placa_buscar), None, None
+    
+    def buscar_placas_aproximadas(self, indice, placa_buscar):
+        """Busca placas parecidas a la ingresada (confusiones O/0, I/1, B/8, S/5 o un carácter de diferencia)"""
+        candidatas = indice.buscar_aproximada(placa_buscar)
+        return candidatas, [clave for clave, _, _ in candidatas]
+    
+    def ordenar_resultados_cronologicamente(self, resultados, limite=None):
+        """Ordena los resultados por fecha de manera cronológica (más reciente primero)"""
+        return ordenar_por_fecha(resultados, limite)
     
     def consultar_api_rrvsac(self, placa):
         """Consulta la API de RRVSAC para verificar el estado de una placa"""
         try:
-            url = 'https://plataforma.rrvsac.com/api/vehicles'
+            url = URL_API_RRVSAC
             params = {'search.info.license_plate': placa.strip()}
             headers = {
                 'authenticate': 'e843453d60c9b826ed4704f77a88ab6fb4bcb9cd88b2ce25e600cd5b',
@@ -280,100 +278,441 @@ class BuscadorPlacasWeb:
     def crear_excel_bytes(self, resultado):
         """Crea un archivo Excel en memoria y devuelve los bytes"""
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = f"Placa {resultado['placa']}"
+            return crear_excel(datos_excel(resultado))
+        except Exception as e:
+            st.error(f"Error al crear archivo Excel: {str(e)}")
+            return None
+
+def leer_indice(servicio, funcion, *args):
+    """Ejecuta una lectura de los índices con lock_datos tomado: la ingesta modifica sus diccionarios en el lugar"""
+    with servicio.lock_datos:
+        return funcion(*args)
+
+def estado_placas(indice, placas, periodo=None):
+    """(plan, estado actual, total de registros) de las placas encontradas; se llama con lock_datos tomado"""
+    # Una consulta muy amplia ("1", "A") no se arma completa: solo las placas más recientes. El total se cuenta
+    # igual con el período y sin copias, con las ubicaciones y las marcas (sin leer filas)
+    plan = planificar(placas)
+    limite = plan.limite if plan.amplia else None
+    return plan, indice.estado_actual(placas, periodo, limite), indice.contar_registros(placas, periodo)
+
+def buscar_en_indice(servicio, placa_buscar, periodo=None):
+    """Busca en el índice y arma el estado actual de las placas, con el caché de búsquedas
+    
+    Se llama con el índice ya disponible; devuelve (placas, plan, estado actual, total de registros). Los
+    resultados se guardan con la generación del servicio como versión: sirven hasta que se cargue otro
+    índice o se aplique una edición.
+    """
+    cache = obtener_cache_resultados()
+    consulta = ('indice', clave_consulta(placa_buscar), periodo)
+    with servicio.lock_datos:
+        indice = servicio.indice_actual()
+        version = ('indice', servicio.generacion)
+        guardados = cache.obtener(consulta, version)
+        if guardados is not None:
+            estado_actual, (placas, plan, total_registros) = guardados
+            return placas, plan, estado_actual, total_registros
+        
+        placas = indice.buscar_claves(placa_buscar)
+        plan, estado_actual, total_registros = estado_placas(indice, placas, periodo)
+        cache.guardar(consulta, version, estado_actual, (placas, plan, total_registros))
+    return placas, plan, estado_actual, total_registros
+
+def historial_indice(servicio, claves, limite, periodo=None, amplia=False):
+    """(registros, total) más recientes de las placas en el índice, con el caché de búsquedas
+    
+    En las consultas amplias no se cuentan todas las filas (total None). None si ya no hay índice.
+    """
+    cache = obtener_cache_resultados()
+    consulta = ('historial', tuple(claves), limite, periodo, amplia)
+    with servicio.lock_datos:
+        indice = servicio.indice_actual()
+        if indice is None:
+            return None
+        version = ('indice', servicio.generacion)
+        guardados = cache.obtener(consulta, version)
+        if guardados is None:
+            guardados = indice.historial(claves, limite, periodo, not amplia)
+            cache.guardar(consulta, version, *guardados)
+    return guardados
+
+def mostrar_estado_sistema(servicio):
+    """Muestra si los datos ya están precargados y el avance de la sincronización en curso"""
+    if servicio.indice is not None:
+        st.success(
+            f"✅ Sistema conectado y listo para buscar. {servicio.indice.total_placas()} placas indexadas "
+            f"(actualizado {servicio.sincronizado_en.strftime('%H:%M:%S')})."
+        )
+    elif servicio.indice_disco is not None and not servicio.es_lider():
+        actualizado = f" (actualizado {servicio.sincronizado_en.strftime('%H:%M:%S')})" if servicio.sincronizado_en else ""
+        st.success(
+            f"✅ Sistema conectado y listo para buscar. {servicio.indice_disco.total_placas()} placas indexadas{actualizado}, "
+            f"índice compartido con los demás procesos."
+        )
+    elif servicio.indice_disco is not None:
+        st.success("✅ Sistema conectado y listo para buscar (usando el índice guardado mientras se actualizan los datos).")
+    else:
+        if servicio.es_lider():
+            st.info("⏳ Sistema conectado. Precargando las hojas RRV; mientras tanto las búsquedas consultan Google Sheets directamente.")
+        else:
+            st.info("⏳ Sistema conectado. Otro proceso está precargando las hojas RRV; mientras tanto las búsquedas consultan Google Sheets directamente.")
+    
+    if servicio.duplicados and servicio.duplicados['filas_duplicadas']:
+        st.caption(
+            f"♻️ {servicio.duplicados['filas_duplicadas']} de {servicio.duplicados['filas']} filas son copias "
+            f"de otra ({servicio.duplicados['grupos_duplicados']} grupos); se muestran una sola vez."
+        )
+    
+    if servicio.sincronizando():
+        texto = f"🔄 {servicio.etapa}"
+        if servicio.total_hojas:
+            texto += f" ({servicio.total_hojas} hojas RRV)"
+        st.progress(servicio.progreso, text=texto)
+    if servicio.ultimo_error:
+        st.warning(f"⚠️ {servicio.ultimo_error}")
+    if servicio.instantanea and servicio.indice is not None:
+        origen = f"📦 Datos de la instantánea {os.path.basename(servicio.instantanea['ruta'])} ({servicio.instantanea['exportada_en'][:16].replace('T', ' ')})"
+        if servicio.credenciales_path is None:
+            st.caption(f"{origen}, sin conexión a Google Sheets.")
+        else:
+            st.caption(f"{origen}; se reemplazan al sincronizar con Google Sheets.")
+    
+    if servicio.particiones and servicio.particiones['frias']:
+        st.caption(
+            f"🗂️ {servicio.particiones['calientes']} filas desde {servicio.particiones['desde'].strftime('%m/%Y')} en memoria; "
+            f"las {servicio.particiones['frias']} anteriores se leen del disco solo cuando una consulta las pide."
+        )
+    
+    aplicados = servicio.receptor.contadores.get('aplicado', 0)
+    if aplicados:
+        st.caption(f"📨 {aplicados} ediciones aplicadas al índice desde las hojas sin volver a descargarlas.")
+    if servicio.receptor.error:
+        st.warning(f"⚠️ {servicio.receptor.error}")
+
+# Refrescar solo el área de estado mientras avanza la precarga (Streamlit >= 1.37)
+if hasattr(st, 'fragment'):
+    mostrar_estado_sistema = st.fragment(run_every=5)(mostrar_estado_sistema)
+
+def cargar_historial(servicio):
+    """Trae del índice los registros más recientes de la consulta actual, hasta el límite de la página"""
+    consulta = st.session_state.consulta_actual
+    if consulta is None:
+        return
+    limite = min(st.session_state.limite_historial, st.session_state.total_registros)
+    if len(st.session_state.resultados_actuales) >= limite:
+        return
+    
+    tipo, parametros = consulta
+    if tipo == 'placas':
+        claves, periodo, amplia = parametros
+        historial = historial_indice(servicio, claves, limite, periodo, amplia)
+        if historial is None:
+            return
+        # En las consultas amplias no se cuentan todas las filas: el total queda en la estimación del plan
+        resultados, total = historial
+        if total is None:
+            total = st.session_state.total_registros if len(resultados) >= limite else len(resultados)
+    else:
+        indice_campos = servicio.indice_campos_actual()
+        if indice_campos is None:
+            return
+        with servicio.lock_datos:
+            filas = indice_campos.filtrar(*parametros)
+            resultados, total = indice_campos.historial(filas, limite)
+    st.session_state.resultados_actuales, st.session_state.total_registros = resultados, total
+
+def elegir_periodo():
+    """Selector de fechas de la búsqueda por placa: período en marcas, o None para todo el historial"""
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        opcion = st.selectbox("📅 Período", list(PERIODOS), key="periodo_busqueda")
+    meses = PERIODOS[opcion]
+    if meses is None:
+        return None
+    if meses == 'rango':
+        with col2:
+            rango = st.date_input("Fechas", value=(), format="DD/MM/YYYY", key="periodo_fechas")
+        if not rango:
+            return None
+        return periodo_marcas(rango[0], rango[1] if len(rango) > 1 else rango[0])
+    return periodo_marcas(inicio_mes(meses - 1), None)
+
+def buscar_por_campos(servicio):
+    """Filtros combinados por empresa, proyecto, sistema y rango de fechas sobre los índices por campo"""
+    with st.expander("🏢 Buscar por Empresa, Proyecto o Sistema"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            empresa = st.text_input("Empresa", key="filtro_empresa")
+        with col2:
+            proyecto = st.text_input("Proyecto", key="filtro_proyecto")
+        with col3:
+            sistema = st.text_input("Sistema", key="filtro_sistema")
+        rango = st.date_input("Rango de fechas (opcional)", value=(), format="DD/MM/YYYY", key="filtro_fechas")
+        filtrar_btn = st.button("🔎 Filtrar", key="filtrar_campos")
+    
+    if not filtrar_btn:
+        return
+    
+    filtros = {'empresa': empresa, 'proyecto': proyecto, 'sistema': sistema}
+    desde = rango[0] if len(rango) > 0 else None
+    hasta = rango[1] if len(rango) > 1 else desde
+    if not any(texto.strip() for texto in filtros.values()) and desde is None:
+        st.warning("⚠️ Ingresa al menos un filtro o un rango de fechas")
+        return
+    indice_campos = servicio.indice_campos_actual()
+    if indice_campos is None:
+        st.info("⏳ La búsqueda por campos estará disponible cuando termine la carga inicial de las hojas.")
+        return
+    
+    with servicio.lock_datos:
+        filas = indice_campos.filtrar(filtros, desde, hasta)
+        st.session_state.estado_actual = indice_campos.estado_actual(filas)
+    st.session_state.consulta_actual = ('campos', (filtros, desde, hasta))
+    st.session_state.total_registros = len(filas)
+    st.session_state.resultados_actuales = []
+    st.session_state.limite_historial = TAMANO_PAGINA_HISTORIAL
+    
+    if not filas:
+        st.warning("⚠️ Ningún registro cumple esos filtros")
+    else:
+        st.success(f"✅ Se encontraron {len(filas)} registro(s) de {len(st.session_state.estado_actual)} placa(s)")
+
+def ver_mas_historial():
+    st.session_state.limite_historial += TAMANO_PAGINA_HISTORIAL
+
+def tabla_resultados(resultados):
+    """Tabla resumen de los registros, tal como se muestra en el historial"""
+    # pandas (y con él dateutil y pyarrow) se carga al dibujar la primera tabla, no al arrancar
+    import pandas as pd
+    return pd.DataFrame([
+        {
+            'FECHA': resultado.fecha,
+            'PLACA': resultado.placa,
+            'EMPRESA': resultado.empresa,
+            'ÚLTIMO ESTADO': resultado.trabajo,
+            'SISTEMA': resultado.sistema,
+            'HOJA': resultado.hoja,
+            'COPIAS': len(resultado.fuentes) if resultado.fuentes else 1
+        }
+        for resultado in resultados
+    ])
+
+def registros_consulta(servicio, limite):
+    """Los `limite` registros más recientes de la consulta actual (no solo la página cargada), o None sin índice"""
+    consulta = st.session_state.consulta_actual
+    if consulta is None:
+        return st.session_state.resultados_actuales[:limite]
+    
+    tipo, parametros = consulta
+    if tipo == 'placas':
+        claves, periodo, amplia = parametros
+        historial = historial_indice(servicio, claves, limite, periodo, amplia)
+        return historial[0] if historial is not None else None
+    indice_campos = servicio.indice_campos_actual()
+    if indice_campos is None:
+        return None
+    with servicio.lock_datos:
+        return indice_campos.historial(indice_campos.filtrar(*parametros), limite)[0]
+
+def mostrar_descarga_zip(servicio):
+    """Un ZIP con el Excel de cada registro de la búsqueda, armados en varios procesos"""
+    cantidad = min(st.session_state.total_registros, MAX_REGISTROS_ZIP)
+    if not st.button(f"📦 Preparar ZIP con el Excel de cada registro ({cantidad})", key="preparar_zip"):
+        return
+    with st.spinner(f"📦 Generando {cantidad} archivos Excel..."):
+        registros = registros_consulta(servicio, MAX_REGISTROS_ZIP)
+        if registros is None:
+            st.info("⏳ El ZIP estará disponible cuando termine la carga inicial de las hojas.")
+            return
+        try:
+            # El ZIP se arma en disco a medida que terminan los libros; solo el archivo final pasa a memoria
+            with tempfile.TemporaryFile() as archivo:
+                cantidad = exportar_zip(registros, archivo)
+                archivo.seek(0)
+                datos = archivo.read()
+        except Exception as e:
+            st.error(f"❌ No se pudo generar el ZIP: {str(e)}")
+            return
+    st.download_button(
+        label=f"📥 Descargar ZIP ({cantidad} archivos, {len(datos) / 1024 / 1024:.1f} MB)",
+        data=datos,
+        file_name=f"registros_rrv_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+        mime="application/zip",
+        key="descargar_zip"
+    )
+
+def mostrar_historial(app, servicio):
+    """Tabla y detalles de cada registro del historial ya cargado"""
+    import pandas as pd
+    resultados = st.session_state.resultados_actuales
+    
+    st.dataframe(
+        tabla_resultados(resultados),
+        use_container_width=True,
+        hide_index=True
+    )
+    mostrar_descarga_zip(servicio)
+    
+    st.subheader("🔍 Detalles Completos")
+    for i, resultado in enumerate(resultados):
+        orden_cronologico = "🕒 Más Reciente" if i == 0 else f"📅 Registro #{i+1}"
+        with st.expander(f"{orden_cronologico} - Placa: {resultado.placa} ({resultado.fecha})"):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**📍 Ubicación del Registro**")
+                st.write(f"**Hoja:** {resultado.hoja}")
+                st.write(f"**Sistema:** {resultado.sistema}")
+                st.write(f"**Fila:** {resultado.fila}")
+            with col2:
+                st.markdown("**📊 Información Principal**")
+                st.write(f"**Placa:** {resultado.placa}")
+                st.write(f"**Fecha:** {resultado.fecha}")
+                st.write(f"**Empresa:** {resultado.empresa}")
+                st.write(f"**Estado:** {resultado.trabajo}")
             
-            # Estilos
-            titulo_font = Font(name='Arial', size=14, bold=True, color='FFFFFF')
-            subtitulo_font = Font(name='Arial', size=12, bold=True)
-            normal_font = Font(name='Arial', size=10)
+            if resultado.fuentes:
+                st.markdown("**📑 Registro repetido en**")
+                for hoja, pestana, fila in resultado.fuentes:
+                    st.write(f"• {hoja} / {pestana} / fila {fila}")
             
-            titulo_fill = PatternFill(start_color='2196F3', end_color='2196F3', fill_type='solid')
-            subtitulo_fill = PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid')
+            st.markdown("**📄 Datos Completos de la Fila**")
+            df_detalle = pd.DataFrame({
+                'Campo': resultado.encabezados,
+                'Valor': resultado.datos_completos
+            })
+            st.dataframe(df_detalle, use_container_width=True, hide_index=True)
             
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
+            excel_bytes = app.crear_excel_bytes(resultado)
+            if excel_bytes:
+                st.download_button(
+                    label=f"📥 Descargar Excel - Placa {resultado.placa}",
+                    data=excel_bytes,
+                    file_name=f"placa_{resultado.placa}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key=f"download_{i}"
+                )
+    
+    if len(resultados) < st.session_state.total_registros:
+        st.button(
+            f"⬇️ Mostrar más ({st.session_state.total_registros - len(resultados)} restantes)",
+            on_click=ver_mas_historial
+        )
+
+def elegir_sugerencia(clave):
+    """Copia la placa sugerida al campo de búsqueda"""
+    st.session_state.placa_input = clave
+
+def mostrar_sugerencias(servicio, texto):
+    """Muestra las placas conocidas que empiezan con el texto ingresado"""
+    indice = servicio.indice_actual()
+    if indice is None:
+        return
+    
+    sugerencias, total = leer_indice(servicio, indice.sugerir, texto)
+    if not sugerencias:
+        st.caption("💡 Ninguna placa conocida empieza así")
+        return
+    
+    st.caption(f"💡 {total} placa(s) conocidas empiezan así")
+    columnas = st.columns(len(sugerencias))
+    for columna, (clave, registros) in zip(columnas, sugerencias):
+        with columna:
+            st.button(
+                f"{clave} ({registros})",
+                key=f"sugerencia_{clave}",
+                on_click=elegir_sugerencia,
+                args=(clave,),
+                use_container_width=True
             )
-            
-            # Título principal
-            ws['A1'] = f"INFORMACIÓN DE LA PLACA: {resultado['placa']}"
-            ws['A1'].font = titulo_font
-            ws['A1'].fill = titulo_fill
-            ws.merge_cells('A1:C1')
-            ws['A1'].alignment = Alignment(horizontal='center')
-            
-            # Información de ubicación
-            ws['A3'] = "UBICACIÓN DEL REGISTRO"
-            ws['A3'].font = subtitulo_font
-            ws['A3'].fill = subtitulo_fill
-            ws['A3'].border = border
-            
-            ws['A4'] = "Hoja:"
-            ws['B4'] = resultado['hoja']
-            ws['A5'] = "Pestaña:"
-            ws['B5'] = resultado['pestana']
-            ws['A6'] = "Fila:"
-            ws['B6'] = resultado['fila']
-            
-            # Aplicar estilos a la información de ubicación
-            for row in range(4, 7):
-                ws[f'A{row}'].font = normal_font
-                ws[f'A{row}'].border = border
-                ws[f'B{row}'].font = normal_font
-                ws[f'B{row}'].border = border
-            
-            # Datos completos de la fila
-            ws['A8'] = "DATOS COMPLETOS DE LA FILA"
-            ws['A8'].font = subtitulo_font
-            ws['A8'].fill = subtitulo_fill
-            ws['A8'].border = border
-            ws.merge_cells('A8:C8')
-            
-            # Encabezados de la tabla de datos
-            ws['A9'] = "Campo"
-            ws['B9'] = "Valor"
-            ws['A9'].font = subtitulo_font
-            ws['B9'].font = subtitulo_font
-            ws['A9'].fill = subtitulo_fill
-            ws['B9'].fill = subtitulo_fill
-            ws['A9'].border = border
-            ws['B9'].border = border
-            
-            # Insertar todos los datos de la fila
-            row_num = 10
-            for encabezado, valor in zip(resultado['encabezados'], resultado['datos_completos']):
-                ws[f'A{row_num}'] = encabezado
-                ws[f'B{row_num}'] = valor
-                ws[f'A{row_num}'].font = normal_font
-                ws[f'B{row_num}'].font = normal_font
-                ws[f'A{row_num}'].border = border
-                ws[f'B{row_num}'].border = border
-                row_num += 1
-            
-            # Información del archivo
-            ws[f'A{row_num + 1}'] = f"Archivo generado el: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
-            ws[f'A{row_num + 1}'].font = Font(name='Arial', size=9, italic=True)
-            
-            # Ajustar ancho de columnas
-            ws.column_dimensions['A'].width = 25
-            ws.column_dimensions['B'].width = 40
-            ws.column_dimensions['C'].width = 15
-            
-            # Guardar en memoria
-            output = io.BytesIO()
-            wb.save(output)
-            wb.close()
-            
-            return output.getvalue()
-        except Exception as e:
-            st.error(f"Error al crear archivo Excel: {str(e)}")
-            return None
+
+def mostrar_depuracion():
+    """Muestra información interna de la sesión para diagnóstico"""
+    with st.sidebar.expander("🛠️ Depuración", expanded=True):
+        memoria = medir_memoria_resultados(st.session_state.resultados_actuales + st.session_state.estado_actual)
+        st.write(f"**Registros en sesión:** {memoria['registros']}")
+        st.write(f"**Esquemas compartidos:** {memoria['esquemas']}")
+        st.write(f"**Memoria de resultados:** {memoria['bytes'] / 1024:.1f} KB")
+        cache = obtener_cache_resultados().estadisticas()
+        st.write(
+            f"**Caché de búsquedas:** {cache['entradas']} búsquedas ({cache['registros']} registros), "
+            f"{cache['aciertos']} aciertos / {cache['fallos']} fallos ({cache['tasa_aciertos']:.0%}), "
+            f"{cache['desalojos']} desalojos, {cache['invalidaciones']} invalidaciones"
+        )
+
+def es_administrador():
+    """True si la URL trae ?admin=<RRV_ADMIN_TOKEN>"""
+    # En bytes: compare_digest lanza TypeError con textos que no son ASCII (?admin=ñ)
+    recibido = st.query_params.get("admin", "")
+    return bool(TOKEN_ADMIN) and hmac.compare_digest(recibido.encode('utf-8'), TOKEN_ADMIN.encode('utf-8'))
+
+def mostrar_perfilado(app):
+    """Perfila una búsqueda completa en Google Sheets (búsqueda, orden y tabla) para diagnosticar lentitud"""
+    import pandas as pd
+    with st.sidebar.expander("🧪 Perfilar búsqueda"):
+        placa = st.text_input("Placa a perfilar", key="placa_perfilado")
+        perfilar_btn = st.button("⏱️ Perfilar búsqueda en Google Sheets", key="perfilar")
+    if not (perfilar_btn and placa.strip()):
+        return
+    
+    contenedor = st.expander(f"🧪 Perfil de la búsqueda de {placa.strip().upper()}", expanded=True)
+    
+    def ciclo_busqueda():
+        # Sin caché: se quiere medir el recorrido completo de las hojas
+        resultados, _ = app.buscar_placas_en_drive(placa.strip(), usar_cache=False)
+        with contenedor:
+            st.dataframe(tabla_resultados(resultados), use_container_width=True, hide_index=True)
+        return resultados
+    
+    resultados, perfil = perfilar(ciclo_busqueda, nombre=placa.strip().upper())
+    with contenedor:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Duración", f"{perfil.duracion:.2f} s")
+        col2.metric("Registros", len(resultados))
+        col3.metric("Perfilador", perfil.perfilador)
+        st.download_button(
+            label=f"📥 Descargar perfil ({perfil.nombre_archivo})",
+            data=perfil.archivo,
+            file_name=perfil.nombre_archivo,
+            mime=perfil.mime,
+            key="descargar_perfil"
+        )
+        if perfil.funciones is not None:
+            st.markdown("**🔥 Funciones con más tiempo propio**")
+            st.dataframe(pd.DataFrame(perfil.funciones), use_container_width=True, hide_index=True)
+        else:
+            st.code(perfil.texto)
+
+def mostrar_exportacion(servicio):
+    """Descarga todas las pestañas RRV del índice como instantánea Parquet, para análisis o para arrancar sin conexión"""
+    with st.sidebar.expander("📦 Exportar instantánea"):
+        if servicio.indice_actual() is None:
+            st.caption("Disponible cuando termine la carga inicial de las hojas.")
+            return
+        if not st.button("📦 Generar archivo Parquet", key="exportar_instantanea"):
+            return
+        nombre = f"instantanea_rrv_{datetime.now().strftime('%Y%m%d_%H%M')}.parquet"
+        extra = {'sincronizado_en': servicio.sincronizado_en.isoformat() if servicio.sincronizado_en else None}
+        with st.spinner("📦 Exportando todas las pestañas RRV..."):
+            try:
+                with tempfile.TemporaryDirectory() as directorio:
+                    ruta = os.path.join(directorio, nombre)
+                    # Se exporta una copia de las filas: las búsquedas y la ingesta siguen mientras se escribe
+                    filas = exportar_instantanea(servicio.copiar_hojas(), ruta, extra)
+                    with open(ruta, 'rb') as archivo:
+                        datos = archivo.read()
+            except Exception as e:
+                st.error(f"❌ No se pudo exportar la instantánea: {str(e)}")
+                return
+        st.download_button(
+            label=f"📥 Descargar ({filas} filas, {len(datos) / 1024 / 1024:.1f} MB)",
+            data=datos,
+            file_name=nombre,
+            mime="application/octet-stream",
+            key="descargar_instantanea"
+        )
 
 def main():
+    import pandas as pd
     # Configuración de la página
     st.set_page_config(
         page_title="🔍 Buscador RRV",
@@ -389,13 +728,15 @@ def main():
     # Inicializar la aplicación
     app = BuscadorPlacasWeb()
     
-    # Verificar credenciales
-    if not app.credenciales_path:
+    # Verificar credenciales (sin ellas solo se puede trabajar con una instantánea columnar)
+    if not app.credenciales_path and not RUTA_INSTANTANEA:
         st.error("❌ No se encontraron credenciales. Contacta al administrador para configurar el acceso.")
         st.info("💡 Para desarrolladores: Configura las credenciales en Streamlit Cloud Secrets o agrega un archivo JSON local.")
         return
     
-    st.success("✅ Sistema conectado y listo para buscar.")
+    # El índice se abre desde disco y se sincroniza con Google Sheets en segundo plano
+    servicio = obtener_servicio_indice(app.credenciales_path)
+    mostrar_estado_sistema(servicio)
     
     # Buscar Placa
     st.subheader("📋 Buscar Placa")
@@ -409,14 +750,44 @@ def main():
     with col2:
         st.write("")  # Espaciado
         buscar_btn = st.button("🔍 Buscar", type="primary", use_container_width=True)
+    busqueda_aproximada = st.checkbox(
+        "🔤 Búsqueda tolerante (confusiones O/0, I/1, B/8, S/5 o un carácter de más/menos)",
+        key="modo_aproximado"
+    )
+    # Solo las filas del período se leen (las más antiguas pueden estar en disco)
+    periodo = elegir_periodo()
+    
+    # Sugerencias de placas conocidas a partir de lo escrito (índice en memoria, sin llamar a Sheets)
+    if placa_buscar.strip():
+        mostrar_sugerencias(servicio, placa_buscar)
     
     # Ejecutar búsquedas en paralelo
     if buscar_btn and placa_buscar.strip():
+        candidatas = None
+        indice = servicio.indice_actual()
+        modo_aproximado = busqueda_aproximada and servicio.indice is not None
+        if busqueda_aproximada and not modo_aproximado:
+            if servicio.es_lider():
+                st.info("⏳ La búsqueda tolerante estará disponible cuando termine la carga inicial de las hojas. Se hizo una búsqueda normal.")
+            else:
+                st.info("ℹ️ La búsqueda tolerante solo está disponible en el proceso que sincroniza las hojas. Se hizo una búsqueda normal.")
+        
         with st.spinner('🔍 Buscando en Google Sheets y consultando API de RRVSAC en paralelo...'):
             # Ejecutar ambas búsquedas en paralelo
             with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-                # Búsqueda en Google Sheets
-                future_sheets = executor.submit(app.buscar_placas_en_drive, placa_buscar.strip())
+                # Búsqueda de la placa (en el índice si ya está cargado, si no directo en Google Sheets)
+                # Sobre el índice se lee con lock_datos; la búsqueda en Google Sheets no lo necesita
+                if modo_aproximado:
+                    indice = servicio.indice
+                    future_sheets = executor.submit(
+                        leer_indice, servicio, app.buscar_placas_aproximadas, indice, placa_buscar.strip()
+                    )
+                elif indice is not None:
+                    future_sheets = executor.submit(buscar_en_indice, servicio, placa_buscar.strip(), periodo)
+                else:
+                    future_sheets = executor.submit(
+                        app.buscar_placas, indice, placa_buscar.strip(), MAX_RESULTADOS, periodo
+                    )
                 # Consulta a la API de RRVSAC
                 future_api = executor.submit(app.consultar_api_rrvsac, placa_buscar.strip())
                 
@@ -424,14 +795,59 @@ def main():
                 resultados = future_sheets.result()
                 rrvsac_status = future_api.result()
         
-        # Procesar resultados de Google Sheets
-        resultados_ordenados = app.ordenar_resultados_cronologicamente(resultados)
-        st.session_state.resultados_actuales = resultados_ordenados
+        plan = None
+        if modo_aproximado:
+            candidatas, placas = resultados
+            registros = total_drive = None
+        elif indice is not None:
+            placas, plan, estado_actual, total_registros = resultados
+        else:
+            placas, registros, total_drive = resultados
+        
+        # Procesar resultados: el estado actual sale de la tabla de recientes, el historial se trae al pedirlo
+        st.session_state.limite_historial = TAMANO_PAGINA_HISTORIAL
+        aviso_amplia = None
+        if placas is not None:
+            if plan is None:
+                plan, estado_actual, total_registros = leer_indice(servicio, estado_placas, indice, placas, periodo)
+            st.session_state.consulta_actual = ('placas', (placas, periodo, plan.amplia))
+            st.session_state.estado_actual = estado_actual
+            st.session_state.total_registros = total_registros
+            if plan.amplia:
+                aviso_amplia = (
+                    f"🔎 Búsqueda muy amplia: coincide con {len(placas)} placas y {total_registros} "
+                    f"registros. Se muestran las {len(st.session_state.estado_actual)} placas más recientes; "
+                    "escribe más caracteres de la placa para acotarla."
+                )
+            st.session_state.resultados_actuales = []
+        else:
+            st.session_state.consulta_actual = None
+            st.session_state.estado_actual = ultimo_por_placa(registros)
+            st.session_state.total_registros = len(registros)
+            st.session_state.resultados_actuales = registros
+            if total_drive > len(registros):
+                aviso_amplia = (
+                    f"🔎 Búsqueda muy amplia: {total_drive} coincidencias de más de {MAX_RESULTADOS} placas. Se muestran los {len(registros)} "
+                    "registros más recientes; escribe más caracteres de la placa para acotarla."
+                )
         
-        if not resultados_ordenados:
+        if not st.session_state.estado_actual:
             st.warning("⚠️ No se encontró esta placa en el sistema")
         else:
-            st.success(f"✅ Se encontraron {len(resultados_ordenados)} registro(s)")
+            st.success(f"✅ Se encontraron {st.session_state.total_registros} registro(s)")
+        if aviso_amplia:
+            st.info(aviso_amplia)
+        
+        if candidatas:
+            st.markdown("**🔤 Placas similares (ordenadas por parecido)**")
+            st.dataframe(
+                pd.DataFrame([
+                    {'PLACA': clave, 'DISTANCIA': distancia, 'REGISTROS': total}
+                    for clave, distancia, total in candidatas
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
         
         # Mostrar estado de RRVSAC
         if rrvsac_status == 'ACTIVO':
@@ -439,65 +855,47 @@ def main():
         else:
             st.error("❌ NO ACTIVO EN PLATAFORMA")
 
+    # Búsqueda por campos (empresa, proyecto, sistema y fechas)
+    buscar_por_campos(servicio)
+    
     # Mostrar resultados si existen
-    if st.session_state.resultados_actuales:
+    if st.session_state.estado_actual:
         col1, col2 = st.columns([2, 1])
         with col1:
-            st.subheader("📊 Resultados Encontrados")
+            st.subheader("📊 Estado Actual")
         with col2:
-            st.metric("Total Registros", len(st.session_state.resultados_actuales))
+            st.metric("Total Registros", st.session_state.total_registros)
         
-        df_resultados = pd.DataFrame([
+        df_estado = pd.DataFrame([
             {
-                'FECHA': resultado['fecha'],
-                'PLACA': resultado['placa'],
-                'EMPRESA': resultado['empresa'],
-                'ÚLTIMO ESTADO': resultado['trabajo'],
-                'SISTEMA': resultado['sistema'],
-                'HOJA': resultado['hoja']
+                'FECHA': resultado.fecha,
+                'PLACA': resultado.placa,
+                'EMPRESA': resultado.empresa,
+                'ÚLTIMO ESTADO': resultado.trabajo,
+                'SISTEMA': resultado.sistema,
+                'HOJA': resultado.hoja
             }
-            for resultado in st.session_state.resultados_actuales
+            for resultado in st.session_state.estado_actual
         ])
         
         st.dataframe(
-            df_resultados,
+            df_estado,
             use_container_width=True,
             hide_index=True
         )
         
-        st.subheader("🔍 Detalles Completos")
-        for i, resultado in enumerate(st.session_state.resultados_actuales):
-            orden_cronologico = "🕒 Más Reciente" if i == 0 else f"📅 Registro #{i+1}"
-            with st.expander(f"{orden_cronologico} - Placa: {resultado['placa']} ({resultado['fecha']})"):
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.markdown("**📍 Ubicación del Registro**")
-                    st.write(f"**Hoja:** {resultado['hoja']}")
-                    st.write(f"**Sistema:** {resultado['sistema']}")
-                    st.write(f"**Fila:** {resultado['fila']}")
-                with col2:
-                    st.markdown("**📊 Información Principal**")
-                    st.write(f"**Placa:** {resultado['placa']}")
-                    st.write(f"**Fecha:** {resultado['fecha']}")
-                    st.write(f"**Empresa:** {resultado['empresa']}")
-                    st.write(f"**Estado:** {resultado['trabajo']}")
-                
-                st.markdown("**📄 Datos Completos de la Fila**")
-                df_detalle = pd.DataFrame({
-                    'Campo': resultado['encabezados'],
-                    'Valor': resultado['datos_completos']
-                })
-                st.dataframe(df_detalle, use_container_width=True, hide_index=True)
-                
-                excel_bytes = app.crear_excel_bytes(resultado)
-                if excel_bytes:
-                    st.download_button(
-                        label=f"📥 Descargar Excel - Placa {resultado['placa']}",
-                        data=excel_bytes,
-                        file_name=f"placa_{resultado['placa']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        key=f"download_{i}"
-                    )
+        if st.checkbox("📜 Ver historial completo", key="ver_historial"):
+            cargar_historial(servicio)
+            mostrar_historial(app, servicio)
+    
+    # Vista de depuración (?debug=1 en la URL)
+    if st.query_params.get("debug") == "1":
+        mostrar_depuracion()
+    
+    # Perfilado de una búsqueda puntual (solo administradores, ?admin=<token> en la URL)
+    if es_administrador():
+        mostrar_perfilado(app)
+        mostrar_exportacion(servicio)
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Mide el costo de importar app.py (lo que paga cada arranque en frío) y falla si supera el presupuesto
+
+Uso:
+    python benchmark_inicio.py
+    python benchmark_inicio.py --presupuesto-ms 1500 --repeticiones 5 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Tiempo máximo de importación de app.py en un arranque en frío
+PRESUPUESTO_MS = 2500
+
+# Módulos que deben cargarse recién al usarse, nunca al arrancar
+MODULOS_DIFERIDOS = ['openpyxl', 'dateutil', 'pyarrow', 'aiohttp']
+
+_LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)')
+
+
+def medir_importacion(modulo="app"):
+    """Importa el módulo en un proceso nuevo con -X importtime; devuelve [(módulo, propio_us, acumulado_us, nivel)]"""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=directorio,
+        capture_output=True,
+        text=True
+    )
+    if proceso.returncode != 0:
+        print(proceso.stderr)
+        raise SystemExit(f"❌ No se pudo importar {modulo}")
+
+    mediciones = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA_IMPORTTIME.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, nombre = coincidencia.groups()
+            nivel = (len(sangria) - 1) // 2
+            mediciones.append((nombre, int(propio), int(acumulado), nivel))
+    return mediciones
+
+
+def importaciones_directas(mediciones, modulo="app"):
+    """Hijos inmediatos del módulo: -X importtime lista los hijos justo antes que el padre"""
+    posicion = next(i for i, (nombre, _, _, nivel) in enumerate(mediciones) if nombre == modulo and nivel == 0)
+    directas = []
+    for nombre, _, acumulado, nivel in reversed(mediciones[:posicion]):
+        if nivel == 0:
+            break
+        if nivel == 1:
+            directas.append((nombre, acumulado))
+    return directas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de importación de app.py")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    print("⏱️ BENCHMARK DE INICIO - app.py")
+    print("=" * 50)
+
+    # Se toma la repetición más rápida para descontar el ruido del sistema
+    mejor = None
+    for _ in range(args.repeticiones):
+        mediciones = medir_importacion()
+        total_us = next(acumulado for nombre, _, acumulado, nivel in mediciones if nombre == "app" and nivel == 0)
+        if mejor is None or total_us < mejor[0]:
+            mejor = (total_us, mediciones)
+    total_us, mediciones = mejor
+
+    # Importaciones directas de app.py ordenadas por costo acumulado
+    directas = sorted(importaciones_directas(mediciones), key=lambda x: x[1], reverse=True)
+    print(f"{'Módulo':<30} {'Acumulado (ms)':>15}")
+    for nombre, acumulado in directas[:args.top]:
+        print(f"{nombre:<30} {acumulado / 1000:>15.1f}")
+    print("-" * 50)
+    print(f"{'TOTAL app':<30} {total_us / 1000:>15.1f}")
+
+    fallas = []
+    if total_us / 1000 > args.presupuesto_ms:
+        fallas.append(f"la importación tomó {total_us / 1000:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+
+    cargados = {nombre.split('.')[0] for nombre, _, _, _ in mediciones}
+    for modulo in MODULOS_DIFERIDOS:
+        if modulo in cargados:
+            fallas.append(f"'{modulo}' se importa al arrancar y debería cargarse recién al usarse")
+
+    if fallas:
+        for falla in fallas:
+            print(f"❌ {falla}")
+        sys.exit(1)
+    print("✅ Inicio dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
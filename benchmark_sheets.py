@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la descarga de las hojas RRV: gspread contra el cliente asíncrono (cliente_sheets_async.py),
+los dos contra un servidor HTTP local que imita Drive y Sheets con los datos de sheets_falso.py
+
+El servidor responde con gzip y mantiene las conexiones abiertas como Google; --latencia-ms agrega una demora
+por pedido para simular la red. Informa tiempo, pedidos y filas de cada cliente y verifica que los dos
+descarguen los mismos valores.
+
+Uso:
+    python benchmark_sheets.py
+    python benchmark_sheets.py --hojas 6 --pestanas 4 --filas 5000 --latencia-ms 80
+"""
+import argparse
+import gzip
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from sheets_falso import ClienteSheetsFalso
+
+RUTA_SHEETS = '/v4/spreadsheets'
+RUTA_DRIVE = '/drive/v3/files'
+
+
+def nombre_pestana(rango):
+    """Título de la pestaña de un rango A1 completo ('Hoja 1' o Hoja1)"""
+    if rango.startswith("'") and rango.endswith("'"):
+        return rango[1:-1].replace("''", "'")
+    return rango
+
+
+def iniciar_sheets_falso(cliente, latencia):
+    """Servidor local con los endpoints de Drive y Sheets que usan gspread y el cliente asíncrono
+
+    Devuelve (url base, contador de pedidos).
+    """
+    hojas = {f"hoja{numero}": hoja for numero, hoja in enumerate(cliente.openall(), 1)}
+    pedidos = {'total': 0}
+    lock = threading.Lock()
+
+    class ManejadorSheets(BaseHTTPRequestHandler):
+        # HTTP/1.1: las conexiones quedan abiertas para el siguiente pedido
+        protocol_version = 'HTTP/1.1'
+
+        def responder(self, estado, datos):
+            cuerpo = json.dumps(datos).encode('utf-8')
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                cuerpo = gzip.compress(cuerpo, 6)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            with lock:
+                pedidos['total'] += 1
+            if latencia:
+                time.sleep(latencia)
+            url = urlparse(self.path)
+            parametros = parse_qs(url.query)
+            if url.path == RUTA_DRIVE:
+                return self.responder(200, {'files': [
+                    {'id': id_hoja, 'name': hoja.title, 'modifiedTime': hoja.lastUpdateTime,
+                     'createdTime': hoja.lastUpdateTime}
+                    for id_hoja, hoja in hojas.items()
+                ]})
+
+            partes = unquote(url.path[len(RUTA_SHEETS) + 1:]).split('/', 2) if url.path.startswith(RUTA_SHEETS) else []
+            hoja = hojas.get(partes[0]) if partes else None
+            if hoja is None:
+                return self.responder(404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}})
+            pestanas = {pestana.title: pestana for pestana in hoja.worksheets()}
+
+            if partes[1:] == ['values:batchGet']:
+                return self.responder(200, {'valueRanges': [
+                    {'range': rango, 'majorDimension': 'ROWS', 'values': pestanas[nombre_pestana(rango)]._valores}
+                    for rango in parametros.get('ranges', [])
+                ]})
+            if len(partes) == 3 and partes[1] == 'values':
+                return self.responder(200, {
+                    'range': partes[2], 'majorDimension': 'ROWS', 'values': pestanas[nombre_pestana(partes[2])]._valores
+                })
+            return self.responder(200, {
+                'spreadsheetId': partes[0],
+                'properties': {'title': hoja.title, 'locale': 'es_PE', 'timeZone': 'America/Lima'},
+                'sheets': [
+                    {'properties': {
+                        'sheetId': indice, 'title': pestana.title, 'index': indice, 'sheetType': 'GRID',
+                        'gridProperties': {'rowCount': len(pestana._valores), 'columnCount': 26}
+                    }}
+                    for indice, pestana in enumerate(hoja.worksheets())
+                ]
+            })
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorSheets)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_address[1]}", pedidos
+
+
+def cliente_gspread(url_base):
+    """gspread con sus URLs de Google redirigidas al servidor local"""
+    import gspread
+    import requests
+
+    reemplazos = (
+        ('https://sheets.googleapis.com/v4/spreadsheets', url_base + RUTA_SHEETS),
+        ('https://www.googleapis.com/drive/v3/files', url_base + RUTA_DRIVE)
+    )
+
+    class SesionLocal(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            for original, local in reemplazos:
+                if url.startswith(original):
+                    url = local + url[len(original):]
+            return super().request(method, url, *args, **kwargs)
+
+    return gspread.Client(auth=None, session=SesionLocal())
+
+
+def cliente_async(url_base):
+    from cliente_sheets_async import ClienteSheetsAsync
+    return ClienteSheetsAsync(url_sheets=url_base + RUTA_SHEETS, url_drive=url_base + RUTA_DRIVE)
+
+
+def medir(nombre, crear_cliente, url_base, pedidos):
+    """Lista las hojas RRV y descarga todas sus pestañas: (instantánea, segundos)"""
+    from instantanea import descargar_instantanea
+
+    antes = pedidos['total']
+    inicio = time.perf_counter()
+    cliente = crear_cliente(url_base)
+    instantanea = descargar_instantanea(cliente)
+    duracion = time.perf_counter() - inicio
+    if hasattr(cliente, 'cerrar'):
+        cliente.cerrar()
+    cantidad = pedidos['total'] - antes
+    print(f"{nombre:>8}: {duracion:6.2f} s, {cantidad:4d} pedidos, "
+          f"{len(instantanea.hojas)} pestañas, {instantanea.total_filas()} filas")
+    return instantanea, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara gspread con el cliente asíncrono contra un Sheets local")
+    parser.add_argument('--hojas', type=int, default=4)
+    parser.add_argument('--pestanas', type=int, default=3)
+    parser.add_argument('--filas', type=int, default=3000, help="Filas por pestaña")
+    parser.add_argument('--latencia-ms', type=float, default=50, help="Demora de cada pedido en el servidor")
+    args = parser.parse_args()
+
+    url_base, pedidos = iniciar_sheets_falso(
+        ClienteSheetsFalso(args.hojas, args.pestanas, args.filas), args.latencia_ms / 1000
+    )
+    print("⚡ BENCHMARK DE DESCARGA - GSPREAD VS CLIENTE ASÍNCRONO")
+    print(f"Datos: {args.hojas} hojas x {args.pestanas} pestañas x {args.filas} filas, latencia {args.latencia_ms:.0f} ms")
+    print("-" * 70)
+    base, duracion_base = medir('gspread', cliente_gspread, url_base, pedidos)
+    nuevo, duracion_nuevo = medir('async', cliente_async, url_base, pedidos)
+    print("-" * 70)
+
+    iguales = [(h.hoja, h.pestana, h.filas) for h in base.hojas] == [(h.hoja, h.pestana, h.filas) for h in nuevo.hojas]
+    if not iguales:
+        print("❌ Los clientes descargaron valores distintos")
+        return 1
+    print(f"✅ Mismos valores; el cliente asíncrono tardó {duracion_nuevo / duracion_base:.0%} del tiempo de gspread")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
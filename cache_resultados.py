@@ -0,0 +1,113 @@
+"""
+Caché LRU de resultados de búsqueda por placa y versión de los datos
+
+Sin índice, la versión es la fecha de última modificación de cada hoja RRV (Drive modifiedTime): un resultado
+sirve mientras ninguna de las hojas recorridas haya cambiado, sin importar cuánto tiempo pase. Con índice, es
+la generación de ServicioIndice, que cambia con cada índice cargado y cada edición aplicada.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Búsquedas guardadas y total de registros entre todas (las consultas amplias pueden traer miles)
+CAPACIDAD_CACHE = int(os.environ.get('RRV_CACHE_BUSQUEDAS', 200))
+MAX_REGISTROS_CACHE = int(os.environ.get('RRV_CACHE_REGISTROS', 50000))
+# Segundos durante los que se reutiliza la versión de las hojas sin volver a listarlas en Drive
+VIGENCIA_VERSION = 10
+
+
+def clave_consulta(placa_buscar):
+    """La búsqueda en las hojas compara en mayúsculas sobre el texto de la celda: 'abc-123 ' == 'ABC-123'"""
+    return placa_buscar.strip().upper()
+
+
+def version_hojas(hojas):
+    """Versión de un conjunto de hojas de cálculo: (id, modifiedTime) de cada una, o None si alguna no la informa"""
+    version = []
+    for hoja in hojas:
+        modificada = getattr(hoja, 'lastUpdateTime', None)
+        if not modificada:
+            return None
+        version.append((getattr(hoja, 'id', hoja.title), modificada))
+    return tuple(sorted(version))
+
+
+class CacheResultados:
+    """Resultados finales (ya consolidados y ordenados) de cada consulta, compartidos por todas las sesiones"""
+
+    def __init__(self, capacidad=CAPACIDAD_CACHE, max_registros=MAX_REGISTROS_CACHE):
+        self.capacidad = capacidad
+        self.max_registros = max_registros
+        # (consulta, versión) -> (resultados, extra), del menos al más recientemente usado; extra es lo que
+        # acompaña a los resultados (el total de coincidencias, o las placas y el plan de una búsqueda en el índice)
+        self._entradas = OrderedDict()
+        self._registros = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+        # Última versión de las hojas y cuándo se obtuvo, para no listar Drive en cada búsqueda
+        self._version = None
+        self._version_en = 0.0
+
+    def version_vigente(self):
+        """Versión obtenida hace menos de VIGENCIA_VERSION segundos, o None"""
+        if self._version is not None and time.monotonic() - self._version_en < VIGENCIA_VERSION:
+            return self._version
+        return None
+
+    def recordar_version(self, version):
+        self._version = version
+        self._version_en = time.monotonic()
+
+    def obtener(self, consulta, version):
+        """(resultados, extra) guardados para la consulta con esa versión de los datos, o None"""
+        with self._lock:
+            entrada = self._entradas.get((consulta, version))
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end((consulta, version))
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, consulta, version, resultados, extra):
+        if version is None or len(resultados) > self.max_registros:
+            return
+        with self._lock:
+            # Las versiones anteriores de la misma consulta ya no pueden volver a pedirse
+            for clave in [clave for clave in self._entradas if clave[0] == consulta and clave[1] != version]:
+                self._registros -= len(self._entradas.pop(clave)[0])
+                self.invalidaciones += 1
+
+            anterior = self._entradas.pop((consulta, version), None)
+            if anterior is not None:
+                self._registros -= len(anterior[0])
+            self._entradas[(consulta, version)] = (resultados, extra)
+            self._registros += len(resultados)
+
+            while len(self._entradas) > self.capacidad or self._registros > self.max_registros:
+                _, (desalojados, _) = self._entradas.popitem(last=False)
+                self._registros -= len(desalojados)
+                self.desalojos += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._registros = 0
+            self._version = None
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'registros': self._registros,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0
+            }
@@ -0,0 +1,58 @@
+"""
+Candado de archivo para que entre varios procesos de la aplicación solo uno sincronice con Google Sheets
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CandadoSincronizacion:
+    """Candado exclusivo sobre un archivo; quien lo toma lo conserva hasta soltarlo o terminar el proceso"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = None
+
+    def tomado(self):
+        return self._archivo is not None
+
+    def intentar_tomar(self):
+        """Toma el candado sin esperar; devuelve True si este proceso lo tiene"""
+        if self._archivo is not None:
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+        archivo = open(self.ruta, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            archivo.close()
+            return False
+
+        # Para diagnóstico: qué proceso tiene el candado
+        archivo.seek(0)
+        archivo.truncate()
+        archivo.write(str(os.getpid()).encode('ascii'))
+        archivo.flush()
+        self._archivo = archivo
+        return True
+
+    def soltar(self):
+        if self._archivo is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._archivo.fileno(), fcntl.LOCK_UN)
+        else:
+            self._archivo.seek(0)
+            msvcrt.locking(self._archivo.fileno(), msvcrt.LK_UNLCK, 1)
+        self._archivo.close()
+        self._archivo = None
@@ -0,0 +1,260 @@
+"""
+Cliente asíncrono liviano para los pocos endpoints de Drive y Sheets que usa el buscador
+
+Tiene la misma interfaz que gspread para lo que necesitan BuscadorPlacasWeb y descargar_instantanea
+(openall, worksheets, get_all_values, title, id, lastUpdateTime), pero:
+    - todas las llamadas comparten una sesión aiohttp (conexiones reutilizadas) y piden gzip
+    - precargar() descarga todas las pestañas de varias hojas a la vez, con un batchGet por grupo de
+      pestañas en lugar de una llamada por pestaña
+    - los valores se decodifican directo a tuplas del mismo ancho, las filas que guarda HojaRRV
+
+Necesita `aiohttp` (opcional: `pip install aiohttp`) y `google-auth` (ya lo instala gspread). Se activa con
+RRV_CLIENTE_SHEETS=async; ver benchmark_sheets.py para compararlo con gspread.
+"""
+import asyncio
+import json
+import os
+import threading
+from urllib.parse import quote
+
+# 'gspread' (por defecto) o 'async'
+CLIENTE_SHEETS = os.environ.get('RRV_CLIENTE_SHEETS', 'gspread')
+# Pedidos simultáneos a Google como máximo
+CONCURRENCIA_SHEETS = int(os.environ.get('RRV_SHEETS_CONCURRENCIA', 8))
+# Pestañas por pedido values:batchGet
+PESTANAS_POR_LOTE = 20
+# Reintentos ante límite de cuota (429) o errores temporales de Google
+REINTENTOS = 4
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+URL_SHEETS = 'https://sheets.googleapis.com/v4/spreadsheets'
+URL_DRIVE = 'https://www.googleapis.com/drive/v3/files'
+ALCANCES = (
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.readonly'
+)
+MIME_HOJA_CALCULO = 'application/vnd.google-apps.spreadsheet'
+# Google solo comprime la respuesta si el User-Agent también menciona gzip
+ENCABEZADOS = {'Accept-Encoding': 'gzip', 'User-Agent': 'buscador-rrv (gzip)'}
+
+
+def importar_aiohttp():
+    """aiohttp es opcional: solo se carga al crear el cliente asíncrono"""
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError("El cliente asíncrono de Google Sheets necesita aiohttp (pip install aiohttp)")
+    return aiohttp
+
+
+def conectar_sheets(credenciales_path, cliente=CLIENTE_SHEETS):
+    """Cliente de Google Sheets con la interfaz de gspread: el de gspread o el asíncrono según RRV_CLIENTE_SHEETS"""
+    if cliente == 'async':
+        return ClienteSheetsAsync.desde_archivo(credenciales_path)
+    import gspread
+    return gspread.service_account(filename=credenciales_path)
+
+
+def rango_pestana(titulo):
+    """Rango A1 de una pestaña completa: el título entre comillas simples, con las comillas duplicadas"""
+    return "'" + titulo.replace("'", "''") + "'"
+
+
+def decodificar_valores(valores):
+    """Filas de un rango de la API como tuplas del mismo ancho (como get_all_values de gspread, que rellena con '')"""
+    if not valores:
+        return []
+    ancho = max(len(fila) for fila in valores)
+    return [tuple(fila) if len(fila) == ancho else tuple(fila) + ('',) * (ancho - len(fila)) for fila in valores]
+
+
+class PestanaAsync:
+    """Pestaña de una hoja: los valores vienen de precargar() o se piden al llamar get_all_values()"""
+    __slots__ = ('hoja', 'title', '_valores')
+
+    def __init__(self, hoja, title, valores=None):
+        self.hoja = hoja
+        self.title = title
+        self._valores = valores
+
+    def get_all_values(self):
+        # Los valores precargados se entregan una sola vez: quien los pide se queda con la única copia
+        valores, self._valores = self._valores, None
+        if valores is None:
+            valores = self.hoja.cliente.ejecutar(self.hoja.cliente.leer_pestanas(self.hoja.id, [self.title]))[0]
+        return valores
+
+
+class HojaAsync:
+    """Hoja de cálculo listada en Drive (id, título y modifiedTime, como gspread.Spreadsheet)"""
+    __slots__ = ('cliente', 'id', 'title', 'lastUpdateTime', '_pestanas')
+
+    def __init__(self, cliente, id, title, lastUpdateTime):
+        self.cliente = cliente
+        self.id = id
+        self.title = title
+        self.lastUpdateTime = lastUpdateTime
+        self._pestanas = None
+
+    def worksheets(self):
+        pestanas, self._pestanas = self._pestanas, None
+        if pestanas is None:
+            titulos = self.cliente.ejecutar(self.cliente.titulos_pestanas(self.id))
+            pestanas = [PestanaAsync(self, titulo) for titulo in titulos]
+        return pestanas
+
+
+class ClienteSheetsAsync:
+    """Reemplazo de gspread.Client sobre aiohttp, con un bucle de eventos propio en un hilo de fondo
+
+    Los métodos con la interfaz de gspread son sincrónicos (bloquean hasta tener la respuesta) para poder
+    usarse desde Streamlit o desde el hilo de precarga; por dentro todos los pedidos pasan por el mismo bucle
+    y la misma sesión HTTP. `credenciales` es un google.auth Credentials (None: sin autenticación, para
+    servidores de prueba).
+    """
+
+    def __init__(self, credenciales=None, url_sheets=URL_SHEETS, url_drive=URL_DRIVE, concurrencia=CONCURRENCIA_SHEETS):
+        self._aiohttp = importar_aiohttp()
+        self.credenciales = credenciales
+        self.url_sheets = url_sheets
+        self.url_drive = url_drive
+        self.concurrencia = concurrencia
+        self.pedidos = 0
+        self._sesion = None
+        self._semaforo = None
+        self._lock_token = None
+        self._bucle = asyncio.new_event_loop()
+        threading.Thread(target=self._bucle.run_forever, name='cliente-sheets', daemon=True).start()
+
+    @classmethod
+    def desde_archivo(cls, credenciales_path, **opciones):
+        from google.oauth2.service_account import Credentials
+
+        return cls(Credentials.from_service_account_file(credenciales_path, scopes=ALCANCES), **opciones)
+
+    def ejecutar(self, corrutina):
+        """Ejecuta una corrutina en el bucle del cliente y espera su resultado"""
+        return asyncio.run_coroutine_threadsafe(corrutina, self._bucle).result()
+
+    def cerrar(self):
+        if self._sesion is not None:
+            self.ejecutar(self._sesion.close())
+            self._sesion = None
+        self._bucle.call_soon_threadsafe(self._bucle.stop)
+
+    # Interfaz de gspread
+
+    def openall(self):
+        return self.ejecutar(self.listar_hojas())
+
+    def precargar(self, hojas, al_avanzar=None):
+        """Descarga a la vez las pestañas de todas las hojas; después worksheets() y get_all_values() no piden nada
+
+        `al_avanzar` recibe la fracción de hojas completadas. Una hoja que falla queda sin precargar (sus
+        pestañas se vuelven a pedir, y a fallar, al recorrerla, como con gspread).
+        """
+        self.ejecutar(self._precargar(hojas, al_avanzar))
+
+    # Pedidos HTTP
+
+    async def _preparar(self):
+        if self._sesion is None:
+            aiohttp = self._aiohttp
+            self._sesion = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrencia, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=120),
+                headers=ENCABEZADOS
+            )
+            self._semaforo = asyncio.Semaphore(self.concurrencia)
+            self._lock_token = asyncio.Lock()
+
+    async def _token(self):
+        """Token de acceso vigente; la renovación (sincrónica en google-auth) corre fuera del bucle"""
+        if self.credenciales is None:
+            return None
+        async with self._lock_token:
+            if not self.credenciales.valid:
+                from google.auth.transport.requests import Request
+
+                await self._bucle.run_in_executor(None, self.credenciales.refresh, Request())
+            return self.credenciales.token
+
+    async def _get(self, url, parametros):
+        """GET con reintentos: el JSON de la respuesta ya decodificado"""
+        await self._preparar()
+        espera = 1.0
+        for intento in range(REINTENTOS + 1):
+            token = await self._token()
+            encabezados = {'Authorization': f'Bearer {token}'} if token else None
+            async with self._semaforo:
+                self.pedidos += 1
+                async with self._sesion.get(url, params=parametros, headers=encabezados) as respuesta:
+                    cuerpo = await respuesta.read()
+                    estado = respuesta.status
+            if estado == 200:
+                return json.loads(cuerpo)
+            if estado not in ESTADOS_REINTENTABLES or intento == REINTENTOS:
+                raise RuntimeError(f"Google respondió {estado} a {url}: {cuerpo[:200].decode('utf-8', 'replace')}")
+            await asyncio.sleep(espera)
+            espera *= 2
+
+    async def listar_hojas(self):
+        """Hojas de cálculo visibles para la cuenta (Drive files.list, todas las páginas)"""
+        hojas = []
+        parametros = {
+            'q': f'mimeType="{MIME_HOJA_CALCULO}"',
+            'pageSize': 1000,
+            'fields': 'nextPageToken,files(id,name,modifiedTime)',
+            'supportsAllDrives': 'true',
+            'includeItemsFromAllDrives': 'true'
+        }
+        while True:
+            pagina = await self._get(self.url_drive, parametros)
+            hojas.extend(
+                HojaAsync(self, archivo['id'], archivo['name'], archivo.get('modifiedTime'))
+                for archivo in pagina.get('files', [])
+            )
+            if not pagina.get('nextPageToken'):
+                return hojas
+            parametros['pageToken'] = pagina['nextPageToken']
+
+    async def titulos_pestanas(self, id_hoja):
+        datos = await self._get(f"{self.url_sheets}/{quote(id_hoja, safe='')}", {'fields': 'sheets.properties.title'})
+        return [pestana['properties']['title'] for pestana in datos.get('sheets', [])]
+
+    async def leer_pestanas(self, id_hoja, titulos):
+        """Valores de varias pestañas completas: un batchGet por cada PESTANAS_POR_LOTE, todos a la vez"""
+        url = f"{self.url_sheets}/{quote(id_hoja, safe='')}/values:batchGet"
+        lotes = [titulos[i:i + PESTANAS_POR_LOTE] for i in range(0, len(titulos), PESTANAS_POR_LOTE)]
+        respuestas = await asyncio.gather(*(
+            self._get(url, [('ranges', rango_pestana(titulo)) for titulo in lote] + [
+                ('majorDimension', 'ROWS'), ('valueRenderOption', 'FORMATTED_VALUE'),
+                ('fields', 'valueRanges.values')
+            ])
+            for lote in lotes
+        ))
+        return [
+            decodificar_valores(rango.get('values'))
+            for respuesta in respuestas
+            for rango in respuesta.get('valueRanges', [])
+        ]
+
+    async def _precargar_hoja(self, hoja):
+        titulos = await self.titulos_pestanas(hoja.id)
+        valores = await self.leer_pestanas(hoja.id, titulos)
+        hoja._pestanas = [PestanaAsync(hoja, titulo, filas) for titulo, filas in zip(titulos, valores)]
+
+    async def _precargar(self, hojas, al_avanzar):
+        completas = 0
+
+        async def precargar_hoja(hoja):
+            nonlocal completas
+            try:
+                await self._precargar_hoja(hoja)
+            except Exception:
+                pass
+            completas += 1
+            if al_avanzar:
+                al_avanzar(completas / len(hojas))
+
+        await asyncio.gather(*(precargar_hoja(hoja) for hoja in hojas))
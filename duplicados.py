@@ -0,0 +1,67 @@
+"""
+Detección de filas repetidas entre hojas y pestañas RRV (el mismo servicio copiado en varios lugares)
+"""
+import hashlib
+
+from registros import parsear_fecha, normalizar_valor
+from indice_placas import normalizar_placa
+
+
+def huella_fila(esquema, fila):
+    """Huella estable de una fila: placas y fecha normalizadas más el resto de los valores sin formato"""
+    especiales = set(esquema.columnas_placa)
+    especiales.add(esquema.col_fecha)
+
+    partes = [
+        '|'.join(normalizar_placa(fila[col]) for col in esquema.columnas_placa if col < len(fila)),
+        parsear_fecha(fila[esquema.col_fecha]).isoformat() if esquema.col_fecha < len(fila) else ''
+    ]
+    partes.extend(normalizar_valor(valor) for col, valor in enumerate(fila) if col not in especiales)
+    # Las celdas vacías al final no distinguen una copia de otra
+    while len(partes) > 2 and not partes[-1]:
+        partes.pop()
+
+    resumen = hashlib.blake2b('\x1f'.join(partes).encode('utf-8'), digest_size=8)
+    return int.from_bytes(resumen.digest(), 'little')
+
+
+def consolidar_duplicados(registros):
+    """Une los registros repetidos en uno solo (el primero) que lista todas sus fuentes"""
+    unicos = {}
+    for registro in registros:
+        huella = huella_fila(registro.esquema, registro.datos)
+        original = unicos.get(huella)
+        if original is None:
+            unicos[huella] = registro
+            continue
+        if original.fuentes is None:
+            original.fuentes = [(original.hoja, original.pestana, original.fila)]
+        original.fuentes.append((registro.hoja, registro.pestana, registro.fila))
+    return list(unicos.values())
+
+
+def agrupar_duplicados(hojas, huellas=None):
+    """Pasada completa sobre las pestañas descargadas
+
+    Devuelve (duplicada_de, estadisticas): duplicada_de lleva cada copia (idx_hoja, idx_fila)
+    a su primera aparición. `huellas` (una secuencia por pestaña) evita recalcularlas si ya se tienen.
+    """
+    primeras = {}
+    duplicada_de = {}
+    for idx_hoja, hoja in enumerate(hojas):
+        for idx_fila in range(len(hoja.filas)):
+            # Con huellas ya calculadas no hace falta leer las filas
+            if huellas is None:
+                huella = huella_fila(hoja.esquema, hoja.filas[idx_fila])
+            else:
+                huella = huellas[idx_hoja][idx_fila]
+            original = primeras.setdefault(huella, (idx_hoja, idx_fila))
+            if original != (idx_hoja, idx_fila):
+                duplicada_de[(idx_hoja, idx_fila)] = original
+
+    estadisticas = {
+        'filas': sum(len(hoja.filas) for hoja in hojas),
+        'filas_duplicadas': len(duplicada_de),
+        'grupos_duplicados': len(set(duplicada_de.values()))
+    }
+    return duplicada_de, estadisticas
@@ -0,0 +1,204 @@
+"""
+Exportación de un Excel por registro (el mismo de "Descargar Excel" en el historial) para todos los
+registros de una búsqueda, empaquetados en un ZIP
+
+Los libros se arman en varios procesos con los estilos creados una sola vez por proceso y se escriben en el
+ZIP a medida que terminan; solo hay unos pocos libros en vuelo a la vez, así la memoria no crece con la
+cantidad de registros.
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+# Procesos para armar los libros (0 o 1: todo en el proceso actual)
+PROCESOS_EXPORTACION = int(os.environ.get('RRV_PROCESOS_EXPORTACION', min(4, os.cpu_count() or 1)))
+# Registros que entran como máximo en un ZIP (los más recientes)
+MAX_REGISTROS_ZIP = int(os.environ.get('RRV_MAX_REGISTROS_ZIP', 1000))
+# Por debajo de esta cantidad de libros arrancar procesos cuesta más de lo que ahorra
+UMBRAL_REGISTROS_PARALELO = 40
+# Libros pendientes por proceso: acota lo que espera en memoria para entrar al ZIP
+PENDIENTES_POR_PROCESO = 2
+
+_NO_NOMBRE = re.compile(r'[^0-9A-Za-z_-]+')
+
+# Estilos de los libros, creados la primera vez que se arma uno en cada proceso
+_estilos = None
+
+
+def estilos():
+    """Fuentes, rellenos y bordes compartidos por todos los libros del proceso (openpyxl se carga acá)"""
+    global _estilos
+    if _estilos is None:
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+        lado = Side(style='thin')
+        _estilos = {
+            'titulo_font': Font(name='Arial', size=14, bold=True, color='FFFFFF'),
+            'subtitulo_font': Font(name='Arial', size=12, bold=True),
+            'normal_font': Font(name='Arial', size=10),
+            'pie_font': Font(name='Arial', size=9, italic=True),
+            'titulo_fill': PatternFill(start_color='2196F3', end_color='2196F3', fill_type='solid'),
+            'subtitulo_fill': PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid'),
+            'centrado': Alignment(horizontal='center'),
+            'border': Border(left=lado, right=lado, top=lado, bottom=lado)
+        }
+    return _estilos
+
+
+def datos_excel(resultado, generado=None):
+    """Lo que necesita crear_excel de un RegistroPlaca, en tipos simples para mandarlo a otro proceso"""
+    generado = generado or datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+    return (
+        resultado.placa, resultado.hoja, resultado.pestana, resultado.fila,
+        tuple(resultado.encabezados), tuple(resultado.datos_completos), generado
+    )
+
+
+def crear_excel(datos):
+    """Bytes del Excel de un registro a partir de datos_excel (se ejecuta en los procesos de la exportación)"""
+    from openpyxl import Workbook
+
+    placa, hoja, pestana, fila, encabezados, valores, generado = datos
+    e = estilos()
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"Placa {placa}"
+
+    # Título principal
+    ws['A1'] = f"INFORMACIÓN DE LA PLACA: {placa}"
+    ws['A1'].font = e['titulo_font']
+    ws['A1'].fill = e['titulo_fill']
+    ws.merge_cells('A1:C1')
+    ws['A1'].alignment = e['centrado']
+
+    # Información de ubicación
+    ws['A3'] = "UBICACIÓN DEL REGISTRO"
+    ws['A3'].font = e['subtitulo_font']
+    ws['A3'].fill = e['subtitulo_fill']
+    ws['A3'].border = e['border']
+
+    ws['A4'] = "Hoja:"
+    ws['B4'] = hoja
+    ws['A5'] = "Pestaña:"
+    ws['B5'] = pestana
+    ws['A6'] = "Fila:"
+    ws['B6'] = fila
+
+    for row in range(4, 7):
+        for columna in 'AB':
+            ws[f'{columna}{row}'].font = e['normal_font']
+            ws[f'{columna}{row}'].border = e['border']
+
+    # Datos completos de la fila
+    ws['A8'] = "DATOS COMPLETOS DE LA FILA"
+    ws['A8'].font = e['subtitulo_font']
+    ws['A8'].fill = e['subtitulo_fill']
+    ws['A8'].border = e['border']
+    ws.merge_cells('A8:C8')
+
+    ws['A9'] = "Campo"
+    ws['B9'] = "Valor"
+    for celda in ('A9', 'B9'):
+        ws[celda].font = e['subtitulo_font']
+        ws[celda].fill = e['subtitulo_fill']
+        ws[celda].border = e['border']
+
+    row_num = 10
+    for encabezado, valor in zip(encabezados, valores):
+        ws[f'A{row_num}'] = encabezado
+        ws[f'B{row_num}'] = valor
+        for columna in 'AB':
+            ws[f'{columna}{row_num}'].font = e['normal_font']
+            ws[f'{columna}{row_num}'].border = e['border']
+        row_num += 1
+
+    ws[f'A{row_num + 1}'] = f"Archivo generado el: {generado}"
+    ws[f'A{row_num + 1}'].font = e['pie_font']
+
+    ws.column_dimensions['A'].width = 25
+    ws.column_dimensions['B'].width = 40
+    ws.column_dimensions['C'].width = 15
+
+    output = io.BytesIO()
+    wb.save(output)
+    wb.close()
+    return output.getvalue()
+
+
+def nombre_en_zip(numero, datos):
+    """Nombre del libro dentro del ZIP: orden del historial, placa, pestaña y fila"""
+    placa, hoja, pestana, fila = datos[:4]
+    partes = [_NO_NOMBRE.sub('_', texto).strip('_') for texto in (placa, hoja, pestana)]
+    return f"{numero:04d}_placa_{partes[0]}_{partes[1]}_{partes[2]}_fila{fila}.xlsx"
+
+
+def exportar_zip(registros, destino, procesos=PROCESOS_EXPORTACION):
+    """Escribe en `destino` (ruta o archivo abierto) un ZIP con el Excel de cada registro; devuelve cuántos"""
+    generado = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+    trabajos = [
+        (nombre_en_zip(numero, datos), datos)
+        for numero, datos in enumerate((datos_excel(registro, generado) for registro in registros), 1)
+    ]
+    # Los .xlsx ya vienen comprimidos: se guardan sin volver a comprimir
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as archivo:
+        if procesos <= 1 or len(trabajos) < UMBRAL_REGISTROS_PARALELO:
+            for nombre, datos in trabajos:
+                archivo.writestr(nombre, crear_excel(datos))
+            return len(trabajos)
+
+        # 'spawn' porque el proceso principal tiene hilos (Streamlit, precarga) y fork podría heredar locks tomados
+        contexto = multiprocessing.get_context('spawn')
+        maximo_pendientes = procesos * PENDIENTES_POR_PROCESO
+        pendientes = {}
+        siguientes = iter(trabajos)
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as executor:
+            while True:
+                for nombre, datos in siguientes:
+                    pendientes[executor.submit(crear_excel, datos)] = nombre
+                    if len(pendientes) >= maximo_pendientes:
+                        break
+                if not pendientes:
+                    break
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    archivo.writestr(pendientes.pop(futuro), futuro.result())
+    return len(trabajos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la exportación a ZIP de un Excel por registro con varios procesos")
+    parser.add_argument('--registros', type=int, default=400, help="Registros a exportar (de un Google Sheets falso)")
+    parser.add_argument('--procesos', default='1,2,4', help="Cantidades de procesos a comparar, separadas por comas")
+    args = parser.parse_args()
+
+    from sheets_falso import ClienteSheetsFalso
+    from instantanea import descargar_instantanea
+    from registros import RegistroPlaca
+
+    instantanea = descargar_instantanea(ClienteSheetsFalso(1, 1, args.registros))
+    hoja = instantanea.hojas[0]
+    col_placa = hoja.esquema.columnas_placa[0]
+    registros = [
+        RegistroPlaca(hoja.esquema, hoja.hoja, hoja.pestana, idx_fila + 2, col_placa, hoja.filas[idx_fila])
+        for idx_fila in range(len(hoja.filas))
+    ]
+
+    for procesos in (int(valor) for valor in args.procesos.split(',')):
+        inicio = time.perf_counter()
+        salida = io.BytesIO()
+        cantidad = exportar_zip(registros, salida, procesos)
+        duracion = time.perf_counter() - inicio
+        print(f"{procesos} proceso(s): {cantidad} libros en {duracion:.2f} s "
+              f"({cantidad / duracion:.0f} libros/s, ZIP de {len(salida.getvalue()) / 1024 / 1024:.1f} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Índices invertidos por campo (empresa, proyecto, sistema) para filtrar filas sin recorrer las hojas
+"""
+import heapq
+from array import array
+from bisect import bisect_left, insort
+
+from registros import RegistroPlaca, parsear_fecha, normalizar_valor, marca_de_tiempo, periodo_marcas
+from indice_placas import normalizar_placa, MAX_FILA
+
+# Campo de búsqueda -> columna del esquema resuelta por las heurísticas encontrar_columna_*
+CAMPOS = {
+    'empresa': 'col_empresa',
+    'proyecto': 'col_proyecto',
+    'sistema': 'col_sistema'
+}
+
+
+# Pestañas que entran en una fila empaquetada (los 32 bits altos de un uint64)
+MAX_HOJA_FILA = (1 << 32) - 1
+
+
+def empaquetar_fila(idx_hoja, idx_fila):
+    if not (0 <= idx_hoja <= MAX_HOJA_FILA and 0 <= idx_fila <= MAX_FILA):
+        raise ValueError(f"Fila fuera de rango: pestaña {idx_hoja} (máx. {MAX_HOJA_FILA}), fila {idx_fila} (máx. {MAX_FILA})")
+    return (idx_hoja << 32) | idx_fila
+
+
+def desempaquetar_fila(fila):
+    return fila >> 32, fila & 0xFFFFFFFF
+
+
+def _contiene(lista, valor):
+    posicion = bisect_left(lista, valor)
+    return posicion < len(lista) and lista[posicion] == valor
+
+
+class IndiceCampos:
+    """Valor normalizado de cada campo -> filas donde aparece (ordenadas), más la fecha de cada fila"""
+
+    def __init__(self, hojas, duplicada_de=None):
+        self.hojas = list(hojas)
+        self.duplicada_de = duplicada_de or {}
+        self.valores = {campo: {} for campo in CAMPOS}
+        self.marcas = []
+
+        for idx_hoja, hoja in enumerate(self.hojas):
+            self.marcas.append(array('q'))
+            for idx_fila in range(len(hoja.filas)):
+                self.agregar_fila(idx_hoja, idx_fila)
+
+    @classmethod
+    def desde_partes(cls, hojas, valores, marcas, duplicada_de):
+        """Arma el índice con listas ya calculadas (por ejemplo, leídas del índice en disco)"""
+        indice = cls.__new__(cls)
+        indice.hojas = hojas
+        indice.duplicada_de = duplicada_de
+        indice.valores = valores
+        indice.marcas = marcas
+        return indice
+
+    def copiar(self, hojas, duplicada_de):
+        """Copia sobre otras pestañas y copias (ver IndicePlacas.copiar) que no ve los cambios posteriores"""
+        valores = {
+            campo: {valor: array('Q', filas) for valor, filas in valores.items()}
+            for campo, valores in self.valores.items()
+        }
+        return IndiceCampos.desde_partes(hojas, valores, [array('q', marcas) for marcas in self.marcas], duplicada_de)
+
+    def agregar_fila(self, idx_hoja, idx_fila):
+        """Indexa una fila (nueva o con contenido reemplazado) de una pestaña"""
+        hoja = self.hojas[idx_hoja]
+        fila = hoja.filas[idx_fila]
+        fecha = fila[hoja.esquema.col_fecha] if hoja.esquema.col_fecha < len(fila) else None
+        marcas = self.marcas[idx_hoja]
+        while len(marcas) <= idx_fila:
+            marcas.append(0)
+        marcas[idx_fila] = marca_de_tiempo(parsear_fecha(fecha))
+
+        if (idx_hoja, idx_fila) not in self.duplicada_de:
+            self.indexar_valores(idx_hoja, idx_fila)
+
+    def _valores_fila(self, idx_hoja, idx_fila):
+        hoja = self.hojas[idx_hoja]
+        fila = hoja.filas[idx_fila]
+        for campo, atributo in CAMPOS.items():
+            columna = getattr(hoja.esquema, atributo)
+            if columna < len(fila):
+                valor = normalizar_valor(fila[columna])
+                if valor:
+                    yield campo, valor
+
+    def indexar_valores(self, idx_hoja, idx_fila):
+        id_fila = empaquetar_fila(idx_hoja, idx_fila)
+        for campo, valor in self._valores_fila(idx_hoja, idx_fila):
+            filas = self.valores[campo].setdefault(valor, array('Q'))
+            # En la carga inicial las filas llegan en orden y basta con agregarlas al final
+            if not filas or filas[-1] < id_fila:
+                filas.append(id_fila)
+            elif not _contiene(filas, id_fila):
+                insort(filas, id_fila)
+
+    def quitar_fila(self, idx_hoja, idx_fila):
+        """Quita una fila de las listas de sus valores actuales (antes de reemplazar su contenido)"""
+        id_fila = empaquetar_fila(idx_hoja, idx_fila)
+        for campo, valor in self._valores_fila(idx_hoja, idx_fila):
+            filas = self.valores[campo].get(valor)
+            if filas is None:
+                continue
+            posicion = bisect_left(filas, id_fila)
+            if posicion < len(filas) and filas[posicion] == id_fila:
+                del filas[posicion]
+            if not filas:
+                del self.valores[campo][valor]
+
+    def valores_de(self, campo, texto):
+        """Valores distintos de un campo que contienen el texto"""
+        texto = normalizar_valor(texto)
+        return [valor for valor in self.valores[campo] if texto in valor]
+
+    def _filas_de(self, campo, texto):
+        listas = [self.valores[campo][valor] for valor in self.valores_de(campo, texto)]
+        if len(listas) == 1:
+            return listas[0]
+        return array('Q', sorted(set().union(*listas)))
+
+    def filtrar(self, filtros, desde=None, hasta=None):
+        """Filas que cumplen todos los filtros {campo: texto} y caen en el rango de fechas (date o None)"""
+        listas = [self._filas_de(campo, texto) for campo, texto in filtros.items() if texto and texto.strip()]
+        minimo, maximo = periodo_marcas(desde, hasta)
+        if not listas:
+            if desde is None and hasta is None:
+                return []
+            # Solo rango de fechas: se mira la fecha antes que las copias, que es lo más caro de revisar
+            candidatas = (
+                empaquetar_fila(idx_hoja, idx_fila)
+                for idx_hoja, marcas in enumerate(self.marcas)
+                for idx_fila, marca in enumerate(marcas)
+                if (minimo is None or marca >= minimo) and (maximo is None or marca <= maximo)
+                and (idx_hoja, idx_fila) not in self.duplicada_de
+            )
+        else:
+            # Recorrer la lista más corta y buscar cada fila en las demás
+            listas.sort(key=len)
+            candidatas = (fila for fila in listas[0] if all(_contiene(otra, fila) for otra in listas[1:]))
+
+        filas = []
+        for fila in candidatas:
+            if minimo is not None or maximo is not None:
+                marca = self.marca(fila)
+                if (minimo is not None and marca < minimo) or (maximo is not None and marca > maximo):
+                    continue
+            filas.append(fila)
+        return filas
+
+    def marca(self, fila):
+        idx_hoja, idx_fila = desempaquetar_fila(fila)
+        return self.marcas[idx_hoja][idx_fila]
+
+    def _columna_placa(self, hoja, datos):
+        return next((col for col in hoja.esquema.columnas_placa if col < len(datos)), 0)
+
+    def registro(self, fila):
+        idx_hoja, idx_fila = desempaquetar_fila(fila)
+        hoja = self.hojas[idx_hoja]
+        datos = hoja.filas[idx_fila]
+        return RegistroPlaca(hoja.esquema, hoja.hoja, hoja.pestana, idx_fila + 2, self._columna_placa(hoja, datos), datos)
+
+    def historial(self, filas, limite=None):
+        """Registros de las filas, del más reciente al más antiguo y hasta `limite`: (registros, total)"""
+        if limite is None or limite >= len(filas):
+            elegidas = sorted(filas, key=self.marca, reverse=True)
+        else:
+            elegidas = heapq.nlargest(limite, filas, key=self.marca)
+        return [self.registro(fila) for fila in elegidas], len(filas)
+
+    def estado_actual(self, filas):
+        """Último registro de cada placa entre las filas, del más nuevo al más antiguo"""
+        ultimas = {}
+        for fila in filas:
+            idx_hoja, idx_fila = desempaquetar_fila(fila)
+            hoja = self.hojas[idx_hoja]
+            datos = hoja.filas[idx_fila]
+            clave = normalizar_placa(datos[self._columna_placa(hoja, datos)]) if datos else ''
+            marca = self.marcas[idx_hoja][idx_fila]
+            if clave not in ultimas or marca > ultimas[clave][0]:
+                ultimas[clave] = (marca, fila)
+        recientes = sorted(ultimas.values(), reverse=True)
+        return [self.registro(fila) for _, fila in recientes]
@@ -0,0 +1,458 @@
+"""
+Índice de placas en disco con formato binario compacto, abierto con mmap para arrancar sin descargar nada
+
+Estructura del archivo (little-endian, secciones alineadas a 8 bytes):
+    cabecera   firma, versión, contadores y desplazamiento de cada sección
+    meta       JSON con las pestañas (hoja, pestaña, encabezados, primera fila global)
+    offsets    uint32 x (claves + 1): inicio de cada placa dentro del bloque de claves
+    claves     placas normalizadas ordenadas, separadas por '\\n'
+    rangos     uint32 x (claves + 1): primera ubicación de cada placa
+    ubicacion  uint32 x 3 por ubicación: pestaña, índice de fila, columna de la placa
+    posiciones uint64 x (filas + 1): inicio de cada fila dentro del bloque de filas
+    filas      valores de cada fila en UTF-8 separados por '\\x1f'
+    rangos_campos  uint64 x (valores + 1): inicio de las filas de cada valor de empresa, proyecto y sistema
+    filas_campos   uint64 x N: filas (empaquetar_fila) de cada valor, ordenadas
+    marcas     int64 x filas: fecha de cada fila en segundos (marca_de_tiempo)
+    duplicadas uint64 x N: filas (empaquetar_fila) que son copia de otra, ordenadas
+"""
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+
+from registros import RegistroPlaca, obtener_esquema, en_periodo, parsear_fecha, marca_de_tiempo
+from indice_placas import normalizar_placa, desempaquetar_ubicacion, ultimo_por_placa
+from indice_campos import CAMPOS, IndiceCampos, empaquetar_fila
+from duplicados import consolidar_duplicados, huella_fila
+
+FIRMA = b'RRVIDX01'
+VERSION = 2
+SEPARADOR_CLAVES = b'\n'
+SEPARADOR_VALORES = '\x1f'
+
+_CABECERA = struct.Struct('<8sIIII12Q')
+
+
+def _alinear(archivo):
+    relleno = -archivo.tell() % 8
+    if relleno:
+        archivo.write(b'\0' * relleno)
+    return archivo.tell()
+
+
+def guardar_indice(indice, ruta, indice_campos=None, extra=None):
+    """Escribe un IndicePlacas (y su IndiceCampos) en disco; el reemplazo es atómico para no romper a quien lo tenga abierto
+
+    `extra` se guarda tal cual en la cabecera JSON (estado de la sincronización para otros procesos).
+    """
+    claves = indice.claves_ordenadas()
+    hojas_meta = []
+    primera_fila = 0
+    for hoja in indice.hojas:
+        hojas_meta.append({
+            'hoja': hoja.hoja,
+            'pestana': hoja.pestana,
+            'encabezados': list(hoja.esquema.encabezados),
+            'primera_fila': primera_fila
+        })
+        primera_fila += len(hoja.filas)
+    total_filas = primera_fila
+
+    offsets = array('I', [0])
+    bloque_claves = bytearray()
+    rangos = array('I', [0])
+    ubicaciones = array('I')
+    for clave in claves:
+        bloque_claves += clave.encode('ascii') + SEPARADOR_CLAVES
+        offsets.append(len(bloque_claves))
+        # empaquetar_ubicacion ya rechazó las partes que no entran en uint32; los offsets y rangos que no entren
+        # hacen fallar array('I') con OverflowError en lugar de escribir un archivo truncado
+        for ubicacion in indice.ubicaciones[clave]:
+            ubicaciones.extend(desempaquetar_ubicacion(ubicacion))
+        rangos.append(len(ubicaciones) // 3)
+
+    valores_campos = {}
+    rangos_campos = array('Q', [0])
+    filas_campos = array('Q')
+    marcas = array('q')
+    if indice_campos is not None:
+        for campo in CAMPOS:
+            valores_campos[campo] = sorted(indice_campos.valores[campo])
+            for valor in valores_campos[campo]:
+                filas_campos.extend(indice_campos.valores[campo][valor])
+                rangos_campos.append(len(filas_campos))
+        for idx_hoja, hoja in enumerate(indice.hojas):
+            marcas.extend(indice_campos.marcas[idx_hoja][:len(hoja.filas)])
+    duplicadas = array('Q', sorted(empaquetar_fila(*fila) for fila in indice.duplicada_de))
+
+    meta = {'hojas': hojas_meta, 'extra': extra or {}}
+    if indice_campos is not None:
+        meta['campos'] = valores_campos
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(b'\0' * _CABECERA.size)
+            secciones = []
+
+            secciones.append(_alinear(archivo))
+            archivo.write(json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            for bloque in (offsets, bytes(bloque_claves), rangos, ubicaciones):
+                secciones.append(_alinear(archivo))
+                archivo.write(bloque.tobytes() if isinstance(bloque, array) else bloque)
+
+            # Las filas se escriben por partes para no armar todo el bloque en memoria
+            posiciones = array('Q')
+            secciones.append(_alinear(archivo))
+            archivo.write(b'\0' * 8 * (total_filas + 1))
+            secciones.append(_alinear(archivo))
+            inicio_filas = archivo.tell()
+            for hoja in indice.hojas:
+                for fila in hoja.filas:
+                    posiciones.append(archivo.tell() - inicio_filas)
+                    archivo.write(SEPARADOR_VALORES.join(str(valor) for valor in fila).encode('utf-8'))
+            posiciones.append(archivo.tell() - inicio_filas)
+
+            for bloque in (rangos_campos, filas_campos, marcas, duplicadas):
+                secciones.append(_alinear(archivo))
+                archivo.write(bloque.tobytes())
+            secciones.append(archivo.tell())
+
+            archivo.seek(secciones[5])
+            archivo.write(posiciones.tobytes())
+            archivo.seek(0)
+            archivo.write(_CABECERA.pack(
+                FIRMA, VERSION, len(hojas_meta), len(claves), len(ubicaciones) // 3, *secciones
+            ))
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        os.unlink(ruta_temporal)
+        raise
+
+
+class FilasDisco:
+    """Filas de una pestaña leídas del archivo a medida que se piden (se comporta como HojaRRV.filas)"""
+    __slots__ = ('_indice', '_primera', '_total')
+
+    def __init__(self, indice, primera, total):
+        self._indice = indice
+        self._primera = primera
+        self._total = total
+
+    def __len__(self):
+        return self._total
+
+    def __getitem__(self, idx_fila):
+        if not 0 <= idx_fila < self._total:
+            raise IndexError(idx_fila)
+        return self._indice._fila(self._primera + idx_fila)
+
+    def copy(self):
+        # El archivo no cambia mientras está abierto (se reemplaza entero): no hace falta copiar nada
+        return self
+
+
+class HojaDisco:
+    """Pestaña del índice en disco con la misma forma que HojaRRV"""
+    __slots__ = ('hoja', 'pestana', 'esquema', 'filas')
+
+    def __init__(self, hoja, pestana, esquema, filas):
+        self.hoja = hoja
+        self.pestana = pestana
+        self.esquema = esquema
+        self.filas = filas
+
+
+class FilasDuplicadas:
+    """Conjunto de filas copiadas (idx_hoja, idx_fila), buscado por bisección sobre el archivo"""
+    __slots__ = ('_filas',)
+
+    def __init__(self, filas):
+        self._filas = filas
+
+    def __contains__(self, fila):
+        id_fila = empaquetar_fila(*fila)
+        posicion = bisect_left(self._filas, id_fila)
+        return posicion < len(self._filas) and self._filas[posicion] == id_fila
+
+    def __len__(self):
+        return len(self._filas)
+
+
+class IndiceDisco:
+    """Índice de placas leído directamente del archivo mapeado en memoria
+
+    Las páginas del archivo las comparte el sistema operativo entre todos los procesos que lo abren.
+    """
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        firma, version, _, n_claves, n_ubicaciones, *secciones = _CABECERA.unpack_from(self._mapa, 0)
+        if firma != FIRMA or version != VERSION:
+            self._mapa.close()
+            raise ValueError(f"Archivo de índice no reconocido: {ruta}")
+
+        (meta, offsets, claves, rangos, ubicaciones, posiciones, filas,
+         rangos_campos, filas_campos, marcas, duplicadas, fin) = secciones
+        vista = memoryview(self._mapa)
+        self._meta = json.loads(bytes(vista[meta:offsets]).rstrip(b'\0').decode('utf-8'))
+        self.hojas = self._meta['hojas']
+        self.extra = self._meta['extra']
+        self._esquemas = [obtener_esquema(hoja['encabezados']) for hoja in self.hojas]
+        self._offsets = vista[offsets:offsets + 4 * (n_claves + 1)].cast('I')
+        self._inicio_claves = claves
+        self._fin_claves = claves + self._offsets[-1]
+        self._rangos = vista[rangos:rangos + 4 * (n_claves + 1)].cast('I')
+        self._ubicaciones = vista[ubicaciones:ubicaciones + 12 * n_ubicaciones].cast('I')
+        self._posiciones = vista[posiciones:filas].cast('Q')
+        self._inicio_filas = filas
+        self._rangos_campos = vista[rangos_campos:filas_campos].cast('Q')
+        self._filas_campos = vista[filas_campos:marcas].cast('Q')
+        self._marcas = vista[marcas:duplicadas].cast('q')
+        self._duplicadas = vista[duplicadas:fin].cast('Q')
+        self.n_claves = n_claves
+        self._indice_campos = None
+
+    def _fila(self, fila_global):
+        inicio = self._inicio_filas + self._posiciones[fila_global]
+        fin = self._inicio_filas + self._posiciones[fila_global + 1]
+        return tuple(self._mapa[inicio:fin].decode('utf-8').split(SEPARADOR_VALORES))
+
+    def _marca(self, idx_hoja, idx_fila):
+        """Fecha de una fila: de las marcas del archivo, o de la fila misma si se guardó sin índice de campos"""
+        fila_global = self.hojas[idx_hoja]['primera_fila'] + idx_fila
+        if len(self._marcas):
+            return self._marcas[fila_global]
+        fila = self._fila(fila_global)
+        col_fecha = self._esquemas[idx_hoja].col_fecha
+        return marca_de_tiempo(parsear_fecha(fila[col_fecha] if col_fecha < len(fila) else None))
+
+    def hojas_filas(self):
+        """Pestañas del archivo con sus filas (HojaDisco): `hojas` solo tiene sus metadatos"""
+        limites = [hoja['primera_fila'] for hoja in self.hojas] + [len(self._posiciones) - 1]
+        return [
+            HojaDisco(
+                hoja['hoja'], hoja['pestana'], self._esquemas[idx_hoja],
+                FilasDisco(self, limites[idx_hoja], limites[idx_hoja + 1] - limites[idx_hoja])
+            )
+            for idx_hoja, hoja in enumerate(self.hojas)
+        ]
+
+    def indice_campos(self):
+        """IndiceCampos sobre las listas del archivo (None si se guardó sin índice de campos)"""
+        if self._indice_campos is None and 'campos' in self._meta:
+            hojas = self.hojas_filas()
+            marcas = [
+                self._marcas[hoja['primera_fila']:hoja['primera_fila'] + len(hojas[idx_hoja].filas)]
+                for idx_hoja, hoja in enumerate(self.hojas)
+            ]
+
+            # Solo la lista de valores vive en memoria; las filas de cada valor se leen del archivo
+            valores = {}
+            i = 0
+            for campo in CAMPOS:
+                valores[campo] = {}
+                for valor in self._meta['campos'][campo]:
+                    valores[campo][valor] = self._filas_campos[self._rangos_campos[i]:self._rangos_campos[i + 1]]
+                    i += 1
+            self._indice_campos = IndiceCampos.desde_partes(hojas, valores, marcas, FilasDuplicadas(self._duplicadas))
+        return self._indice_campos
+
+    def total_placas(self):
+        return self.n_claves
+
+    def total_filas(self):
+        return len(self._posiciones) - 1
+
+    def _clave(self, i):
+        inicio = self._inicio_claves + self._offsets[i]
+        fin = self._inicio_claves + self._offsets[i + 1] - 1
+        return self._mapa[inicio:fin].decode('ascii')
+
+    def _bisect_clave(self, clave):
+        """Primera posición cuya placa es >= clave (búsqueda binaria sobre el archivo)"""
+        bajo, alto = 0, self.n_claves
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._clave(medio) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+
+    def _indices(self, claves):
+        indices = []
+        for clave in claves:
+            i = self._bisect_clave(clave)
+            if i < self.n_claves and self._clave(i) == clave:
+                indices.append(i)
+        return indices
+
+    def _registro_disco(self, idx_hoja, idx_fila, col_placa):
+        hoja = self.hojas[idx_hoja]
+        return RegistroPlaca(
+            self._esquemas[idx_hoja], hoja['hoja'], hoja['pestana'], idx_fila + 2, col_placa,
+            self._fila(hoja['primera_fila'] + idx_fila)
+        )
+
+    def _registros_de(self, indices_claves, periodo=None):
+        resultados = []
+        vistas = set()
+        for i in indices_claves:
+            for j in range(self._rangos[i], self._rangos[i + 1]):
+                idx_hoja, idx_fila, col_placa = self._ubicaciones[3 * j:3 * j + 3]
+                if (idx_hoja, idx_fila) in vistas:
+                    continue
+                vistas.add((idx_hoja, idx_fila))
+                # Las filas fuera del período no se leen del archivo
+                if periodo is not None and not en_periodo(self._marca(idx_hoja, idx_fila), periodo):
+                    continue
+                resultados.append(self._registro_disco(idx_hoja, idx_fila, col_placa))
+        return resultados
+
+    def registros(self, claves, periodo=None):
+        """Registros de las filas donde aparecen las placas, sin repetir filas ni copias"""
+        return consolidar_duplicados(self._registros_de(self._indices(claves), periodo))
+
+    def contar_registros(self, claves, periodo=None):
+        """Filas distintas (sin copias) de las placas, contadas con las ubicaciones, las copias y las marcas del archivo
+
+        No lee ninguna fila, salvo con un período en un archivo guardado sin marcas.
+        """
+        copias = FilasDuplicadas(self._duplicadas)
+        filas = set()
+        for i in self._indices(claves):
+            for j in range(self._rangos[i], self._rangos[i + 1]):
+                fila = (self._ubicaciones[3 * j], self._ubicaciones[3 * j + 1])
+                if fila in filas or fila in copias:
+                    continue
+                if periodo is not None and not en_periodo(self._marca(*fila), periodo):
+                    continue
+                filas.add(fila)
+        return len(filas)
+
+    def contar_ubicaciones(self, claves):
+        """Ubicaciones de las placas (cota superior de sus registros), sin leer filas"""
+        return sum(self._rangos[i + 1] - self._rangos[i] for i in self._indices(claves))
+
+    def _marca_maxima(self, i, periodo=None):
+        """Fecha más reciente (dentro del período) entre las filas de la placa i; -1 si no hay"""
+        maxima = -1
+        for j in range(self._rangos[i], self._rangos[i + 1]):
+            marca = self._marca(self._ubicaciones[3 * j], self._ubicaciones[3 * j + 1])
+            if marca > maxima and (periodo is None or en_periodo(marca, periodo)):
+                maxima = marca
+        return maxima
+
+    def estado_actual(self, claves, periodo=None, limite=None):
+        """Último registro de cada placa (el archivo no guarda la tabla de recientes: se calcula al vuelo)
+
+        Con límite primero se eligen por las marcas las placas más recientes y solo se leen sus filas.
+        """
+        if limite is not None and len(claves) > limite:
+            indices = heapq.nlargest(limite, self._indices(claves), key=lambda i: self._marca_maxima(i, periodo))
+            return ultimo_por_placa(consolidar_duplicados(self._registros_de(indices, periodo)))
+        return ultimo_por_placa(self.registros(claves, periodo))
+
+    def historial(self, claves, limite=None, periodo=None, contar=True):
+        """Igual que IndicePlacas.historial: se ordena por las marcas y solo se leen las filas de la página
+
+        Las copias no cuentan ni se ordenan; solo se leen las que tienen la fecha de una fila elegida, para
+        listarlas como sus fuentes. Con contar=False y límite el total es None.
+        """
+        copias = FilasDuplicadas(self._duplicadas)
+        filas = {}
+        candidatas = []
+        for i in self._indices(claves):
+            for j in range(self._rangos[i], self._rangos[i + 1]):
+                idx_hoja, idx_fila, col_placa = self._ubicaciones[3 * j:3 * j + 3]
+                fila = (idx_hoja, idx_fila)
+                if fila in filas:
+                    continue
+                marca = self._marca(idx_hoja, idx_fila)
+                if periodo is not None and not en_periodo(marca, periodo):
+                    continue
+                if fila in copias:
+                    candidatas.append((marca, fila))
+                    filas[fila] = None
+                else:
+                    filas[fila] = (marca, col_placa)
+        originales = [(fila, valor) for fila, valor in filas.items() if valor is not None]
+
+        def orden(elemento):
+            return elemento[1][0]
+
+        if limite is None or limite >= len(originales):
+            elegidas = sorted(originales, key=orden, reverse=True)
+        else:
+            elegidas = heapq.nlargest(limite, originales, key=orden)
+        registros = [
+            self._registro_disco(idx_hoja, idx_fila, col_placa) for (idx_hoja, idx_fila), (_, col_placa) in elegidas
+        ]
+        self._agregar_fuentes(registros, {marca for _, (marca, _) in elegidas}, candidatas)
+        return registros, (None if limite is not None and not contar else len(originales))
+
+    def _agregar_fuentes(self, registros, marcas, copias):
+        """Lista en cada registro las copias de su fila (marca, fila), leyendo solo las que tienen una de sus fechas"""
+        copias = [fila for marca, fila in copias if marca in marcas]
+        if not copias:
+            return
+        por_huella = {huella_fila(registro.esquema, registro.datos): registro for registro in registros}
+        for idx_hoja, idx_fila in copias:
+            hoja = self.hojas[idx_hoja]
+            registro = por_huella.get(huella_fila(self._esquemas[idx_hoja], self._fila(hoja['primera_fila'] + idx_fila)))
+            if registro is not None:
+                if registro.fuentes is None:
+                    registro.fuentes = [(registro.hoja, registro.pestana, registro.fila)]
+                registro.fuentes.append((hoja['hoja'], hoja['pestana'], idx_fila + 2))
+
+    def buscar(self, placa):
+        """Registros cuya placa normalizada contiene el texto buscado"""
+        return self.registros(self.buscar_claves(placa))
+
+    def buscar_claves(self, placa):
+        """Placas normalizadas que contienen el texto buscado"""
+        consulta = normalizar_placa(placa).encode('ascii')
+        if not consulta:
+            return []
+
+        indices = []
+        posicion = self._mapa.find(consulta, self._inicio_claves, self._fin_claves)
+        while posicion != -1:
+            i = bisect_right(self._offsets, posicion - self._inicio_claves) - 1
+            indices.append(i)
+            # Saltar al comienzo de la placa siguiente
+            posicion = self._mapa.find(consulta, self._inicio_claves + self._offsets[i + 1], self._fin_claves)
+        return [self._clave(i) for i in indices]
+
+    def sugerir(self, prefijo, limite=8):
+        """Igual que IndicePlacas.sugerir, leyendo las placas del archivo"""
+        prefijo = normalizar_placa(prefijo)
+        if not prefijo:
+            return [], 0
+
+        inicio = self._bisect_clave(prefijo)
+        fin = self._bisect_clave(prefijo[:-1] + chr(ord(prefijo[-1]) + 1))
+        sugerencias = [
+            (self._clave(i), self._rangos[i + 1] - self._rangos[i])
+            for i in range(inicio, min(fin, inicio + limite))
+        ]
+        return sugerencias, fin - inicio
+
+
+def abrir_indice(ruta):
+    """Abre el índice en disco si existe y es válido; si no, devuelve None"""
+    if not ruta or not os.path.exists(ruta):
+        return None
+    try:
+        return IndiceDisco(ruta)
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,429 @@
+"""
+Índice en memoria de placas normalizadas con búsqueda tolerante a errores de tipeo y OCR
+"""
+import heapq
+import re
+from bisect import bisect_left
+
+from registros import RegistroPlaca, parsear_fecha, marca_de_tiempo, en_periodo
+from planificador import MejoresPorFecha
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9A-Z]')
+
+# Pares de caracteres que se confunden al leer una placa desde una cámara o por teléfono
+CONFUSIONES = [('O', '0'), ('I', '1'), ('B', '8'), ('S', '5'), ('Z', '2'), ('G', '6')]
+
+# Costos en medias unidades para trabajar con enteros: una confusión cuesta 0.5 y cualquier otra edición 1
+COSTO_CONFUSION = 1
+COSTO_EDICION = 2
+
+# Bits de cada parte de una ubicación empaquetada: pestaña (40-63), columna de la placa (32-39) y fila (0-31).
+# El índice en disco guarda cada parte como uint32
+MAX_HOJA = (1 << 24) - 1
+MAX_COLUMNA = (1 << 8) - 1
+MAX_FILA = (1 << 32) - 1
+
+_PARES_CONFUSION = set(CONFUSIONES) | {(b, a) for a, b in CONFUSIONES}
+_A_CANONICA = str.maketrans({letra: digito for letra, digito in CONFUSIONES})
+_ALFABETO_CANONICO = ''.join(
+    c for c in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ' if c not in {letra for letra, _ in CONFUSIONES}
+)
+
+
+def normalizar_placa(texto):
+    """Deja solo letras y dígitos en mayúsculas: 'abc-123 ' -> 'ABC123'"""
+    return _NO_ALFANUMERICO.sub('', str(texto).upper())
+
+
+def forma_canonica(clave):
+    """Colapsa los caracteres confundibles para que 'B0S' y '8O5' compartan forma"""
+    return clave.translate(_A_CANONICA)
+
+
+def _costo_sustitucion(a, b):
+    if a == b:
+        return 0
+    if (a, b) in _PARES_CONFUSION:
+        return COSTO_CONFUSION
+    return COSTO_EDICION
+
+
+def distancia_placas(a, b):
+    """Distancia de edición ponderada entre dos claves normalizadas (las confusiones cuestan 0.5)"""
+    anterior = list(range(0, (len(b) + 1) * COSTO_EDICION, COSTO_EDICION))
+    for i, ca in enumerate(a, start=1):
+        actual = [i * COSTO_EDICION]
+        for j, cb in enumerate(b, start=1):
+            actual.append(min(
+                anterior[j] + COSTO_EDICION,
+                actual[j - 1] + COSTO_EDICION,
+                anterior[j - 1] + _costo_sustitucion(ca, cb)
+            ))
+        anterior = actual
+    return anterior[-1] / 2
+
+
+def vecindario(clave):
+    """Formas a una edición (borrado, sustitución o inserción) de una clave canónica, incluida ella misma"""
+    variantes = {clave}
+    for i in range(len(clave) + 1):
+        izquierda, derecha = clave[:i], clave[i:]
+        for c in _ALFABETO_CANONICO:
+            variantes.add(izquierda + c + derecha)
+        if derecha:
+            variantes.add(izquierda + derecha[1:])
+            for c in _ALFABETO_CANONICO:
+                variantes.add(izquierda + c + derecha[1:])
+    return variantes
+
+
+def ultimo_por_placa(registros):
+    """Registro más reciente de cada placa, del más nuevo al más antiguo"""
+    ultimos = {}
+    for registro in registros:
+        clave = normalizar_placa(registro.placa)
+        fecha = parsear_fecha(registro.fecha)
+        if clave not in ultimos or fecha > ultimos[clave][0]:
+            ultimos[clave] = (fecha, registro)
+    return [registro for _, registro in sorted(ultimos.values(), key=lambda x: x[0], reverse=True)]
+
+
+def empaquetar_ubicacion(idx_hoja, idx_fila, col_placa):
+    if not (0 <= idx_hoja <= MAX_HOJA and 0 <= idx_fila <= MAX_FILA and 0 <= col_placa <= MAX_COLUMNA):
+        raise ValueError(
+            f"Ubicación fuera de rango: pestaña {idx_hoja} (máx. {MAX_HOJA}), fila {idx_fila} (máx. {MAX_FILA}), "
+            f"columna {col_placa} (máx. {MAX_COLUMNA})"
+        )
+    return (idx_hoja << 40) | (col_placa << 32) | idx_fila
+
+
+def desempaquetar_ubicacion(ubicacion):
+    return ubicacion >> 40, ubicacion & 0xFFFFFFFF, (ubicacion >> 32) & 0xFF
+
+
+class _Pestanas:
+    """Lo único que IndicePlacas usa de una instantánea"""
+    __slots__ = ('hojas',)
+
+    def __init__(self, hojas):
+        self.hojas = hojas
+
+
+class IndicePlacas:
+    """Placas normalizadas de una instantánea y las filas donde aparece cada una"""
+
+    def __init__(self, instantanea, indexar=True):
+        self.hojas = list(instantanea.hojas)
+        self.ubicaciones = {}
+        self.canonicas = {}
+        self._claves_ordenadas = None
+        self._texto_claves = None
+        # Último registro de cada placa: clave -> (marca_de_tiempo, ubicación), mantenido a medida que se agregan filas
+        self.recientes = {}
+        # Filas copiadas de otra: (idx_hoja, idx_fila) -> primera aparición, y su inverso
+        self.duplicada_de = {}
+        self.copias = {}
+        # Marca de cada fila por pestaña (las mismas listas que IndiceCampos); sin ellas se calcula desde la fila
+        self.marcas = None
+        # Huella de cada fila por pestaña (array('Q')), para agrupar las copias que deja la ingesta; None: sin calcular
+        self.huellas = None
+        self._posiciones_hojas = {(hoja.hoja, hoja.pestana): i for i, hoja in enumerate(self.hojas)}
+
+        # Con indexar=False las filas se agregan desde afuera (ver ingesta_paralela)
+        if indexar:
+            for idx_hoja, hoja in enumerate(self.hojas):
+                for idx_fila in range(len(hoja.filas)):
+                    self.indexar_fila(idx_hoja, idx_fila)
+
+    def posicion_hoja(self, hoja, pestana):
+        """Índice de la pestaña dentro del índice, o None si no se conoce"""
+        return self._posiciones_hojas.get((hoja, pestana))
+
+    def _claves_de_fila(self, idx_hoja, idx_fila):
+        """[(clave, columna)] de las placas de una fila"""
+        hoja = self.hojas[idx_hoja]
+        fila = hoja.filas[idx_fila]
+        return [
+            (normalizar_placa(fila[col_placa]), col_placa)
+            for col_placa in hoja.esquema.columnas_placa if col_placa < len(fila)
+        ]
+
+    def _marca_fila(self, idx_hoja, idx_fila):
+        hoja = self.hojas[idx_hoja]
+        fila = hoja.filas[idx_fila]
+        col_fecha = hoja.esquema.col_fecha
+        return marca_de_tiempo(parsear_fecha(fila[col_fecha] if col_fecha < len(fila) else None))
+
+    def marca(self, idx_hoja, idx_fila):
+        """Fecha de una fila en segundos, sin leer la fila si se conocen las marcas"""
+        if self.marcas is not None:
+            return self.marcas[idx_hoja][idx_fila]
+        return self._marca_fila(idx_hoja, idx_fila)
+
+    def indexar_fila(self, idx_hoja, idx_fila):
+        """Agrega al índice las placas de una fila con su contenido actual"""
+        marca = self._marca_fila(idx_hoja, idx_fila)
+        for clave, col_placa in self._claves_de_fila(idx_hoja, idx_fila):
+            self.agregar(clave, idx_hoja, idx_fila, col_placa, marca)
+
+    def desindexar_fila(self, idx_hoja, idx_fila):
+        """Quita del índice las placas de una fila (con el contenido que tiene antes de cambiarla)"""
+        for clave, col_placa in self._claves_de_fila(idx_hoja, idx_fila):
+            ubicacion = empaquetar_ubicacion(idx_hoja, idx_fila, col_placa)
+            ubicaciones = self.ubicaciones.get(clave)
+            if not ubicaciones or ubicacion not in ubicaciones:
+                continue
+            ubicaciones.remove(ubicacion)
+
+            if not ubicaciones:
+                del self.ubicaciones[clave]
+                del self.recientes[clave]
+                canonicas = self.canonicas[forma_canonica(clave)]
+                canonicas.remove(clave)
+                if not canonicas:
+                    del self.canonicas[forma_canonica(clave)]
+                self._claves_ordenadas = None
+                self._texto_claves = None
+            elif self.recientes[clave][1] == ubicacion:
+                # Era el registro más reciente de la placa: recalcular entre las filas que quedan (ante fechas
+                # iguales, la primera en el orden de la carga)
+                self.recientes[clave] = min(
+                    ((self._marca_fila(*desempaquetar_ubicacion(otra)[:2]), otra) for otra in ubicaciones),
+                    key=lambda x: (-x[0], desempaquetar_ubicacion(x[1]))
+                )
+
+    def agregar(self, clave, idx_hoja, idx_fila, col_placa, marca):
+        if not clave:
+            return
+        ubicacion = empaquetar_ubicacion(idx_hoja, idx_fila, col_placa)
+        ubicaciones = self.ubicaciones.get(clave)
+        if ubicaciones is None:
+            ubicaciones = self.ubicaciones[clave] = []
+            self.canonicas.setdefault(forma_canonica(clave), []).append(clave)
+            self._claves_ordenadas = None
+            self._texto_claves = None
+        ubicaciones.append(ubicacion)
+
+        # Ante fechas iguales se queda el primero en el orden de la carga (pestaña, fila, columna), igual que el
+        # orden cronológico de los resultados; en la carga llegan en ese orden, la ingesta puede agregar uno anterior
+        reciente = self.recientes.get(clave)
+        if reciente is None or marca > reciente[0] or (
+            marca == reciente[0] and desempaquetar_ubicacion(ubicacion) < desempaquetar_ubicacion(reciente[1])
+        ):
+            self.recientes[clave] = (marca, ubicacion)
+
+    def marcar_duplicados(self, duplicada_de):
+        """Registra las filas repetidas para devolver una sola por grupo, con todas sus fuentes"""
+        self.duplicada_de = duplicada_de
+        self.copias = {}
+        for copia, original in duplicada_de.items():
+            self.copias.setdefault(original, []).append(copia)
+
+    def liberar_duplicado(self, idx_hoja, idx_fila):
+        """La fila cambió: deja de ser copia de otra y, si era original, sus copias pasan a tener otro original
+
+        Devuelve las filas que dejaron de estar ocultas como copias.
+        """
+        fila = (idx_hoja, idx_fila)
+        liberadas = []
+        if self.duplicada_de.pop(fila, None) is not None:
+            for copias in self.copias.values():
+                if fila in copias:
+                    copias.remove(fila)
+                    break
+            liberadas.append(fila)
+
+        copias = self.copias.pop(fila, None)
+        if copias:
+            nuevo_original, resto = copias[0], copias[1:]
+            del self.duplicada_de[nuevo_original]
+            liberadas.append(nuevo_original)
+            for copia in resto:
+                self.duplicada_de[copia] = nuevo_original
+            if resto:
+                self.copias[nuevo_original] = resto
+        return liberadas
+
+    def copiar(self, hojas):
+        """Copia sobre `hojas` (con sus filas ya copiadas) que no ve los cambios posteriores de la ingesta
+
+        Se toma con lock_datos y después se recorre sin él, por ejemplo para guardarla en disco.
+        """
+        copia = IndicePlacas(_Pestanas(hojas), indexar=False)
+        copia.ubicaciones = {clave: list(ubicaciones) for clave, ubicaciones in self.ubicaciones.items()}
+        copia.canonicas = {canonica: list(claves) for canonica, claves in self.canonicas.items()}
+        copia.recientes = dict(self.recientes)
+        copia.duplicada_de = dict(self.duplicada_de)
+        copia.copias = {fila: list(copias) for fila, copias in self.copias.items()}
+        return copia
+
+    def total_placas(self):
+        return len(self.ubicaciones)
+
+    def claves_ordenadas(self):
+        """Lista ordenada de todas las placas, reconstruida solo cuando aparece una placa nueva"""
+        if self._claves_ordenadas is None:
+            self._claves_ordenadas = sorted(self.ubicaciones)
+        return self._claves_ordenadas
+
+    def sugerir(self, prefijo, limite=8):
+        """Placas que empiezan con el prefijo en orden alfabético: ([(clave, registros)], total de placas)"""
+        prefijo = normalizar_placa(prefijo)
+        if not prefijo:
+            return [], 0
+
+        claves = self.claves_ordenadas()
+        inicio = bisect_left(claves, prefijo)
+        fin = bisect_left(claves, prefijo[:-1] + chr(ord(prefijo[-1]) + 1), inicio)
+        sugerencias = [(clave, len(self.ubicaciones[clave])) for clave in claves[inicio:min(fin, inicio + limite)]]
+        return sugerencias, fin - inicio
+
+    def _registro(self, ubicacion):
+        idx_hoja, idx_fila, col_placa = desempaquetar_ubicacion(ubicacion)
+        hoja = self.hojas[idx_hoja]
+        fuentes = None
+        copias = self.copias.get((idx_hoja, idx_fila))
+        if copias:
+            fuentes = [
+                (self.hojas[h].hoja, self.hojas[h].pestana, f + 2)
+                for h, f in [(idx_hoja, idx_fila)] + copias
+            ]
+        return RegistroPlaca(
+            hoja.esquema, hoja.hoja, hoja.pestana, idx_fila + 2, col_placa, hoja.filas[idx_fila], fuentes
+        )
+
+    def _ubicaciones_filas(self, claves, periodo=None):
+        """Una ubicación por fila distinta (sin copias) de las placas; con período, solo las filas de esas fechas
+
+        Las fechas salen de las marcas, así las filas fuera del período no se leen.
+        """
+        ubicaciones = {}
+        for clave in claves:
+            for ubicacion in self.ubicaciones.get(clave, ()):
+                fila = desempaquetar_ubicacion(ubicacion)[:2]
+                if fila in ubicaciones or fila in self.duplicada_de:
+                    continue
+                if periodo is not None and not en_periodo(self.marca(*fila), periodo):
+                    continue
+                ubicaciones[fila] = ubicacion
+        return list(ubicaciones.values())
+
+    def registros(self, claves, periodo=None):
+        """Construye los registros de las filas donde aparecen las claves, sin repetir filas"""
+        return [self._registro(ubicacion) for ubicacion in self._ubicaciones_filas(claves, periodo)]
+
+    def contar_registros(self, claves, periodo=None):
+        """Cantidad de filas distintas (sin contar copias) donde aparecen las placas, sin construir los registros"""
+        return len(self._ubicaciones_filas(claves, periodo))
+
+    def contar_ubicaciones(self, claves):
+        """Ubicaciones de las placas (cota superior de sus registros): solo mira el largo de cada lista"""
+        return sum(len(self.ubicaciones.get(clave, ())) for clave in claves)
+
+    def estado_actual(self, claves, periodo=None, limite=None):
+        """Último registro de cada placa, del más nuevo al más antiguo (con límite, solo las más recientes)
+
+        Sin período es una consulta por clave a la tabla de recientes; con período se busca entre las filas de esas fechas.
+        """
+        if periodo is None:
+            recientes = [self.recientes[clave] for clave in claves if clave in self.recientes]
+        else:
+            ultimos = {}
+            for clave in claves:
+                for ubicacion in self.ubicaciones.get(clave, ()):
+                    fila = desempaquetar_ubicacion(ubicacion)[:2]
+                    if fila in self.duplicada_de:
+                        continue
+                    marca = self.marca(*fila)
+                    if en_periodo(marca, periodo) and (clave not in ultimos or marca > ultimos[clave][0]):
+                        ultimos[clave] = (marca, ubicacion)
+            recientes = list(ultimos.values())
+        if limite is not None and limite < len(recientes):
+            recientes = heapq.nlargest(limite, recientes, key=lambda x: x[0])
+        else:
+            recientes.sort(key=lambda x: x[0], reverse=True)
+        return [self._registro(ubicacion) for _, ubicacion in recientes]
+
+    def historial(self, claves, limite=None, periodo=None, contar=True):
+        """Registros de las placas del más reciente al más antiguo, hasta `limite`: (registros, total)
+
+        Se ordena por las marcas y solo se leen las filas que entran en la página. Con contar=False el total
+        es None y la búsqueda termina sin revisar las placas que ya no pueden entrar en la página.
+        """
+        if limite is not None and not contar:
+            return self._historial_limitado(claves, limite, periodo), None
+
+        ubicaciones = self._ubicaciones_filas(claves, periodo)
+
+        def orden(ubicacion):
+            return self.marca(*desempaquetar_ubicacion(ubicacion)[:2])
+
+        if limite is None or limite >= len(ubicaciones):
+            elegidas = sorted(ubicaciones, key=orden, reverse=True)
+        else:
+            elegidas = heapq.nlargest(limite, ubicaciones, key=orden)
+        return [self._registro(ubicacion) for ubicacion in elegidas], len(ubicaciones)
+
+    def _historial_limitado(self, claves, limite, periodo):
+        """Las `limite` filas más recientes recorriendo las placas de la más reciente a la más antigua
+
+        La tabla de recientes da la fecha máxima de cada placa: cuando la siguiente placa no supera a la
+        fila más antigua ya elegida, ni ella ni las que siguen pueden entrar y se deja de buscar.
+        """
+        orden = sorted((clave for clave in claves if clave in self.recientes),
+                       key=lambda clave: self.recientes[clave][0], reverse=True)
+        mejores = MejoresPorFecha(limite)
+        vistas = set()
+        for clave in orden:
+            if mejores.completo() and self.recientes[clave][0] <= mejores.marca_minima():
+                break
+            for ubicacion in self.ubicaciones[clave]:
+                fila = desempaquetar_ubicacion(ubicacion)[:2]
+                if fila in vistas or fila in self.duplicada_de:
+                    continue
+                vistas.add(fila)
+                marca = self.marca(*fila)
+                if periodo is None or en_periodo(marca, periodo):
+                    mejores.agregar(marca, ubicacion)
+        return [self._registro(ubicacion) for ubicacion in mejores.resultados()]
+
+    def buscar(self, placa):
+        """Registros cuya placa normalizada contiene el texto buscado"""
+        return self.registros(self.buscar_claves(placa))
+
+    def buscar_claves(self, placa):
+        """Placas normalizadas que contienen el texto buscado"""
+        consulta = normalizar_placa(placa)
+        if not consulta:
+            return []
+        # Buscar sobre todas las placas unidas en un solo texto es mucho más rápido que recorrerlas una a una
+        if self._texto_claves is None:
+            self._texto_claves = '\n'.join(self.claves_ordenadas()) + '\n'
+        texto = self._texto_claves
+
+        claves = []
+        posicion = texto.find(consulta)
+        while posicion != -1:
+            inicio = texto.rfind('\n', 0, posicion) + 1
+            fin = texto.find('\n', posicion)
+            claves.append(texto[inicio:fin])
+            posicion = texto.find(consulta, fin)
+        return claves
+
+    def buscar_aproximada(self, placa, limite=20):
+        """Placas parecidas a la buscada ordenadas por distancia: [(clave, distancia, registros)]"""
+        clave = normalizar_placa(placa)
+        if not clave:
+            return []
+
+        candidatas = set()
+        for variante in vecindario(forma_canonica(clave)):
+            candidatas.update(self.canonicas.get(variante, ()))
+
+        ranking = sorted(
+            (distancia_placas(clave, candidata), candidata) for candidata in candidatas
+        )
+        return [
+            (candidata, distancia, len(self.ubicaciones[candidata]))
+            for distancia, candidata in ranking[:limite]
+        ]
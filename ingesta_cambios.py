@@ -0,0 +1,280 @@
+"""
+Ingesta de cambios fila por fila (por ejemplo desde un disparador onEdit de Apps Script)
+que actualiza los índices en memoria sin volver a descargar la pestaña
+
+Cada cambio es un JSON con:
+    hoja     título de la hoja de cálculo
+    pestana  título de la pestaña
+    fila     número de fila en la hoja (la 1 son los encabezados)
+    valores  lista con todos los valores de la fila
+    marca    (opcional) número creciente, por ejemplo la hora de edición en ms; un cambio con una
+             marca menor o igual a la última aplicada para esa fila se descarta
+"""
+import hmac
+import json
+import os
+import threading
+from array import array
+from bisect import insort
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from duplicados import huella_fila
+from indice_placas import MAX_FILA
+
+RUTA_CAMBIOS = '/cambios'
+RUTA_ESTADO = '/estado'
+CABECERA_TOKEN = 'X-RRV-Token'
+# Sin token configurado no se abre el servidor de ingesta
+TOKEN_INGESTA = os.environ.get('RRV_INGESTA_TOKEN')
+PUERTO_INGESTA = int(os.environ.get('RRV_INGESTA_PUERTO', 8765))
+# Tamaño máximo aceptado por petición
+MAXIMO_BYTES = 5 * 1024 * 1024
+# Cambios que se guardan mientras todavía no hay índice en memoria; con más se responde 503 para que se reintenten
+MAXIMO_EN_ESPERA = 10000
+# Filas vacías que un cambio puede agregar al final de una pestaña; más lejos se descarga completa
+MAXIMO_FILAS_NUEVAS = 1000
+
+
+class CambioInvalido(ValueError):
+    pass
+
+
+def validar_cambio(datos):
+    """Convierte el JSON recibido en un cambio normalizado o lanza CambioInvalido"""
+    if not isinstance(datos, dict):
+        raise CambioInvalido("Cada cambio debe ser un objeto JSON")
+    # Un texto también es iterable: se tomaría un carácter por columna
+    if not isinstance(datos.get('valores'), list):
+        raise CambioInvalido("'valores' debe ser una lista con los valores de la fila")
+    try:
+        cambio = {
+            'hoja': str(datos['hoja']),
+            'pestana': str(datos['pestana']),
+            'fila': int(datos['fila']),
+            'valores': tuple('' if valor is None else str(valor) for valor in datos['valores']),
+            'marca': datos.get('marca')
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise CambioInvalido(f"Cambio incompleto o mal formado: {str(e)}")
+    if not 1 <= cambio['fila'] <= MAX_FILA + 2:
+        raise CambioInvalido(f"El número de fila debe estar entre 1 y {MAX_FILA + 2}")
+    # bool es subclase de int: true/false no son marcas
+    marca = cambio['marca']
+    if marca is not None and (isinstance(marca, bool) or not isinstance(marca, (int, float))):
+        raise CambioInvalido("La marca debe ser numérica")
+    return cambio
+
+
+def huellas_indice(indice):
+    """Huella de cada fila por pestaña: las de la carga, o calculadas con el primer cambio si el índice no las tiene"""
+    if indice.huellas is None:
+        indice.huellas = [
+            array('Q', (huella_fila(hoja.esquema, hoja.filas[idx_fila]) for idx_fila in range(len(hoja.filas))))
+            for hoja in indice.hojas
+        ]
+    return indice.huellas
+
+
+def _primera_con_huella(huellas, huella, excepto):
+    """Primera fila (en el orden de las pestañas) con esa huella, sin contar `excepto`; None si no hay"""
+    for idx_hoja, huellas_hoja in enumerate(huellas):
+        inicio = 0
+        while True:
+            try:
+                idx_fila = huellas_hoja.index(huella, inicio)
+            except ValueError:
+                break
+            if (idx_hoja, idx_fila) != excepto:
+                return idx_hoja, idx_fila
+            inicio = idx_fila + 1
+    return None
+
+
+def marcar_copia(indice, idx_hoja, idx_fila):
+    """Agrupa la fila con las que tienen su mismo contenido, igual que agrupar_duplicados en la carga completa
+
+    La fila no tiene que ser copia de nadie (ver liberar_duplicado). Si otra fila anterior tiene el mismo
+    contenido pasa a ser su copia; si la fila queda antes del original del grupo, ella es el nuevo original.
+    Devuelve las filas que quedaron ocultas como copias.
+    """
+    huellas = huellas_indice(indice)
+    hoja = indice.hojas[idx_hoja]
+    huella = huella_fila(hoja.esquema, hoja.filas[idx_fila])
+    if idx_fila == len(huellas[idx_hoja]):
+        huellas[idx_hoja].append(huella)
+    else:
+        huellas[idx_hoja][idx_fila] = huella
+
+    fila = (idx_hoja, idx_fila)
+    original = _primera_con_huella(huellas, huella, fila)
+    if original is None:
+        return []
+    if original < fila:
+        indice.duplicada_de[fila] = original
+        insort(indice.copias.setdefault(original, []), fila)
+        return [fila]
+    copias = [original] + indice.copias.pop(original, [])
+    for copia in copias:
+        indice.duplicada_de[copia] = fila
+    indice.copias[fila] = copias
+    return [original]
+
+
+def aplicar_cambio(indice, indice_campos, cambio):
+    """Reemplaza una fila en los índices; aplicar dos veces el mismo cambio deja el mismo estado
+
+    Devuelve 'aplicado', 'sin_cambios', 'pestana_desconocida', 'encabezados' o 'fila_fuera_de_rango'.
+    """
+    if cambio['fila'] == 1:
+        # Cambiar encabezados cambia las columnas de todas las filas: se resuelve con una sincronización completa
+        return 'encabezados'
+
+    idx_hoja = indice.posicion_hoja(cambio['hoja'], cambio['pestana'])
+    if idx_hoja is None:
+        return 'pestana_desconocida'
+
+    hoja = indice.hojas[idx_hoja]
+    idx_fila = cambio['fila'] - 2
+    if idx_fila < len(hoja.filas) and hoja.filas[idx_fila] == cambio['valores']:
+        return 'sin_cambios'
+    if idx_fila - len(hoja.filas) >= MAXIMO_FILAS_NUEVAS:
+        # Rellenar hasta ahí se haría con lock_datos tomado
+        return 'fila_fuera_de_rango'
+
+    while len(hoja.filas) <= idx_fila:
+        hoja.filas.append(())
+        # Las filas vacías también se agrupan como copias entre sí, igual que en la carga completa
+        ocultas = marcar_copia(indice, idx_hoja, len(hoja.filas) - 1)
+        if indice_campos is not None:
+            indice_campos.agregar_fila(idx_hoja, len(hoja.filas) - 1)
+            for otra_hoja, otra_fila in ocultas:
+                if otra_fila != len(hoja.filas) - 1 or otra_hoja != idx_hoja:
+                    indice_campos.quitar_fila(otra_hoja, otra_fila)
+
+    indice.desindexar_fila(idx_hoja, idx_fila)
+    if indice_campos is not None:
+        indice_campos.quitar_fila(idx_hoja, idx_fila)
+
+    hoja.filas[idx_fila] = cambio['valores']
+    liberadas = indice.liberar_duplicado(idx_hoja, idx_fila)
+    ocultas = marcar_copia(indice, idx_hoja, idx_fila)
+
+    indice.indexar_fila(idx_hoja, idx_fila)
+    if indice_campos is not None:
+        indice_campos.agregar_fila(idx_hoja, idx_fila)
+        for otra_hoja, otra_fila in liberadas:
+            if (otra_hoja, otra_fila) != (idx_hoja, idx_fila):
+                indice_campos.indexar_valores(otra_hoja, otra_fila)
+        for otra_hoja, otra_fila in ocultas:
+            if (otra_hoja, otra_fila) != (idx_hoja, idx_fila):
+                indice_campos.quitar_fila(otra_hoja, otra_fila)
+    return 'aplicado'
+
+
+class ReceptorCambios:
+    """Aplica los cambios recibidos sobre los índices del servicio y recuerda la última marca de cada fila"""
+
+    def __init__(self, servicio):
+        self.servicio = servicio
+        # (hoja, pestaña, fila) -> última marca aplicada. Se conserva entre sincronizaciones: un reintento tardío
+        # de una edición anterior no debe deshacer sobre el índice nuevo la que ya trae la descarga (una entrada
+        # por fila editada)
+        self.versiones = {}
+        self.contadores = {}
+        # Cambios recibidos antes de que haya índice en memoria (arranque, primera sincronización): se aplican
+        # sobre el índice nuevo antes de instalarlo
+        self.en_espera = []
+        # Falla al abrir el servidor de ingesta, para mostrarla en la interfaz
+        self.error = None
+
+    def recibir(self, cambio):
+        """Aplica un cambio ya validado y devuelve el resultado"""
+        with self.servicio.lock_datos:
+            clave = (cambio['hoja'], cambio['pestana'], cambio['fila'])
+            marca = cambio['marca']
+            if marca is not None and clave in self.versiones and marca <= self.versiones[clave]:
+                resultado = 'repetido'
+            elif self.servicio.indice is None:
+                if len(self.en_espera) < MAXIMO_EN_ESPERA:
+                    self.en_espera.append(cambio)
+                    if marca is not None:
+                        self.versiones[clave] = marca
+                    resultado = 'en_espera'
+                else:
+                    resultado = 'indice_no_disponible'
+            else:
+                resultado = aplicar_cambio(self.servicio.indice, self.servicio.indice_campos, cambio)
+                if marca is not None and resultado in ('aplicado', 'sin_cambios'):
+                    self.versiones[clave] = marca
+                if resultado == 'aplicado':
+                    self.servicio.registrar_cambio(cambio)
+                elif resultado in ('encabezados', 'pestana_desconocida', 'fila_fuera_de_rango'):
+                    self.servicio.solicitar_sincronizacion()
+            self.contadores[resultado] = self.contadores.get(resultado, 0) + 1
+            return resultado
+
+    def aplicar_en_espera(self, indice, indice_campos):
+        """Aplica los cambios en espera sobre un índice que se va a instalar (se llama con lock_datos tomado)
+
+        Devuelve True si alguno pide una sincronización completa (encabezados, pestaña desconocida o fila lejana).
+        """
+        resultados = [aplicar_cambio(indice, indice_campos, cambio) for cambio in self.en_espera]
+        self.en_espera = []
+        return any(resultado in ('encabezados', 'pestana_desconocida', 'fila_fuera_de_rango') for resultado in resultados)
+
+
+def crear_servidor_ingesta(receptor, token, puerto, direccion='0.0.0.0'):
+    """Servidor HTTP que recibe POST /cambios con un cambio o una lista de cambios"""
+
+    class ManejadorCambios(BaseHTTPRequestHandler):
+        def _responder(self, estado, cuerpo):
+            datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _autorizado(self):
+            # En bytes: con un encabezado que no es ASCII compare_digest lanzaría TypeError (500 en vez de 401)
+            return hmac.compare_digest(self.headers.get(CABECERA_TOKEN, '').encode('utf-8'), token.encode('utf-8'))
+
+        def do_GET(self):
+            if self.path != RUTA_ESTADO:
+                return self._responder(404, {'error': 'Ruta no encontrada'})
+            if not self._autorizado():
+                return self._responder(401, {'error': 'Token inválido'})
+            self._responder(200, {'contadores': receptor.contadores})
+
+        def do_POST(self):
+            if self.path != RUTA_CAMBIOS:
+                return self._responder(404, {'error': 'Ruta no encontrada'})
+            if not self._autorizado():
+                return self._responder(401, {'error': 'Token inválido'})
+
+            longitud = int(self.headers.get('Content-Length') or 0)
+            if longitud > MAXIMO_BYTES:
+                return self._responder(413, {'error': 'Petición demasiado grande'})
+            try:
+                datos = json.loads(self.rfile.read(longitud).decode('utf-8'))
+                cambios = [validar_cambio(dato) for dato in (datos if isinstance(datos, list) else [datos])]
+            except (ValueError, UnicodeDecodeError) as e:
+                return self._responder(400, {'error': str(e)})
+
+            resultados = [receptor.recibir(cambio) for cambio in cambios]
+            # Sin índice y con la espera llena: el cliente debe reintentar más tarde (las marcas evitan duplicarlos)
+            estado = 503 if 'indice_no_disponible' in resultados else 200
+            self._responder(estado, {'resultados': resultados})
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((direccion, puerto), ManejadorCambios)
+
+
+def iniciar_servidor_ingesta(receptor, token, puerto, direccion='0.0.0.0'):
+    """Arranca el servidor de ingesta en un hilo de fondo y lo devuelve"""
+    servidor = crear_servidor_ingesta(receptor, token, puerto, direccion)
+    hilo = threading.Thread(target=servidor.serve_forever, name='ingesta-rrv', daemon=True)
+    hilo.start()
+    return servidor
@@ -0,0 +1,147 @@
+"""
+Construcción de los índices repartiendo la normalización de las filas entre varios procesos
+
+Cada proceso recibe un bloque de filas de una pestaña y devuelve un FragmentoHoja compacto (arrays y
+textos unidos, no listas de diccionarios); el proceso principal solo combina los fragmentos.
+"""
+import os
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from registros import obtener_esquema, parsear_fecha, normalizar_valor, marca_de_tiempo
+from indice_placas import IndicePlacas, normalizar_placa
+from indice_campos import CAMPOS, IndiceCampos, empaquetar_fila
+from duplicados import huella_fila, agrupar_duplicados
+
+# Procesos para normalizar filas (0 o 1: todo en el proceso actual)
+PROCESOS_INGESTA = int(os.environ.get('RRV_PROCESOS_INGESTA', min(4, os.cpu_count() or 1)))
+# Por debajo de esta cantidad de filas arrancar procesos cuesta más de lo que ahorra
+UMBRAL_FILAS_PARALELO = 50000
+# Filas por tarea: las pestañas muy grandes se reparten en varios bloques
+FILAS_POR_BLOQUE = 25000
+
+SEPARADOR_CLAVES = '\n'
+SEPARADOR_VALORES = '\x1f'
+# Índice de valor para las filas sin valor en un campo
+SIN_VALOR = 0xFFFFFFFF
+
+
+class FragmentoHoja:
+    """Resultado de normalizar un bloque de filas; las filas se numeran desde el inicio del bloque"""
+    __slots__ = ('claves', 'ocurrencias', 'marcas', 'huellas', 'campos')
+
+    def __init__(self, claves, ocurrencias, marcas, huellas, campos):
+        # Placas distintas del bloque unidas por SEPARADOR_CLAVES
+        self.claves = claves
+        # uint32 x 3 por placa encontrada: índice de la placa, fila, columna
+        self.ocurrencias = ocurrencias
+        # int64 por fila: marca_de_tiempo de su fecha
+        self.marcas = marcas
+        # uint64 por fila: huella_fila
+        self.huellas = huellas
+        # campo -> (valores distintos unidos por SEPARADOR_VALORES, uint32 por fila con el índice del valor)
+        self.campos = campos
+
+
+def procesar_bloque(encabezados, filas):
+    """Trabajo de cada proceso: placas, fechas, huellas y valores de campo de un bloque de filas"""
+    esquema = obtener_esquema(encabezados)
+    claves = {}
+    ocurrencias = array('I')
+    marcas = array('q')
+    huellas = array('Q')
+    valores = {campo: {} for campo in CAMPOS}
+    indices_valores = {campo: array('I') for campo in CAMPOS}
+    columnas_campos = [(campo, getattr(esquema, atributo)) for campo, atributo in CAMPOS.items()]
+
+    for idx_fila, fila in enumerate(filas):
+        fecha = fila[esquema.col_fecha] if esquema.col_fecha < len(fila) else None
+        marcas.append(marca_de_tiempo(parsear_fecha(fecha)))
+        huellas.append(huella_fila(esquema, fila))
+
+        for col_placa in esquema.columnas_placa:
+            if col_placa < len(fila):
+                clave = normalizar_placa(fila[col_placa])
+                if clave:
+                    ocurrencias.extend((claves.setdefault(clave, len(claves)), idx_fila, col_placa))
+
+        for campo, columna in columnas_campos:
+            valor = normalizar_valor(fila[columna]) if columna < len(fila) else ''
+            indices_valores[campo].append(valores[campo].setdefault(valor, len(valores[campo])) if valor else SIN_VALOR)
+
+    campos = {
+        campo: (SEPARADOR_VALORES.join(valores[campo]), indices_valores[campo])
+        for campo in CAMPOS
+    }
+    return FragmentoHoja(SEPARADOR_CLAVES.join(claves), ocurrencias, marcas, huellas, campos)
+
+
+def _bloques(hojas):
+    """(idx_hoja, primera fila, filas) de cada tarea, repartiendo las pestañas grandes"""
+    for idx_hoja, hoja in enumerate(hojas):
+        for inicio in range(0, len(hoja.filas), FILAS_POR_BLOQUE):
+            yield idx_hoja, inicio, hoja.filas[inicio:inicio + FILAS_POR_BLOQUE]
+
+
+def normalizar_hojas(hojas, procesos=PROCESOS_INGESTA):
+    """Fragmentos de todas las pestañas: [(idx_hoja, primera fila, FragmentoHoja)] en orden"""
+    bloques = list(_bloques(hojas))
+    total_filas = sum(len(hoja.filas) for hoja in hojas)
+    if procesos <= 1 or len(bloques) < 2 or total_filas < UMBRAL_FILAS_PARALELO:
+        return [
+            (idx_hoja, inicio, procesar_bloque(hojas[idx_hoja].esquema.encabezados, filas))
+            for idx_hoja, inicio, filas in bloques
+        ]
+
+    # 'spawn' porque el proceso principal tiene hilos (Streamlit, precarga) y fork podría heredar locks tomados
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(procesos, len(bloques)), mp_context=contexto) as executor:
+        futuros = [
+            executor.submit(procesar_bloque, hojas[idx_hoja].esquema.encabezados, filas)
+            for idx_hoja, _, filas in bloques
+        ]
+        return [(idx_hoja, inicio, futuro.result()) for (idx_hoja, inicio, _), futuro in zip(bloques, futuros)]
+
+
+def construir_indices(instantanea, procesos=PROCESOS_INGESTA):
+    """Índice de placas, copias e índice por campos de una instantánea: (indice, duplicada_de, estadisticas, indice_campos)"""
+    return combinar_fragmentos(instantanea, normalizar_hojas(instantanea.hojas, procesos))
+
+
+def combinar_fragmentos(instantanea, fragmentos):
+    """Arma los índices a partir de los fragmentos ya normalizados de todas las pestañas de la instantánea"""
+    hojas = instantanea.hojas
+    indice = IndicePlacas(instantanea, indexar=False)
+    marcas = [array('q') for _ in hojas]
+    huellas = [array('Q') for _ in hojas]
+    for idx_hoja, inicio, fragmento in fragmentos:
+        marcas[idx_hoja].extend(fragmento.marcas)
+        huellas[idx_hoja].extend(fragmento.huellas)
+        claves = fragmento.claves.split(SEPARADOR_CLAVES)
+        ocurrencias = fragmento.ocurrencias
+        for i in range(0, len(ocurrencias), 3):
+            idx_clave, idx_fila, col_placa = ocurrencias[i:i + 3]
+            indice.agregar(claves[idx_clave], idx_hoja, inicio + idx_fila, col_placa, fragmento.marcas[idx_fila])
+
+    duplicada_de, estadisticas = agrupar_duplicados(hojas, huellas)
+    indice.marcar_duplicados(duplicada_de)
+
+    # Los fragmentos llegan en orden de fila, así cada lista queda ordenada sin reordenar
+    valores = {campo: {} for campo in CAMPOS}
+    for idx_hoja, inicio, fragmento in fragmentos:
+        for campo, (texto, indices_valores) in fragmento.campos.items():
+            nombres = texto.split(SEPARADOR_VALORES)
+            filas_de = [None] * len(nombres)
+            for idx_fila, idx_valor in enumerate(indices_valores):
+                if idx_valor == SIN_VALOR or (idx_hoja, inicio + idx_fila) in duplicada_de:
+                    continue
+                filas = filas_de[idx_valor]
+                if filas is None:
+                    filas = filas_de[idx_valor] = valores[campo].setdefault(nombres[idx_valor], array('Q'))
+                filas.append(empaquetar_fila(idx_hoja, inicio + idx_fila))
+    indice_campos = IndiceCampos.desde_partes(list(hojas), valores, marcas, duplicada_de)
+    indice.marcas = marcas
+    indice.huellas = huellas
+
+    return indice, duplicada_de, estadisticas, indice_campos
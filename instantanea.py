@@ -0,0 +1,64 @@
+"""
+Copia en memoria de todas las pestañas de las hojas RRV
+"""
+import sys
+from datetime import datetime
+
+from registros import obtener_esquema
+
+
+class HojaRRV:
+    """Pestaña descargada: la fila i de `filas` corresponde a la fila i + 2 de la hoja"""
+    __slots__ = ('hoja', 'pestana', 'esquema', 'filas')
+
+    def __init__(self, hoja, pestana, encabezados, filas):
+        self.hoja = sys.intern(hoja)
+        self.pestana = sys.intern(pestana)
+        self.esquema = obtener_esquema(encabezados)
+        self.filas = [tuple(fila) for fila in filas]
+
+
+class InstantaneaRRV:
+    """Conjunto de pestañas RRV descargadas en un momento dado"""
+
+    def __init__(self, hojas=None):
+        self.hojas = hojas or []
+        self.cargada_en = datetime.now()
+
+    def total_filas(self):
+        return sum(len(hoja.filas) for hoja in self.hojas)
+
+
+def listar_hojas_rrv(gc):
+    """Devuelve las hojas de cálculo con 'RRV' en el nombre"""
+    return [hoja for hoja in gc.openall() if "RRV" in hoja.title]
+
+
+def descargar_instantanea(gc, al_avanzar=None, hojas_rrv=None):
+    """Descarga todas las pestañas de las hojas RRV; `al_avanzar` recibe la fracción completada"""
+    if hojas_rrv is None:
+        hojas_rrv = listar_hojas_rrv(gc)
+    hojas = []
+
+    # Cliente asíncrono: todas las pestañas se descargan a la vez y el recorrido de abajo ya no espera a la red
+    if hasattr(gc, 'precargar'):
+        gc.precargar(hojas_rrv, al_avanzar)
+        al_avanzar = None
+
+    for idx, hoja in enumerate(hojas_rrv):
+        try:
+            for worksheet in hoja.worksheets():
+                try:
+                    data = worksheet.get_all_values()
+                    if not data or len(data) < 2:
+                        continue
+                    hojas.append(HojaRRV(hoja.title, worksheet.title, data[0], data[1:]))
+                except Exception:
+                    continue
+        except Exception:
+            continue
+
+        if al_avanzar:
+            al_avanzar((idx + 1) / len(hojas_rrv))
+
+    return InstantaneaRRV(hojas)
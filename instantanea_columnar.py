@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Instantánea de todas las pestañas RRV en un solo archivo columnar (Parquet o Arrow), para análisis sin conexión
+y para arrancar la aplicación sin Google Sheets
+
+Columnas: hoja, pestana, fila (número en la hoja), placa (primera placa normalizada), placas (una por columna de
+placa del esquema, '' si está vacía), fecha (null si no se pudo leer), empresa, proyecto y sistema normalizados,
+huella (de duplicados.huella_fila) y valores (la fila tal cual). Los encabezados de cada pestaña van en los
+metadatos del esquema.
+
+El formato sale de la extensión: '.parquet' comprime (para guardar o compartir); '.arrow' se abre con mmap sin
+copiar las columnas, que es lo más rápido para arrancar. pyarrow solo se importa al exportar o cargar.
+
+Uso:
+    python instantanea_columnar.py exportar rrv.parquet --credenciales credenciales.json
+    python instantanea_columnar.py exportar rrv.arrow --falso --filas 200000
+    python instantanea_columnar.py cargar rrv.arrow
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from instantanea import InstantaneaRRV
+from registros import obtener_esquema, marca_de_tiempo
+from indice_campos import CAMPOS
+from ingesta_paralela import (
+    FragmentoHoja, procesar_bloque, combinar_fragmentos, SEPARADOR_CLAVES, SEPARADOR_VALORES, SIN_VALOR
+)
+
+VERSION = 1
+CLAVE_METADATOS = b'rrv'
+# marca_de_tiempo del 1/1/1970 (la columna fecha se guarda en segundos Unix) y de una fecha que no se pudo leer
+MARCA_EPOCA = marca_de_tiempo(datetime(1970, 1, 1))
+MARCA_SIN_FECHA = marca_de_tiempo(datetime.min)
+
+
+def importar_pyarrow():
+    """(pyarrow, pyarrow.compute); error claro si no está instalado"""
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError:
+        raise RuntimeError("Las instantáneas columnares necesitan pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.compute
+
+
+def es_parquet(ruta):
+    return ruta.lower().endswith('.parquet')
+
+
+class FilasColumnares:
+    """Filas de una pestaña leídas de la instantánea a medida que se piden (se comporta como HojaRRV.filas)
+
+    Las filas que cambia la ingesta quedan en memoria por encima de las de la instantánea.
+    """
+    __slots__ = ('_valores', '_total', '_editadas')
+
+    def __init__(self, valores):
+        self._valores = valores
+        self._total = len(valores)
+        self._editadas = {}
+
+    def __len__(self):
+        return self._total
+
+    def __getitem__(self, idx_fila):
+        if isinstance(idx_fila, slice):
+            return [self[i] for i in range(*idx_fila.indices(self._total))]
+        if not 0 <= idx_fila < self._total:
+            raise IndexError(idx_fila)
+        fila = self._editadas.get(idx_fila)
+        if fila is None:
+            fila = tuple(self._valores[idx_fila].as_py())
+        return fila
+
+    def __setitem__(self, idx_fila, fila):
+        if not 0 <= idx_fila < self._total:
+            raise IndexError(idx_fila)
+        self._editadas[idx_fila] = fila
+
+    def append(self, fila):
+        self._editadas[self._total] = fila
+        self._total += 1
+
+    def copy(self):
+        """Copia que no ve las ediciones posteriores (como list.copy); la instantánea no se copia"""
+        copia = FilasColumnares(self._valores)
+        copia._total = self._total
+        copia._editadas = dict(self._editadas)
+        return copia
+
+
+class HojaColumnar:
+    """Pestaña de la instantánea con la misma forma que HojaRRV"""
+    __slots__ = ('hoja', 'pestana', 'esquema', 'filas')
+
+    def __init__(self, hoja, pestana, encabezados, filas):
+        self.hoja = sys.intern(hoja)
+        self.pestana = sys.intern(pestana)
+        self.esquema = obtener_esquema(encabezados)
+        self.filas = filas
+
+
+def exportar_instantanea(hojas, ruta, extra=None):
+    """Escribe las pestañas (HojaRRV o cualquier objeto con su forma) en un archivo Parquet o Arrow
+
+    `extra` se guarda en los metadatos (por ejemplo, cuándo se sincronizaron los datos). El reemplazo es atómico.
+    Devuelve la cantidad de filas escritas.
+    """
+    pa, _ = importar_pyarrow()
+
+    nombres_hojas, nombres_pestanas = {}, {}
+    columnas = {nombre: [] for nombre in ('hoja', 'pestana', 'fila', 'placa', 'placas', 'fecha', 'huella', 'valores')}
+    for campo in CAMPOS:
+        columnas[campo] = []
+    hojas_meta = []
+
+    for hoja in hojas:
+        filas = list(hoja.filas)
+        esquema = hoja.esquema
+        # Lo mismo que calcula la indexación: al cargar no hace falta volver a normalizar nada
+        fragmento = procesar_bloque(esquema.encabezados, filas)
+        hojas_meta.append({
+            'hoja': hoja.hoja,
+            'pestana': hoja.pestana,
+            'encabezados': list(esquema.encabezados),
+            'filas': len(filas)
+        })
+
+        placas = [[''] * len(esquema.columnas_placa) for _ in filas]
+        posicion_columna = {col: j for j, col in enumerate(esquema.columnas_placa)}
+        claves = fragmento.claves.split(SEPARADOR_CLAVES)
+        ocurrencias = fragmento.ocurrencias
+        for i in range(0, len(ocurrencias), 3):
+            idx_clave, idx_fila, col_placa = ocurrencias[i:i + 3]
+            placas[idx_fila][posicion_columna[col_placa]] = claves[idx_clave]
+
+        columnas['hoja'].extend([nombres_hojas.setdefault(hoja.hoja, len(nombres_hojas))] * len(filas))
+        columnas['pestana'].extend([nombres_pestanas.setdefault(hoja.pestana, len(nombres_pestanas))] * len(filas))
+        columnas['fila'].extend(range(2, len(filas) + 2))
+        columnas['placa'].extend(next((clave for clave in fila if clave), None) for fila in placas)
+        columnas['placas'].extend(placas)
+        columnas['fecha'].extend(
+            marca - MARCA_EPOCA if marca != MARCA_SIN_FECHA else None for marca in fragmento.marcas
+        )
+        columnas['huella'].extend(fragmento.huellas)
+        for campo, (texto, indices_valores) in fragmento.campos.items():
+            nombres = texto.split(SEPARADOR_VALORES)
+            columnas[campo].extend(nombres[idx] if idx != SIN_VALOR else None for idx in indices_valores)
+        columnas['valores'].extend([str(valor) for valor in fila] for fila in filas)
+
+    arreglos = {
+        'hoja': pa.DictionaryArray.from_arrays(pa.array(columnas['hoja'], pa.int32()), list(nombres_hojas)),
+        'pestana': pa.DictionaryArray.from_arrays(pa.array(columnas['pestana'], pa.int32()), list(nombres_pestanas)),
+        'fila': pa.array(columnas['fila'], pa.int32()),
+        'placa': pa.array(columnas['placa'], pa.string()),
+        'placas': pa.array(columnas['placas'], pa.list_(pa.string())),
+        'fecha': pa.array(columnas['fecha'], pa.int64()).cast(pa.timestamp('s')),
+    }
+    for campo in CAMPOS:
+        arreglos[campo] = pa.array(columnas[campo], pa.string())
+    arreglos['huella'] = pa.array(columnas['huella'], pa.uint64())
+    arreglos['valores'] = pa.array(columnas['valores'], pa.list_(pa.string()))
+
+    metadatos = {
+        'version': VERSION,
+        'exportada_en': datetime.now().isoformat(),
+        'hojas': hojas_meta,
+        'extra': extra or {}
+    }
+    tabla = pa.table(arreglos).replace_schema_metadata(
+        {CLAVE_METADATOS: json.dumps(metadatos, ensure_ascii=False).encode('utf-8')}
+    )
+
+    ruta_temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        if es_parquet(ruta):
+            import pyarrow.parquet as pq
+            pq.write_table(tabla, ruta_temporal, compression='zstd')
+        else:
+            with pa.OSFile(ruta_temporal, 'wb') as archivo:
+                with pa.ipc.new_file(archivo, tabla.schema) as escritor:
+                    escritor.write_table(tabla)
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.unlink(ruta_temporal)
+        raise
+    return tabla.num_rows
+
+
+def _abrir_tabla(ruta):
+    pa, _ = importar_pyarrow()
+    if es_parquet(ruta):
+        import pyarrow.parquet as pq
+        return pq.read_table(ruta, memory_map=True)
+    # Las columnas quedan apuntando al archivo mapeado: no se copian a memoria
+    return pa.ipc.open_file(pa.memory_map(ruta, 'r')).read_all()
+
+
+def _a_array(tipo, arreglo):
+    """Copia (de una vez, sin pasar por objetos de Python) un arreglo de Arrow sin nulos a un array del módulo array"""
+    resultado = array(tipo)
+    tamano = resultado.itemsize
+    datos = memoryview(arreglo.buffers()[1])
+    resultado.frombytes(datos[arreglo.offset * tamano:(arreglo.offset + len(arreglo)) * tamano])
+    return resultado
+
+
+def _columna(tabla, nombre, inicio, cantidad):
+    return tabla.column(nombre).slice(inicio, cantidad).combine_chunks()
+
+
+def _fragmento(tabla, inicio, cantidad, esquema):
+    """FragmentoHoja de una pestaña armado con las columnas ya normalizadas de la instantánea"""
+    pa, pc = importar_pyarrow()
+
+    ocurrencias = array('I')
+    claves = ''
+    columnas_placa = esquema.columnas_placa
+    if columnas_placa and cantidad:
+        planas = _columna(tabla, 'placas', inicio, cantidad).flatten()
+        if len(planas) != cantidad * len(columnas_placa):
+            raise ValueError("La columna 'placas' no coincide con las columnas de placa de la pestaña")
+        codificadas = pc.dictionary_encode(planas)
+        nombres = codificadas.dictionary.to_pylist()
+        vacia = nombres.index('') if '' in nombres else -1
+        por_fila = len(columnas_placa)
+        for posicion, idx_clave in enumerate(_a_array('i', codificadas.indices)):
+            if idx_clave != vacia:
+                ocurrencias.extend((idx_clave, posicion // por_fila, columnas_placa[posicion % por_fila]))
+        claves = SEPARADOR_CLAVES.join(nombres)
+
+    # Parquet no guarda segundos: vuelve como milisegundos
+    fechas = _columna(tabla, 'fecha', inicio, cantidad).cast(pa.timestamp('s')).cast(pa.int64())
+    marcas = _a_array('q', pc.fill_null(pc.add(fechas, MARCA_EPOCA), MARCA_SIN_FECHA))
+    huellas = _a_array('Q', _columna(tabla, 'huella', inicio, cantidad))
+
+    campos = {}
+    for campo in CAMPOS:
+        codificadas = pc.dictionary_encode(_columna(tabla, campo, inicio, cantidad))
+        indices = pc.fill_null(codificadas.indices.cast(pa.uint32()), pa.scalar(SIN_VALOR, pa.uint32()))
+        campos[campo] = (SEPARADOR_VALORES.join(codificadas.dictionary.to_pylist()), _a_array('I', indices))
+
+    return FragmentoHoja(claves, ocurrencias, marcas, huellas, campos)
+
+
+def cargar_instantanea(ruta):
+    """Abre una instantánea columnar: (InstantaneaRRV, fragmentos para combinar_fragmentos, metadatos)
+
+    Las filas no se convierten a objetos de Python: cada pestaña las lee de la columna 'valores' al pedirlas.
+    """
+    tabla = _abrir_tabla(ruta)
+    metadatos = (tabla.schema.metadata or {}).get(CLAVE_METADATOS)
+    if metadatos is None:
+        raise ValueError(f"{ruta} no es una instantánea RRV")
+    metadatos = json.loads(metadatos)
+    if metadatos.get('version') != VERSION:
+        raise ValueError(f"Versión de instantánea no soportada: {metadatos.get('version')}")
+
+    hojas = []
+    fragmentos = []
+    inicio = 0
+    for idx_hoja, meta in enumerate(metadatos['hojas']):
+        cantidad = meta['filas']
+        hoja = HojaColumnar(
+            meta['hoja'], meta['pestana'], meta['encabezados'],
+            FilasColumnares(_columna(tabla, 'valores', inicio, cantidad))
+        )
+        hojas.append(hoja)
+        fragmentos.append((idx_hoja, 0, _fragmento(tabla, inicio, cantidad, hoja.esquema)))
+        inicio += cantidad
+    if inicio != tabla.num_rows:
+        raise ValueError(f"{ruta} tiene {tabla.num_rows} filas y sus metadatos {inicio}")
+
+    return InstantaneaRRV(hojas), fragmentos, metadatos
+
+
+def indices_desde_instantanea(ruta):
+    """Como construir_indices pero desde un archivo: (indice, duplicada_de, estadisticas, indice_campos, metadatos)"""
+    instantanea, fragmentos, metadatos = cargar_instantanea(ruta)
+    return combinar_fragmentos(instantanea, fragmentos) + (metadatos,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o carga una instantánea columnar de las hojas RRV")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    exportar = subcomandos.add_parser("exportar", help="Descarga las hojas RRV y las guarda en un archivo")
+    exportar.add_argument("salida", help="Archivo .parquet (comprimido) o .arrow (arranque más rápido)")
+    origen = exportar.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--credenciales", help="Archivo JSON de la cuenta de servicio de Google")
+    origen.add_argument("--falso", action="store_true", help="Usar el Google Sheets falso (sheets_falso.py)")
+    exportar.add_argument("--hojas", type=int, default=3, help="Con --falso: hojas RRV")
+    exportar.add_argument("--pestanas", type=int, default=2, help="Con --falso: pestañas por hoja")
+    exportar.add_argument("--filas", type=int, default=20000, help="Con --falso: filas por pestaña")
+
+    cargar = subcomandos.add_parser("cargar", help="Mide cuánto tarda en abrirse e indexarse una instantánea")
+    cargar.add_argument("ruta")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        from instantanea import descargar_instantanea
+        if args.falso:
+            from sheets_falso import ClienteSheetsFalso
+            cliente = ClienteSheetsFalso(args.hojas, args.pestanas, args.filas)
+        else:
+            from cliente_sheets_async import conectar_sheets
+            cliente = conectar_sheets(args.credenciales)
+        inicio = time.perf_counter()
+        instantanea = descargar_instantanea(cliente)
+        print(f"📥 {len(instantanea.hojas)} pestañas, {instantanea.total_filas()} filas "
+              f"descargadas en {time.perf_counter() - inicio:.1f} s")
+        inicio = time.perf_counter()
+        filas = exportar_instantanea(
+            instantanea.hojas, args.salida, {'sincronizado_en': instantanea.cargada_en.isoformat()}
+        )
+        print(f"💾 {filas} filas escritas en {args.salida} ({os.path.getsize(args.salida) / 1024 / 1024:.1f} MB) "
+              f"en {time.perf_counter() - inicio:.1f} s")
+    else:
+        inicio = time.perf_counter()
+        instantanea, fragmentos, metadatos = cargar_instantanea(args.ruta)
+        abierta = time.perf_counter() - inicio
+        indice, _, estadisticas, _ = combinar_fragmentos(instantanea, fragmentos)
+        total = time.perf_counter() - inicio
+        print(f"📦 {args.ruta}: {instantanea.total_filas()} filas de {len(instantanea.hojas)} pestañas "
+              f"(exportada {metadatos['exportada_en']})")
+        print(f"⏱️ Apertura {abierta:.2f} s, índices {total - abierta:.2f} s, total {total:.2f} s; "
+              f"{indice.total_placas()} placas, {estadisticas['filas_duplicadas']} filas duplicadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Reparto de las filas del índice en memoria por fecha: los meses recientes quedan en memoria ("calientes")
+y las filas más antiguas ("frías") se leen del índice en disco recién cuando una consulta las pide
+
+Las fechas son las marcas ya calculadas al indexar (columna de encontrar_columna_fecha), así decidir a qué
+parte pertenece una fila nunca obliga a leerla.
+"""
+import os
+from datetime import date
+
+from registros import periodo_marcas
+from indice_disco import FilasDisco
+
+# Meses (contando el actual) cuyas filas se mantienen en memoria; 0 deja todo en memoria
+MESES_CALIENTES = int(os.environ.get('RRV_MESES_CALIENTES', 6))
+
+
+def inicio_mes(meses_atras, hoy=None):
+    """Primer día del mes de hace `meses_atras` meses (0: el mes actual)"""
+    hoy = hoy or date.today()
+    meses = hoy.year * 12 + hoy.month - 1 - meses_atras
+    return date(meses // 12, meses % 12 + 1, 1)
+
+
+def corte_caliente(meses=MESES_CALIENTES, hoy=None):
+    """Marca desde la que una fila es caliente"""
+    return periodo_marcas(inicio_mes(meses - 1, hoy))[0]
+
+
+class FilasParticionadas:
+    """Filas de una pestaña con las calientes en memoria y las frías en el índice en disco
+
+    Se comporta como HojaRRV.filas; las filas que cambia la ingesta quedan en memoria hasta el próximo guardado.
+    """
+    __slots__ = ('_calientes', '_frias', '_total')
+
+    def __init__(self, calientes, frias, total):
+        self._calientes = calientes
+        self._frias = frias
+        self._total = total
+
+    def __len__(self):
+        return self._total
+
+    def __getitem__(self, idx_fila):
+        if isinstance(idx_fila, slice):
+            return [self[i] for i in range(*idx_fila.indices(self._total))]
+        if not 0 <= idx_fila < self._total:
+            raise IndexError(idx_fila)
+        fila = self._calientes.get(idx_fila)
+        if fila is None:
+            fila = self._frias[idx_fila]
+        return fila
+
+    def __setitem__(self, idx_fila, fila):
+        if not 0 <= idx_fila < self._total:
+            raise IndexError(idx_fila)
+        self._calientes[idx_fila] = fila
+
+    def append(self, fila):
+        self._calientes[self._total] = fila
+        self._total += 1
+
+    def copy(self):
+        """Copia que no ve las ediciones posteriores (como list.copy); las frías siguen leyéndose del archivo"""
+        return FilasParticionadas(dict(self._calientes), self._frias, self._total)
+
+
+def particionar(hojas, marcas, indice_disco, corte):
+    """Deja en memoria solo las filas con marca >= corte; el resto pasa a leerse de `indice_disco`
+
+    El archivo tiene que haberse guardado a partir de estas mismas filas (sin cambios en el medio).
+    Devuelve {'calientes', 'frias'} o None si el archivo no coincide con las pestañas.
+    """
+    limites = [meta['primera_fila'] for meta in indice_disco.hojas] + [indice_disco.total_filas()]
+    if len(indice_disco.hojas) != len(hojas):
+        return None
+    for idx_hoja, (hoja, meta) in enumerate(zip(hojas, indice_disco.hojas)):
+        if (hoja.hoja, hoja.pestana) != (meta['hoja'], meta['pestana']):
+            return None
+        if limites[idx_hoja + 1] - limites[idx_hoja] != len(hoja.filas):
+            return None
+
+    calientes = 0
+    for idx_hoja, hoja in enumerate(hojas):
+        primera, total = limites[idx_hoja], limites[idx_hoja + 1] - limites[idx_hoja]
+        marcas_hoja = marcas[idx_hoja]
+        filas = {idx_fila: hoja.filas[idx_fila] for idx_fila in range(total) if marcas_hoja[idx_fila] >= corte}
+        hoja.filas = FilasParticionadas(filas, FilasDisco(indice_disco, primera, total), total)
+        calientes += len(filas)
+
+    return {'calientes': calientes, 'frias': limites[-1] - calientes}
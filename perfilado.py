@@ -0,0 +1,79 @@
+"""
+Perfilado a pedido de una búsqueda puntual (solo administradores)
+
+Usa pyinstrument (por muestreo) si está instalado y cProfile si no. Nada de esto se importa
+mientras no se pida un perfil, así que no agrega costo a las búsquedas normales.
+"""
+import time
+
+# Funciones que se muestran en el resumen
+TOP_FUNCIONES = 15
+
+
+class Perfil:
+    """Resultado de perfilar una ejecución: archivo descargable y resumen de las funciones más costosas"""
+    __slots__ = ('perfilador', 'duracion', 'archivo', 'nombre_archivo', 'mime', 'funciones', 'texto')
+
+    def __init__(self, perfilador, duracion, archivo, nombre_archivo, mime, funciones=None, texto=None):
+        self.perfilador = perfilador
+        self.duracion = duracion
+        self.archivo = archivo
+        self.nombre_archivo = nombre_archivo
+        self.mime = mime
+        # cProfile: [{'funcion', 'llamadas', 'propio_ms', 'acumulado_ms'}] ordenadas por tiempo propio
+        self.funciones = funciones
+        # pyinstrument: árbol de llamadas en texto
+        self.texto = texto
+
+
+def _resumen_cprofile(estadisticas, top):
+    funciones = []
+    for (archivo, linea, nombre), (_, llamadas, propio, acumulado, _) in estadisticas.items():
+        funciones.append({
+            'funcion': f"{nombre} ({archivo}:{linea})",
+            'llamadas': llamadas,
+            'propio_ms': round(propio * 1000, 2),
+            'acumulado_ms': round(acumulado * 1000, 2)
+        })
+    funciones.sort(key=lambda f: f['propio_ms'], reverse=True)
+    return funciones[:top]
+
+
+def perfilar(funcion, *args, top=TOP_FUNCIONES, nombre='busqueda', **kwargs):
+    """Ejecuta funcion(*args, **kwargs) bajo el perfilador disponible; devuelve (resultado, Perfil)"""
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        perfilador = Profiler()
+        inicio = time.perf_counter()
+        perfilador.start()
+        try:
+            resultado = funcion(*args, **kwargs)
+        finally:
+            perfilador.stop()
+        duracion = time.perf_counter() - inicio
+        return resultado, Perfil(
+            'pyinstrument', duracion, perfilador.output_html().encode('utf-8'), f"perfil_{nombre}.html", 'text/html',
+            texto=perfilador.output_text(unicode=True, color=False)
+        )
+
+    import cProfile
+    import marshal
+
+    perfilador = cProfile.Profile()
+    inicio = time.perf_counter()
+    perfilador.enable()
+    try:
+        resultado = funcion(*args, **kwargs)
+    finally:
+        perfilador.disable()
+    duracion = time.perf_counter() - inicio
+    perfilador.create_stats()
+    # Mismo contenido que dump_stats: se abre con pstats o snakeviz
+    return resultado, Perfil(
+        'cProfile', duracion, marshal.dumps(perfilador.stats), f"perfil_{nombre}.prof", 'application/octet-stream',
+        funciones=_resumen_cprofile(perfilador.stats, top)
+    )
@@ -0,0 +1,64 @@
+"""
+Planificación de búsquedas por placa: detecta las consultas muy amplias (por ejemplo "1" o "A", que por ser
+búsqueda por contenido coinciden con buena parte de las filas) y limita cuántos resultados se arman
+"""
+import heapq
+import os
+
+# Con más placas que esto la consulta es amplia: se muestran solo las más recientes (o sus registros, sin índice)
+MAX_RESULTADOS = int(os.environ.get('RRV_MAX_RESULTADOS', 200))
+
+
+class PlanConsulta:
+    """Lo que el índice sabe de una consulta antes de armar ningún registro"""
+    __slots__ = ('claves', 'limite')
+
+    def __init__(self, claves, limite):
+        # Placas que contienen el texto buscado
+        self.claves = claves
+        self.limite = limite
+
+    @property
+    def amplia(self):
+        """True si la consulta trae más placas de las que conviene mostrar
+
+        Solo cuenta la cantidad de placas: una sola placa con mucho historial no se recorta, porque el
+        operador no tendría cómo acotarla (su historial ya se trae por páginas).
+        """
+        return len(self.claves) > self.limite
+
+
+def planificar(claves, limite=MAX_RESULTADOS):
+    """Plan de una búsqueda por placa a partir de las placas encontradas (sin leer filas)"""
+    return PlanConsulta(claves, limite)
+
+
+class MejoresPorFecha:
+    """Los `limite` elementos más recientes de una secuencia, con un heap acotado en lugar de ordenar todo
+
+    Ante fechas iguales se queda el que llegó primero, igual que el orden cronológico de los resultados.
+    """
+
+    def __init__(self, limite):
+        self.limite = limite
+        self.total = 0
+        self._heap = []
+
+    def agregar(self, marca, elemento):
+        self.total += 1
+        entrada = (marca, -self.total, elemento)
+        if len(self._heap) < self.limite:
+            heapq.heappush(self._heap, entrada)
+        elif entrada[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entrada)
+
+    def completo(self):
+        return len(self._heap) >= self.limite
+
+    def marca_minima(self):
+        """Fecha del elemento más antiguo guardado (el próximo en salir)"""
+        return self._heap[0][0]
+
+    def resultados(self):
+        """Elementos guardados del más reciente al más antiguo"""
+        return [elemento for _, _, elemento in sorted(self._heap, key=lambda entrada: entrada[:2], reverse=True)]
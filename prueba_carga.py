@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: N sesiones simuladas buscan placas, abren el historial y generan los Excel al mismo tiempo,
+contra un Google Sheets falso (sheets_falso.py) y un servidor RRVSAC de prueba
+
+Informa, para cada cantidad de sesiones, búsquedas por segundo, latencias p50/p95/p99 de cada flujo, el pico
+de memoria del proceso y el aumento de memoria por sesión; con --limite-p95-ms termina con error si la búsqueda
+se vuelve más lenta.
+
+Uso:
+    python prueba_carga.py
+    python prueba_carga.py --sesiones 1,5,10,25 --duracion 20
+    python prueba_carga.py --modo drive --filas 2000 --limite-p95-ms 800
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from sheets_falso import ClienteSheetsFalso
+
+FLUJOS = ('busqueda', 'historial', 'excel')
+
+
+def iniciar_rrvsac_falso(latencia):
+    """Servidor local con la misma respuesta que la API de vehículos de RRVSAC; devuelve su URL"""
+
+    class ManejadorRRVSAC(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latencia:
+                time.sleep(latencia)
+            placa = parse_qs(urlparse(self.path).query).get('search.info.license_plate', [''])[0]
+            # Aproximadamente la mitad de las placas figuran activas
+            datos = {'data': [{'id': 1}]} if sum(map(ord, placa)) % 2 == 0 else {'data': []}
+            cuerpo = json.dumps(datos).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorRRVSAC)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_address[1]}/api/vehicles"
+
+
+def memoria_mb():
+    """Memoria residente actual del proceso en MB (None si no se puede medir en este sistema)"""
+    try:
+        with open('/proc/self/statm') as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def memoria_pico_mb():
+    """Máximo de memoria residente alcanzado por el proceso desde que arrancó, en MB (None si no se puede medir)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # KB en Linux, bytes en macOS
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / 1024 / 1024 if sys.platform == 'darwin' else maximo / 1024
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def elegir_consulta(aleatorio, placas):
+    """Como un operador: casi siempre la placa completa, a veces solo una parte"""
+    placa = aleatorio.choice(placas)
+    if aleatorio.random() < 0.2:
+        return placa[:aleatorio.randint(3, len(placa) - 1)]
+    return placa if aleatorio.random() < 0.5 else placa.replace('-', '').lower()
+
+
+def simular_sesion(aplicacion, buscador, servicio, placas, hasta, semilla, latencias, errores):
+    """Una sesión: busca, abre la primera página del historial y genera sus Excel, hasta que se acabe el tiempo
+
+    Usa las mismas funciones que main() (con el caché de búsquedas compartido); sin servicio recorre las hojas.
+    """
+    import pandas as pd
+    from indice_placas import ultimo_por_placa
+
+    aleatorio = random.Random(semilla)
+    while time.monotonic() < hasta:
+        consulta = elegir_consulta(aleatorio, placas)
+        try:
+            # Igual que main(): un pool por clic para la búsqueda y la API de RRVSAC en paralelo
+            inicio = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                if servicio is not None:
+                    futuro_busqueda = executor.submit(aplicacion.buscar_en_indice, servicio, consulta)
+                else:
+                    futuro_busqueda = executor.submit(buscador.buscar_placas, None, consulta)
+                futuro_api = executor.submit(buscador.consultar_api_rrvsac, consulta)
+                resultados = futuro_busqueda.result()
+                futuro_api.result()
+            if servicio is not None:
+                claves, plan, estado, total = resultados
+            else:
+                _, registros, _ = resultados
+                estado = ultimo_por_placa(registros)
+                total = len(registros)
+            pd.DataFrame([{'PLACA': r.placa, 'FECHA': r.fecha, 'EMPRESA': r.empresa} for r in estado])
+            latencias['busqueda'].append(time.perf_counter() - inicio)
+            if not total:
+                continue
+
+            inicio = time.perf_counter()
+            if servicio is not None:
+                pagina, _ = aplicacion.historial_indice(
+                    servicio, claves, aplicacion.TAMANO_PAGINA_HISTORIAL, amplia=plan.amplia
+                )
+            else:
+                pagina = registros[:aplicacion.TAMANO_PAGINA_HISTORIAL]
+            for registro in pagina:
+                pd.DataFrame({'Campo': registro.encabezados, 'Valor': registro.datos_completos})
+            latencias['historial'].append(time.perf_counter() - inicio)
+
+            # mostrar_historial arma un Excel por cada registro de la página
+            inicio = time.perf_counter()
+            for registro in pagina:
+                buscador.crear_excel_bytes(registro)
+            latencias['excel'].append(time.perf_counter() - inicio)
+        except Exception as e:
+            errores.append(f"{consulta}: {str(e)}")
+
+
+def ejecutar_nivel(aplicacion, buscador, servicio, placas, sesiones, duracion):
+    """Corre `sesiones` sesiones en paralelo durante `duracion` segundos; devuelve latencias, errores y tiempo"""
+    latencias = {flujo: [] for flujo in FLUJOS}
+    errores = []
+    hasta = time.monotonic() + duracion
+    inicio = time.perf_counter()
+    hilos = [
+        threading.Thread(
+            target=simular_sesion,
+            args=(aplicacion, buscador, servicio, placas, hasta, semilla, latencias, errores)
+        )
+        for semilla in range(sesiones)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, errores, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del Buscador RRV con sesiones simuladas")
+    parser.add_argument("--sesiones", default="1,5,10,25", help="Cantidades de sesiones a probar, separadas por comas")
+    parser.add_argument("--duracion", type=float, default=10, help="Segundos por cada cantidad de sesiones")
+    parser.add_argument("--modo", choices=["indice", "drive"], default="indice",
+                        help="Buscar en el índice precargado o recorrer las hojas en cada búsqueda")
+    parser.add_argument("--hojas", type=int, default=3)
+    parser.add_argument("--pestanas", type=int, default=2)
+    parser.add_argument("--filas", type=int, default=20000, help="Filas por pestaña")
+    parser.add_argument("--latencia-sheets-ms", type=float, default=0)
+    parser.add_argument("--latencia-api-ms", type=float, default=50)
+    parser.add_argument("--sin-cache", action="store_true", help="Con --modo drive: recorrer las hojas aunque se repita la placa")
+    parser.add_argument("--limite-p95-ms", type=float, default=None, help="Falla si el p95 de búsqueda lo supera")
+    args = parser.parse_args()
+
+    # La URL se lee al importar app
+    os.environ['RRV_API_URL'] = iniciar_rrvsac_falso(args.latencia_api_ms / 1000)
+    import app as aplicacion
+    from instantanea import descargar_instantanea
+    from ingesta_paralela import construir_indices
+    from cache_resultados import CacheResultados
+    from servicio_indice import ServicioIndice
+
+    print("🏋️ PRUEBA DE CARGA - BUSCADOR RRV")
+    print("=" * 90)
+    cliente = ClienteSheetsFalso(args.hojas, args.pestanas, args.filas, latencia=args.latencia_sheets_ms / 1000)
+    buscador = aplicacion.BuscadorPlacasWeb()
+    buscador.gc = cliente
+    if args.sin_cache:
+        buscador.cache = CacheResultados(capacidad=0)
+
+    servicio = None
+    if args.modo == "indice":
+        # El mismo servicio que usa la app, sin Google Sheets ni archivos y con el índice ya cargado
+        inicio = time.perf_counter()
+        servicio = ServicioIndice(None, ruta_indice=None, compartido=False, ruta_instantanea=None)
+        servicio.indice, _, _, servicio.indice_campos = construir_indices(descargar_instantanea(cliente))
+        print(f"Índice: {servicio.indice.total_placas()} placas en {time.perf_counter() - inicio:.1f} s")
+    print(f"Datos: {args.hojas * args.pestanas} pestañas x {args.filas} filas, modo {args.modo}")
+    # Base para el aumento por sesión: con el índice ya cargado, antes de la primera sesión
+    memoria_base = memoria_mb()
+    if memoria_base is not None:
+        print(f"Memoria antes de las sesiones: {memoria_base:.0f} MB")
+    print("-" * 90)
+    print(f"{'Sesiones':>8} {'Búsq/s':>8} {'Búsqueda p50/p95/p99 (ms)':>28} "
+          f"{'Historial p95':>14} {'Excel p95':>10} {'Pico MB':>8} {'MB/sesión':>10} {'Errores':>8}")
+
+    fallas = []
+    for sesiones in [int(valor) for valor in args.sesiones.split(',')]:
+        latencias, errores, segundos = ejecutar_nivel(
+            aplicacion, buscador, servicio, cliente.placas, sesiones, args.duracion
+        )
+        ordenadas = {flujo: sorted(valores) for flujo, valores in latencias.items()}
+        busqueda = ordenadas['busqueda']
+        p50, p95, p99 = (percentil(busqueda, p) * 1000 for p in (50, 95, 99))
+        # El pico es de todo el proceso; el aumento sobre la base, repartido entre las sesiones
+        pico = memoria_pico_mb()
+        memoria = memoria_mb()
+        por_sesion = (memoria - memoria_base) / sesiones if memoria is not None and memoria_base is not None else None
+        print(
+            f"{sesiones:>8} {len(busqueda) / segundos:>8.1f} {f'{p50:.0f} / {p95:.0f} / {p99:.0f}':>28} "
+            f"{percentil(ordenadas['historial'], 95) * 1000:>14.0f} {percentil(ordenadas['excel'], 95) * 1000:>10.0f} "
+            f"{pico if pico is not None else float('nan'):>8.0f} "
+            f"{por_sesion if por_sesion is not None else float('nan'):>10.1f} {len(errores):>8}"
+        )
+        for error in errores[:3]:
+            print(f"   ⚠️ {error}")
+        if args.limite_p95_ms is not None and p95 > args.limite_p95_ms:
+            fallas.append(f"con {sesiones} sesiones el p95 de búsqueda fue {p95:.0f} ms (límite {args.limite_p95_ms:.0f} ms)")
+
+    print("-" * 90)
+    if fallas:
+        for falla in fallas:
+            print(f"❌ {falla}")
+        sys.exit(1)
+    print("✅ Prueba de carga terminada")
+
+
+if __name__ == "__main__":
+    main()
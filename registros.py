@@ -0,0 +1,283 @@
+"""
+Estructuras compactas para los registros de placas encontrados en las hojas RRV
+"""
+import heapq
+import re
+import sys
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+NO_DISPONIBLE = "No disponible"
+
+_ESPACIOS = re.compile(r'\s+')
+
+PALABRAS_PLACA = ['placa', 'patente', 'matricula', 'vehiculo', 'numero de vehiculo']
+
+
+def encontrar_columnas_placa(encabezados):
+    """Devuelve los índices de las columnas que pueden contener placas"""
+    columnas_placa = []
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if any(palabra in encabezado_lower for palabra in PALABRAS_PLACA):
+            columnas_placa.append(i)
+
+    if not columnas_placa:
+        columnas_placa = list(range(min(3, len(encabezados))))
+    return columnas_placa
+
+
+def encontrar_columna_fecha(encabezados):
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if any(palabra in encabezado_lower for palabra in ['fecha', 'date', 'dia', 'hora', 'fecha de ingreso']):
+            return i
+    return 1 if len(encabezados) > 1 else 0
+
+
+def encontrar_columna_proyecto(encabezados):
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if 'proyecto' in encabezado_lower:
+            return i
+    return 2 if len(encabezados) > 2 else 0
+
+
+def encontrar_columna_empresa(encabezados):
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if any(palabra in encabezado_lower for palabra in ['empresa', 'nombre', 'cliente']):
+            return i
+    return 3 if len(encabezados) > 3 else 0
+
+
+def encontrar_columna_sistema(encabezados):
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if 'sistema' in encabezado_lower:
+            return i
+    return 4 if len(encabezados) > 4 else 0
+
+
+def encontrar_columna_trabajo(encabezados):
+    for i, encabezado in enumerate(encabezados):
+        encabezado_lower = str(encabezado).lower()
+        if any(palabra in encabezado_lower for palabra in ['tipo de trabajo', 'estado', 'status', 'situacion', 'condicion']):
+            return i
+    return 5 if len(encabezados) > 5 else 0
+
+
+def normalizar_valor(valor):
+    """Texto de una celda sin espacios repetidos y en mayúsculas, para comparar sin importar el formato"""
+    return _ESPACIOS.sub(' ', str(valor)).strip().upper()
+
+
+# Formatos comunes de fecha (ordenados de más específico a más general)
+FORMATOS_FECHA = [
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%d-%m-%Y %H:%M:%S',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%d/%m/%y %H:%M:%S',
+    '%d/%m/%y %H:%M',
+    '%d/%m/%y',
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M',
+    '%d.%m.%Y'
+]
+
+_parser_fechas = None
+
+
+def obtener_parser_fechas():
+    """Importa dateutil una sola vez (la primera fecha que no encaja en FORMATOS_FECHA); False si no está"""
+    global _parser_fechas
+    if _parser_fechas is None:
+        try:
+            from dateutil import parser
+            _parser_fechas = parser
+        except ImportError:
+            _parser_fechas = False
+    return _parser_fechas
+
+
+@lru_cache(maxsize=65536)
+def parsear_fecha(fecha_str):
+    """Intenta parsear diferentes formatos de fecha; devuelve datetime.min si no lo logra"""
+    if not fecha_str or fecha_str == NO_DISPONIBLE:
+        return datetime.min
+
+    # Limpiar la fecha de caracteres extra
+    fecha_str = str(fecha_str).strip().replace('  ', ' ').strip()
+
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(fecha_str, formato)
+        except ValueError:
+            continue
+
+    # Si no se puede parsear, intentar con dateutil
+    parser = obtener_parser_fechas()
+    if parser:
+        try:
+            return parser.parse(fecha_str)
+        except (ValueError, OverflowError):
+            pass
+
+    # Si no se puede parsear, devolver fecha mínima
+    return datetime.min
+
+
+class EsquemaHoja:
+    """Encabezados y columnas clave de una pestaña, compartidos por todos sus registros"""
+    __slots__ = ('encabezados', 'columnas_placa', 'col_fecha', 'col_proyecto',
+                 'col_empresa', 'col_sistema', 'col_trabajo')
+
+    def __init__(self, encabezados):
+        self.encabezados = encabezados
+        self.columnas_placa = tuple(encontrar_columnas_placa(encabezados))
+        self.col_fecha = encontrar_columna_fecha(encabezados)
+        self.col_proyecto = encontrar_columna_proyecto(encabezados)
+        self.col_empresa = encontrar_columna_empresa(encabezados)
+        self.col_sistema = encontrar_columna_sistema(encabezados)
+        self.col_trabajo = encontrar_columna_trabajo(encabezados)
+
+
+_esquemas = {}
+_esquemas_lock = threading.Lock()
+
+
+def obtener_esquema(encabezados):
+    """Devuelve el esquema internado para unos encabezados (uno solo por combinación de columnas)"""
+    clave = tuple(sys.intern(str(encabezado)) for encabezado in encabezados)
+    esquema = _esquemas.get(clave)
+    if esquema is None:
+        with _esquemas_lock:
+            esquema = _esquemas.setdefault(clave, EsquemaHoja(clave))
+    return esquema
+
+
+class RegistroPlaca:
+    """Fila encontrada en una hoja RRV; los campos de resumen se leen de la fila bajo demanda"""
+    __slots__ = ('esquema', 'hoja', 'pestana', 'fila', 'col_placa', 'datos', 'fuentes')
+
+    def __init__(self, esquema, hoja, pestana, fila, col_placa, datos, fuentes=None):
+        self.esquema = esquema
+        self.hoja = sys.intern(hoja)
+        self.pestana = sys.intern(pestana)
+        self.fila = fila
+        self.col_placa = col_placa
+        self.datos = datos if isinstance(datos, tuple) else tuple(datos)
+        # [(hoja, pestaña, fila)] cuando la misma fila aparece copiada en varios lugares
+        self.fuentes = fuentes
+
+    def _valor(self, columna):
+        if columna < len(self.datos):
+            return self.datos[columna]
+        return NO_DISPONIBLE
+
+    @property
+    def placa(self):
+        return str(self.datos[self.col_placa]).strip()
+
+    @property
+    def fecha(self):
+        return self._valor(self.esquema.col_fecha)
+
+    @property
+    def proyecto(self):
+        return self._valor(self.esquema.col_proyecto)
+
+    @property
+    def empresa(self):
+        return self._valor(self.esquema.col_empresa)
+
+    @property
+    def sistema(self):
+        return self._valor(self.esquema.col_sistema)
+
+    @property
+    def trabajo(self):
+        return self._valor(self.esquema.col_trabajo)
+
+    @property
+    def encabezados(self):
+        return self.esquema.encabezados
+
+    @property
+    def datos_completos(self):
+        return self.datos
+
+
+def marca_de_tiempo(fecha):
+    """Segundos desde el año 1 de una fecha: un entero compacto que ordena igual que el datetime"""
+    return fecha.toordinal() * 86400 + fecha.hour * 3600 + fecha.minute * 60 + fecha.second
+
+
+def periodo_marcas(desde=None, hasta=None):
+    """(mínima, máxima) marca_de_tiempo de un rango de fechas (date o None) con ambos días incluidos"""
+    return (
+        desde.toordinal() * 86400 if desde else None,
+        hasta.toordinal() * 86400 + 86399 if hasta else None
+    )
+
+
+def en_periodo(marca, periodo):
+    """True si la marca cae dentro del período (None: sin límite)"""
+    minimo, maximo = periodo
+    return (minimo is None or marca >= minimo) and (maximo is None or marca <= maximo)
+
+
+def filtrar_periodo(registros, periodo):
+    """Registros cuya fecha cae en el período (None: todos)"""
+    if periodo is None:
+        return registros
+    return [registro for registro in registros if en_periodo(marca_de_tiempo(parsear_fecha(registro.fecha)), periodo)]
+
+
+def ordenar_por_fecha(registros, limite=None):
+    """Registros del más reciente al más antiguo; con límite selecciona solo los primeros (top-k) sin ordenar todo"""
+    if limite is None or limite >= len(registros):
+        return sorted(registros, key=lambda r: parsear_fecha(r.fecha), reverse=True)
+    return heapq.nlargest(limite, registros, key=lambda r: parsear_fecha(r.fecha))
+
+
+def medir_memoria_resultados(resultados):
+    """Estima los bytes ocupados por una lista de registros, contando una sola vez los objetos compartidos"""
+    vistos = set()
+    total = 0
+
+    def medir(objeto):
+        nonlocal total
+        if id(objeto) in vistos:
+            return False
+        vistos.add(id(objeto))
+        total += sys.getsizeof(objeto)
+        return True
+
+    medir(resultados)
+    esquemas = 0
+    for registro in resultados:
+        medir(registro)
+        medir(registro.hoja)
+        medir(registro.pestana)
+        if medir(registro.datos):
+            for valor in registro.datos:
+                medir(valor)
+        if medir(registro.esquema):
+            esquemas += 1
+            medir(registro.esquema.columnas_placa)
+            if medir(registro.esquema.encabezados):
+                for encabezado in registro.esquema.encabezados:
+                    medir(encabezado)
+
+    return {'bytes': total, 'registros': len(resultados), 'esquemas': esquemas}
@@ -0,0 +1,364 @@
+"""
+Mantiene disponible el índice de placas: desde disco al arrancar y desde Google Sheets en segundo plano
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from cliente_sheets_async import conectar_sheets
+from instantanea import descargar_instantanea, listar_hojas_rrv
+from indice_disco import abrir_indice, guardar_indice, HojaDisco
+from registros import obtener_parser_fechas
+from ingesta_paralela import construir_indices
+from ingesta_cambios import aplicar_cambio, ReceptorCambios, iniciar_servidor_ingesta, TOKEN_INGESTA, PUERTO_INGESTA
+from candado_sincronizacion import CandadoSincronizacion
+from particiones import MESES_CALIENTES, corte_caliente, particionar
+
+RUTA_INDICE = os.environ.get(
+    'RRV_INDICE_RUTA',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'indice_placas.bin')
+)
+
+# Instantánea columnar (ver instantanea_columnar.py) para arrancar sin Google Sheets o seguir funcionando sin conexión
+RUTA_INSTANTANEA = os.environ.get('RRV_INSTANTANEA_RUTA')
+
+# Con varios procesos de la aplicación (por ejemplo detrás de un proxy) solo uno sincroniza
+# y el resto lee el índice que este guarda en disco
+MODO_COMPARTIDO = os.environ.get('RRV_MODO_COMPARTIDO', '') == '1'
+
+# Cada cuánto se vuelven a descargar las hojas
+TTL_INDICE = 15 * 60
+# Espera antes de reintentar una sincronización fallida
+REINTENTO_ERROR = 60
+# Cada cuánto un proceso lector revisa si hay un índice nuevo en disco
+INTERVALO_LECTOR = 10
+# Cada cuánto el proceso que sincroniza guarda en disco las ediciones recibidas por la ingesta
+INTERVALO_PUBLICACION = 30
+
+
+def _firma_archivo(ruta):
+    """Identifica una versión del archivo: cambia cada vez que se reemplaza"""
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return estado.st_ino, estado.st_mtime_ns, estado.st_size
+
+
+class ServicioIndice:
+    """Índice de placas compartido por todas las sesiones del proceso, precargado por un hilo de fondo"""
+
+    def __init__(self, credenciales_path, ruta_indice=RUTA_INDICE, ttl=TTL_INDICE, compartido=MODO_COMPARTIDO,
+                 ruta_instantanea=RUTA_INSTANTANEA):
+        self.credenciales_path = credenciales_path
+        self.ruta_indice = ruta_indice
+        self.ruta_instantanea = ruta_instantanea
+        self.ttl = ttl
+        self.gc = None
+        self.indice = None
+        self.indice_campos = None
+        self.indice_disco = None
+
+        # Estado visible en la interfaz
+        self.etapa = "En espera"
+        self.progreso = 0.0
+        self.total_hojas = 0
+        self.sincronizado_en = None
+        self.duracion = None
+        self.duplicados = None
+        self.ultimo_error = None
+        # Metadatos de la instantánea columnar mientras el índice en memoria sea el cargado desde ella
+        self.instantanea = None
+        # Filas en memoria y en disco tras el último guardado: {'calientes', 'frias', 'desde'} (ver particiones.py)
+        self.particiones = None
+
+        # Protege los índices: la ingesta los modifica en el lugar, así que las lecturas de la interfaz también lo toman
+        self.lock_datos = threading.Lock()
+        # Aumenta cada vez que cambian los datos que ven las búsquedas (índice nuevo o cambio aplicado): versión
+        # de los resultados guardados en el caché de búsquedas. Se lee y se modifica con lock_datos tomado
+        self.generacion = 0
+        # Cambios aplicados mientras corre una sincronización, para volver a aplicarlos sobre el índice nuevo
+        self._cambios_durante_sync = None
+        self._cambios_sin_guardar = False
+        self.receptor = ReceptorCambios(self)
+        self._ingesta_abierta = False
+
+        # En modo compartido el candado decide qué proceso sincroniza
+        self.compartido = compartido and ruta_indice is not None
+        self._candado = CandadoSincronizacion(ruta_indice + '.lock') if self.compartido else None
+        self._firma_disco = _firma_archivo(ruta_indice) if ruta_indice else None
+        self._adoptar_disco(abrir_indice(ruta_indice))
+
+        self._sincronizacion_pedida = False
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Arranca el hilo de precarga (una sola vez por proceso)"""
+        with self._lock:
+            if self._hilo is None:
+                # Decidir el rol antes de la primera página para no mostrar un estado equivocado
+                if self._candado is not None:
+                    self._candado.intentar_tomar()
+                self._hilo = threading.Thread(target=self._bucle, name='precarga-rrv', daemon=True)
+                self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        self._despertar.set()
+
+    def solicitar_sincronizacion(self):
+        """Adelanta la próxima sincronización sin esperar al intervalo"""
+        self._sincronizacion_pedida = True
+        self._despertar.set()
+
+    def registrar_cambio(self, cambio):
+        """Anota un cambio aplicado por la ingesta (se llama con lock_datos tomado)"""
+        self._cambios_sin_guardar = True
+        self.generacion += 1
+        if self._cambios_durante_sync is not None:
+            self._cambios_durante_sync.append(cambio)
+
+    def es_lider(self):
+        """True si este proceso es el que sincroniza con Google Sheets"""
+        return self._candado is None or self._candado.tomado()
+
+    def indice_actual(self):
+        """Índice más fresco disponible: el de memoria si ya se descargó, si no el de disco (o None)"""
+        return self.indice or self.indice_disco
+
+    def copiar_hojas(self):
+        """Pestañas del índice actual con una copia de sus filas, o None sin índice
+
+        La copia se toma con lock_datos (es rápida: las filas son tuplas) y después se puede recorrer sin él,
+        por ejemplo para exportarla, mientras la ingesta sigue modificando el índice.
+        """
+        with self.lock_datos:
+            if self.indice is not None:
+                return self._copiar_hojas_memoria()
+            if self.indice_disco is not None:
+                return self.indice_disco.hojas_filas()
+        return None
+
+    def _copiar_hojas_memoria(self):
+        # Se llama con lock_datos tomado
+        return [HojaDisco(hoja.hoja, hoja.pestana, hoja.esquema, hoja.filas.copy()) for hoja in self.indice.hojas]
+
+    def indice_campos_actual(self):
+        """Índice por empresa, proyecto y sistema: el de memoria o el guardado en disco (o None)"""
+        if self.indice_campos is not None:
+            return self.indice_campos
+        return self.indice_disco.indice_campos() if self.indice_disco is not None else None
+
+    def listo(self):
+        return self.indice_actual() is not None
+
+    def sincronizando(self):
+        return self.es_lider() and self.etapa not in ("En espera", "Listo", "Error", "Sin conexión")
+
+    def _bucle(self):
+        self._precargar_modulos()
+        proxima_sincronizacion = 0
+        while not self._detener.is_set():
+            if not self.es_lider() and self._candado.intentar_tomar():
+                # El proceso que sincronizaba terminó (o este es el primero en arrancar): toma su lugar
+                proxima_sincronizacion = 0
+
+            if not self.es_lider():
+                self._seguir_disco()
+                espera = INTERVALO_LECTOR
+            else:
+                self._abrir_ingesta()
+                if self.indice is None and self.ruta_instantanea:
+                    self._cargar_instantanea()
+                if self.credenciales_path is None:
+                    # Sin credenciales solo se trabaja con la instantánea (y las ediciones que lleguen)
+                    self.etapa = "Sin conexión"
+                    proxima_sincronizacion = time.monotonic() + self.ttl
+                elif self._sincronizacion_pedida or time.monotonic() >= proxima_sincronizacion:
+                    self._sincronizacion_pedida = False
+                    exito = self.sincronizar()
+                    proxima_sincronizacion = time.monotonic() + (self.ttl if exito else REINTENTO_ERROR)
+                elif self.compartido and self._cambios_sin_guardar:
+                    # Los demás procesos solo ven las ediciones cuando llegan al archivo
+                    self._guardar()
+                espera = max(0, proxima_sincronizacion - time.monotonic())
+                if self.compartido:
+                    espera = min(espera, INTERVALO_PUBLICACION)
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+        if self._candado is not None:
+            self._candado.soltar()
+
+    def _precargar_modulos(self):
+        """Importa por adelantado lo que la primera búsqueda tendría que importar"""
+        obtener_parser_fechas()
+
+    def _abrir_ingesta(self):
+        """Abre el servidor de ingesta de ediciones (solo en el proceso que sincroniza y con token configurado)"""
+        if self._ingesta_abierta or not TOKEN_INGESTA:
+            return
+        self._ingesta_abierta = True
+        try:
+            iniciar_servidor_ingesta(self.receptor, TOKEN_INGESTA, PUERTO_INGESTA)
+        except OSError as e:
+            self.receptor.error = f"No se pudo abrir el puerto de ingesta {PUERTO_INGESTA}: {str(e)}"
+
+    def _cargar_instantanea(self):
+        """Usa la instantánea columnar como índice en memoria si es más nueva que el índice en disco (una sola vez)"""
+        ruta, self.ruta_instantanea = self.ruta_instantanea, None
+        if not os.path.exists(ruta):
+            self.ultimo_error = f"No se encontró la instantánea {ruta}"
+            return
+        self.etapa = "Cargando instantánea"
+        try:
+            from instantanea_columnar import indices_desde_instantanea
+            indice, _, duplicados, indice_campos, metadatos = indices_desde_instantanea(ruta)
+        except Exception as e:
+            self.etapa = "Error"
+            self.ultimo_error = f"No se pudo cargar la instantánea {ruta}: {str(e)}"
+            return
+
+        extra = metadatos.get('extra') or {}
+        sincronizado_en = datetime.fromisoformat(extra.get('sincronizado_en') or metadatos['exportada_en'])
+        if self.indice_disco is not None and self.sincronizado_en and self.sincronizado_en >= sincronizado_en:
+            # El índice en disco ya tiene datos más nuevos
+            self.etapa = "En espera"
+            return
+
+        with self.lock_datos:
+            if self.receptor.aplicar_en_espera(indice, indice_campos):
+                self._sincronizacion_pedida = True
+            self.indice = indice
+            self.indice_campos = indice_campos
+            self.generacion += 1
+        self.duplicados = duplicados
+        self.sincronizado_en = sincronizado_en
+        self.instantanea = {'ruta': ruta, 'exportada_en': metadatos['exportada_en']}
+        self._guardar()
+        self.etapa = "Listo"
+
+    def _adoptar_disco(self, indice_disco):
+        """Usa un índice leído de disco junto con el estado de la sincronización que lo generó"""
+        with self.lock_datos:
+            self.indice_disco = indice_disco
+            self.generacion += 1
+        if indice_disco is None or self.indice is not None:
+            return
+        extra = indice_disco.extra
+        if extra.get('sincronizado_en'):
+            self.sincronizado_en = datetime.fromisoformat(extra['sincronizado_en'])
+        self.duplicados = extra.get('duplicados')
+
+    def _seguir_disco(self):
+        """Proceso lector: vuelve a abrir el índice en disco cuando el proceso que sincroniza lo reemplaza"""
+        firma = _firma_archivo(self.ruta_indice)
+        if firma is not None and firma != self._firma_disco:
+            indice_disco = abrir_indice(self.ruta_indice)
+            if indice_disco is not None:
+                self._firma_disco = firma
+                self._adoptar_disco(indice_disco)
+        self.etapa = "Listo" if self.indice_disco is not None else "En espera"
+
+    def _guardar(self):
+        """Guarda el índice en memoria para el próximo arranque y para los demás procesos"""
+        if self.ruta_indice is None:
+            return
+        extra = {
+            'sincronizado_en': self.sincronizado_en.isoformat() if self.sincronizado_en else None,
+            'duplicados': self.duplicados,
+            'pid': os.getpid()
+        }
+        # Se copia con lock_datos y se escribe sin él: la ingesta y las búsquedas no esperan a la escritura
+        with self.lock_datos:
+            self._cambios_sin_guardar = False
+            generacion = self.generacion
+            hojas = self._copiar_hojas_memoria()
+            indice = self.indice.copiar(hojas)
+            indice_campos = self.indice_campos.copiar(hojas, indice.duplicada_de) if self.indice_campos else None
+        try:
+            guardar_indice(indice, self.ruta_indice, indice_campos, extra)
+        except OSError as e:
+            self.ultimo_error = f"No se pudo guardar el índice en disco: {str(e)}"
+            return
+        with self.lock_datos:
+            # Con el archivo igual a la memoria, las filas antiguas pueden pasar a leerse de él; si llegó un cambio
+            # mientras se escribía, se particiona en el próximo guardado
+            if self.generacion == generacion:
+                self._particionar()
+
+    def _particionar(self):
+        """Deja en memoria solo los últimos MESES_CALIENTES meses del índice (se llama con lock_datos tomado)"""
+        if not MESES_CALIENTES or self.indice_campos is None:
+            return
+        indice_disco = abrir_indice(self.ruta_indice)
+        if indice_disco is None:
+            return
+        corte = corte_caliente(MESES_CALIENTES)
+        particiones = particionar(self.indice.hojas, self.indice_campos.marcas, indice_disco, corte)
+        if particiones is not None:
+            particiones['desde'] = datetime.fromordinal(corte // 86400)
+            self.particiones = particiones
+
+    def sincronizar(self):
+        """Descarga las hojas RRV, reemplaza el índice en memoria y lo guarda en disco para el próximo arranque"""
+        inicio = time.monotonic()
+        with self.lock_datos:
+            self._cambios_durante_sync = []
+        try:
+            self.progreso = 0.0
+            if self.gc is None:
+                self.etapa = "Autenticando"
+                self.gc = conectar_sheets(self.credenciales_path)
+
+            self.etapa = "Listando hojas RRV"
+            hojas_rrv = listar_hojas_rrv(self.gc)
+            self.total_hojas = len(hojas_rrv)
+
+            self.etapa = "Descargando hojas"
+            instantanea = descargar_instantanea(self.gc, self._al_avanzar, hojas_rrv)
+
+            # Placas, fechas, copias y campos en un solo paso, repartido entre procesos si hay muchas filas
+            self.etapa = "Indexando placas, copias y campos"
+            indice, _, self.duplicados, indice_campos = construir_indices(instantanea)
+        except Exception as e:
+            # Forzar una nueva autenticación en el siguiente intento (el cliente asíncrono tiene su propio hilo)
+            if hasattr(self.gc, 'cerrar'):
+                self.gc.cerrar()
+            self.gc = None
+            with self.lock_datos:
+                self._cambios_durante_sync = None
+            self.etapa = "Error"
+            self.ultimo_error = f"Error de sincronización: {str(e)}"
+            return False
+
+        with self.lock_datos:
+            # La descarga pudo ser anterior a algunos cambios ya recibidos; aplicarlos es idempotente
+            for cambio in self._cambios_durante_sync:
+                aplicar_cambio(indice, indice_campos, cambio)
+            self._cambios_durante_sync = None
+            # Los que llegaron sin índice en memoria (primera sincronización); la descarga ya trae encabezados y
+            # pestañas nuevas, así que no hace falta otra sincronización
+            self.receptor.aplicar_en_espera(indice, indice_campos)
+            self.indice = indice
+            self.indice_campos = indice_campos
+            self.generacion += 1
+        self.sincronizado_en = datetime.now()
+        self.instantanea = None
+        self.ultimo_error = None
+
+        self.etapa = "Guardando índice"
+        self._guardar()
+
+        self.duracion = time.monotonic() - inicio
+        self.progreso = 1.0
+        self.etapa = "Listo"
+        return True
+
+    def _al_avanzar(self, fraccion):
+        self.progreso = fraccion
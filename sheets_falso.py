@@ -0,0 +1,93 @@
+"""
+Cliente de Google Sheets falso (misma interfaz que gspread: openall, worksheets, get_all_values)
+con datos RRV sintéticos, para pruebas de carga y benchmarks sin credenciales ni red
+"""
+import random
+import string
+import time
+
+ENCABEZADOS = ['Placa', 'Fecha', 'Proyecto', 'Empresa', 'Sistema', 'Trabajo Realizado', 'Observaciones']
+SISTEMAS = ['GPS', 'CÁMARA', 'ALARMA', 'SENSOR COMBUSTIBLE', 'RRV']
+TRABAJOS = ['INSTALACIÓN', 'REVISIÓN', 'MANTENIMIENTO', 'RETIRO']
+
+
+def placa_sintetica(aleatorio):
+    letras = ''.join(aleatorio.choice(string.ascii_uppercase) for _ in range(3))
+    return f"{letras}-{aleatorio.randint(100, 999)}"
+
+
+def generar_filas(cantidad, placas, aleatorio):
+    """Filas con el formato de las hojas RRV; las placas se repiten para tener historial"""
+    filas = []
+    for _ in range(cantidad):
+        filas.append([
+            aleatorio.choice(placas),
+            f"{aleatorio.randint(1, 28):02d}/{aleatorio.randint(1, 12):02d}/{aleatorio.randint(2018, 2025)} "
+            f"{aleatorio.randint(0, 23):02d}:{aleatorio.randint(0, 59):02d}",
+            f"PROYECTO {aleatorio.randint(1, 60)}",
+            f"EMPRESA {aleatorio.randint(1, 400)}",
+            aleatorio.choice(SISTEMAS),
+            aleatorio.choice(TRABAJOS),
+            ''
+        ])
+    return filas
+
+
+class PestanaFalsa:
+    def __init__(self, title, valores, latencia=0.0):
+        self.title = title
+        self._valores = valores
+        self._latencia = latencia
+
+    def get_all_values(self):
+        if self._latencia:
+            time.sleep(self._latencia)
+        return [list(fila) for fila in self._valores]
+
+
+class HojaFalsa:
+    def __init__(self, title, pestanas):
+        self.title = title
+        self.id = title
+        # Como el modifiedTime de Drive que trae gspread en Spreadsheet.lastUpdateTime
+        self.lastUpdateTime = '2024-01-01T00:00:00.000Z'
+        self._pestanas = pestanas
+
+    def worksheets(self):
+        return list(self._pestanas)
+
+
+class ClienteSheetsFalso:
+    """Reemplazo de gspread.Client con hojas 'RRV n' de filas sintéticas
+
+    `latencia` simula la demora de cada descarga de pestaña (segundos) y `copias` la fracción de filas
+    de la primera pestaña copiadas también en la última, como pasa en las hojas reales.
+    """
+
+    def __init__(self, hojas=3, pestanas_por_hoja=2, filas_por_pestana=5000, placas_distintas=None,
+                 latencia=0.0, copias=0.01, semilla=1):
+        aleatorio = random.Random(semilla)
+        total_filas = hojas * pestanas_por_hoja * filas_por_pestana
+        self.placas = sorted({
+            placa_sintetica(aleatorio) for _ in range(placas_distintas or max(1, total_filas // 4))
+        })
+        self.hojas = []
+        for numero in range(1, hojas + 1):
+            pestanas = [
+                PestanaFalsa(
+                    f"Hoja {p}",
+                    [ENCABEZADOS] + generar_filas(filas_por_pestana, self.placas, aleatorio),
+                    latencia
+                )
+                for p in range(1, pestanas_por_hoja + 1)
+            ]
+            self.hojas.append(HojaFalsa(f"RRV {numero}", pestanas))
+
+        primera, ultima = self.hojas[0]._pestanas[0], self.hojas[-1]._pestanas[-1]
+        if copias and primera is not ultima:
+            ultima._valores.extend(primera._valores[1:1 + int(filas_por_pestana * copias)])
+        # Una hoja sin 'RRV' en el nombre, que la búsqueda debe ignorar
+        self.hojas.append(HojaFalsa("Inventario", [PestanaFalsa("Hoja 1", [['Código', 'Descripción']])]))
+
+    def openall(self):
+        return list(self.hojas)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Envía ediciones sintéticas al endpoint de ingesta (como lo haría el disparador onEdit de las hojas)
+y vuelve a enviarlas para comprobar que las repeticiones no cambian nada
+
+Uso:
+    python simular_ediciones.py --hoja "RRV 2024" --pestana "Hoja 1" --token SECRETO
+    python simular_ediciones.py --url http://localhost:8765 --ediciones 200 --lote 20 --desde-fila 2 --token SECRETO
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from ingesta_cambios import RUTA_CAMBIOS, RUTA_ESTADO, CABECERA_TOKEN
+
+
+def placa_aleatoria():
+    return ''.join(random.choice(string.ascii_uppercase) for _ in range(3)) + str(random.randint(100, 999))
+
+
+def edicion_aleatoria(hoja, pestana, fila, marca):
+    """Fila con el formato típico RRV: placa, fecha, proyecto, empresa, sistema, trabajo"""
+    valores = [
+        placa_aleatoria(),
+        f"{random.randint(1, 28):02d}/{random.randint(1, 12):02d}/2024",
+        f"PROYECTO {random.randint(1, 50)}",
+        f"EMPRESA {random.randint(1, 300)}",
+        random.choice(['GPS', 'CÁMARA', 'ALARMA']),
+        'SIMULADO'
+    ]
+    return {'hoja': hoja, 'pestana': pestana, 'fila': fila, 'valores': valores, 'marca': marca}
+
+
+def enviar(url, token, ruta, cuerpo=None):
+    """POST (con cuerpo) o GET (sin cuerpo) al endpoint; devuelve el JSON de respuesta"""
+    datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+    peticion = urllib.request.Request(url.rstrip('/') + ruta, data=datos, headers={
+        'Content-Type': 'application/json',
+        CABECERA_TOKEN: token
+    })
+    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+        return json.loads(respuesta.read().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de ediciones para el endpoint de ingesta")
+    parser.add_argument("--url", default="http://localhost:8765")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--hoja", required=True)
+    parser.add_argument("--pestana", required=True)
+    parser.add_argument("--ediciones", type=int, default=100)
+    parser.add_argument("--lote", type=int, default=1, help="Cambios por petición")
+    parser.add_argument("--desde-fila", type=int, default=2)
+    parser.add_argument("--semilla", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    print("📨 SIMULADOR DE EDICIONES RRV")
+    print("=" * 50)
+
+    marca_base = int(time.time() * 1000)
+    ediciones = [
+        edicion_aleatoria(args.hoja, args.pestana, args.desde_fila + i, marca_base + i)
+        for i in range(args.ediciones)
+    ]
+    lotes = [ediciones[i:i + args.lote] for i in range(0, len(ediciones), args.lote)]
+
+    resumen = {}
+    try:
+        # Primera pasada: ediciones nuevas; segunda: las mismas ediciones repetidas
+        for pasada in ("Ediciones", "Repeticiones"):
+            resultados = {}
+            tiempos = []
+            for lote in lotes:
+                inicio = time.perf_counter()
+                respuesta = enviar(args.url, args.token, RUTA_CAMBIOS, lote)
+                tiempos.append(time.perf_counter() - inicio)
+                for resultado in respuesta['resultados']:
+                    resultados[resultado] = resultados.get(resultado, 0) + 1
+            tiempos.sort()
+            print(f"{pasada}: {len(ediciones)} en {len(lotes)} peticiones")
+            print(f"   Resultados: {resultados}")
+            print(f"   Latencia por petición: p50 {tiempos[len(tiempos) // 2] * 1000:.1f} ms, "
+                  f"máx {tiempos[-1] * 1000:.1f} ms")
+            resumen[pasada] = resultados
+
+        estado = enviar(args.url, args.token, RUTA_ESTADO)
+        print(f"Contadores del servidor: {estado['contadores']}")
+    except urllib.error.HTTPError as e:
+        print(f"❌ El servidor respondió {e.code}: {e.read().decode('utf-8', 'replace')}")
+        sys.exit(1)
+    except urllib.error.URLError as e:
+        print(f"❌ No se pudo conectar a {args.url}: {e.reason}")
+        sys.exit(1)
+
+    # Las repeticiones no deben aplicar nada
+    if resumen["Repeticiones"].get('aplicado'):
+        print("❌ Algunas repeticiones se aplicaron de nuevo")
+        sys.exit(1)
+    print("✅ Las repeticiones no modificaron el índice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del buscador están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheets_falso import ClienteSheetsFalso
+from instantanea import descargar_instantanea, HojaRRV, InstantaneaRRV
+
+
+def instantanea_falsa(hojas=2, pestanas=2, filas=400):
+    """Instantánea de un Google Sheets falso: siempre los mismos datos, con algunas filas copiadas entre pestañas"""
+    return descargar_instantanea(ClienteSheetsFalso(hojas, pestanas, filas))
+
+
+def copiar_instantanea(instantanea):
+    """Otra instantánea con las mismas filas (los índices modifican las listas de filas de sus pestañas)"""
+    return InstantaneaRRV([
+        HojaRRV(hoja.hoja, hoja.pestana, hoja.esquema.encabezados, list(hoja.filas)) for hoja in instantanea.hojas
+    ])
+
+
+def datos(registros):
+    """Lo que ve el operador de una lista de registros: ubicación, valores y copias, en orden"""
+    return [
+        (registro.hoja, registro.pestana, registro.fila, registro.datos,
+         sorted(tuple(fuente) for fuente in registro.fuentes or ()))
+        for registro in registros
+    ]
+
+
+def valores_campos(indice_campos):
+    return {
+        campo: {valor: list(filas) for valor, filas in valores.items()}
+        for campo, valores in indice_campos.valores.items()
+    }
+
+
+def assert_indices_iguales(a, b):
+    indice_a, duplicada_de_a, estadisticas_a, campos_a = a
+    indice_b, duplicada_de_b, estadisticas_b, campos_b = b
+    assert indice_a.ubicaciones == indice_b.ubicaciones
+    assert indice_a.canonicas == indice_b.canonicas
+    assert indice_a.recientes == indice_b.recientes
+    assert duplicada_de_a == duplicada_de_b
+    assert estadisticas_a == estadisticas_b
+    assert valores_campos(campos_a) == valores_campos(campos_b)
+    assert [list(marcas) for marcas in campos_a.marcas] == [list(marcas) for marcas in campos_b.marcas]
+    claves = indice_a.buscar_claves('A')
+    assert datos(indice_a.historial(claves, 50)[0]) == datos(indice_b.historial(claves, 50)[0])
+
+
+@pytest.fixture
+def instantanea():
+    return instantanea_falsa()
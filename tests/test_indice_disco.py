@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+
+from ingesta_paralela import construir_indices
+from indice_disco import guardar_indice, abrir_indice
+from registros import periodo_marcas
+
+from conftest import datos
+
+CONSULTAS = ['ABC', 'A', '1', 'Z9', 'QQQ-000']
+PERIODOS = [None, periodo_marcas(date(2021, 1, 1), date(2023, 6, 30)), periodo_marcas(date(2025, 1, 1), None)]
+
+
+@pytest.fixture(params=[True, False], ids=['con_campos', 'sin_campos'])
+def indices(request, instantanea, tmp_path):
+    """(índice en memoria, el mismo leído de disco); sin IndiceCampos el archivo no lleva las marcas de las filas"""
+    indice, _, _, indice_campos = construir_indices(instantanea, 1)
+    ruta = str(tmp_path / 'indice_placas.bin')
+    guardar_indice(indice, ruta, indice_campos if request.param else None)
+    return indice, abrir_indice(ruta)
+
+
+def test_mismas_claves(indices):
+    memoria, disco = indices
+    assert disco.total_placas() == memoria.total_placas()
+    for consulta in CONSULTAS:
+        assert disco.buscar_claves(consulta) == memoria.buscar_claves(consulta)
+
+
+@pytest.mark.parametrize('periodo', PERIODOS)
+def test_mismo_historial(indices, periodo):
+    memoria, disco = indices
+    for consulta in CONSULTAS:
+        claves = memoria.buscar_claves(consulta)
+        for limite in (None, 1, 25):
+            registros_memoria, total_memoria = memoria.historial(claves, limite, periodo)
+            registros_disco, total_disco = disco.historial(claves, limite, periodo)
+            assert datos(registros_disco) == datos(registros_memoria)
+            assert total_disco == total_memoria
+            registros_disco, total_disco = disco.historial(claves, limite, periodo, contar=False)
+            assert datos(registros_disco) == datos(memoria.historial(claves, limite, periodo, contar=False)[0])
+            assert total_disco == (None if limite else total_memoria)
+        assert disco.contar_registros(claves, periodo) == memoria.contar_registros(claves, periodo)
+
+
+def test_el_historial_solo_lee_las_filas_de_la_pagina(indices, monkeypatch):
+    memoria, disco = indices
+    if not len(disco._marcas):
+        pytest.skip("sin marcas las fechas salen de las filas mismas")
+    claves = memoria.buscar_claves('A')
+    total = disco.historial(claves)[1]
+    leidas = []
+    fila = disco._fila
+    monkeypatch.setattr(disco, '_fila', lambda fila_global: leidas.append(fila_global) or fila(fila_global))
+    registros, total_pagina = disco.historial(claves, 10)
+    assert total_pagina == total > 100
+    # Las 10 filas de la página y las copias con sus mismas fechas
+    assert len(leidas) <= 10 + sum(len(registro.fuentes or ()) for registro in registros)
+
+
+@pytest.mark.parametrize('periodo', PERIODOS)
+def test_el_total_de_una_consulta_amplia_cuenta_el_periodo_sin_copias(indices, periodo, monkeypatch):
+    import app
+    from planificador import planificar
+    # La instantánea de prueba tiene pocas placas: una consulta es amplia con más de 10
+    monkeypatch.setattr(app, 'planificar', lambda claves: planificar(claves, 10))
+    for indice in indices:
+        claves = indice.buscar_claves('A')
+        plan, estado, total = app.estado_placas(indice, claves, periodo)
+        assert plan.amplia and len(estado) <= plan.limite
+        assert total == len(indice.historial(claves, None, periodo)[0])
+
+
+@pytest.mark.parametrize('periodo', PERIODOS)
+def test_mismo_estado_actual(indices, periodo):
+    memoria, disco = indices
+    for consulta in CONSULTAS:
+        claves = memoria.buscar_claves(consulta)
+        assert disco.contar_ubicaciones(claves) == memoria.contar_ubicaciones(claves)
+        for limite in (None, 10):
+            assert datos(disco.estado_actual(claves, periodo, limite)) == datos(memoria.estado_actual(claves, periodo, limite))
+
+
+def test_archivo_inexistente_o_invalido(tmp_path):
+    assert abrir_indice(str(tmp_path / 'no_existe.bin')) is None
+    ruta = tmp_path / 'roto.bin'
+    ruta.write_bytes(b'no es un indice')
+    assert abrir_indice(str(ruta)) is None
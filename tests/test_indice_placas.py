@@ -0,0 +1,53 @@
+import pytest
+
+from instantanea import HojaRRV, InstantaneaRRV
+from indice_placas import IndicePlacas, COSTO_CONFUSION, COSTO_EDICION
+
+ENCABEZADOS = ['Placa', 'Fecha', 'Proyecto', 'Empresa', 'Sistema']
+PLACAS = ['ABC123', 'A8C123', 'ABC124', 'ABD123', 'B0S555', 'BOS555', 'XYZ999', 'IS0101']
+
+
+@pytest.fixture
+def indice():
+    filas = [[placa, f"{dia:02d}/03/2024", 'PROYECTO', 'EMPRESA', 'GPS'] for dia, placa in enumerate(PLACAS, 1)]
+    return IndicePlacas(InstantaneaRRV([HojaRRV('RRV 1', 'Hoja 1', ENCABEZADOS, filas)]))
+
+
+def claves(candidatas):
+    return [clave for clave, _, _ in candidatas]
+
+
+@pytest.mark.parametrize('buscada, esperada', [
+    ('ABCI23', 'ABC123'),
+    ('8OS555', 'BOS555'),
+    ('ISO1O1', 'IS0101'),
+    ('A8CIZ4', 'ABC124'),
+])
+def test_las_confusiones_cuestan_media_edicion(indice, buscada, esperada):
+    candidatas = indice.buscar_aproximada(buscada)
+    # Cada par O/0, I/1, B/8, S/5 o Z/2 cuesta media edición: la placa con solo confusiones queda primera
+    confusiones = sum(a != b for a, b in zip(buscada, esperada))
+    assert candidatas[0][:2] == (esperada, confusiones * COSTO_CONFUSION / 2)
+    assert all(distancia > candidatas[0][1] for _, distancia, _ in candidatas[1:])
+
+
+def test_la_coincidencia_exacta_va_primero(indice):
+    candidatas = indice.buscar_aproximada('abc-123')
+    assert candidatas[0] == ('ABC123', 0, 1)
+    # Después la que difiere en una confusión y recién entonces las que difieren en un carácter cualquiera
+    assert claves(candidatas)[1] == 'A8C123'
+    assert set(claves(candidatas)[2:4]) == {'ABC124', 'ABD123'}
+    assert [distancia for _, distancia, _ in candidatas] == sorted(distancia for _, distancia, _ in candidatas)
+
+
+@pytest.mark.parametrize('buscada', ['ABC12', 'AB123', 'BC123'])
+def test_un_caracter_faltante(indice, buscada):
+    candidatas = indice.buscar_aproximada(buscada)
+    distancias = {clave: distancia for clave, distancia, _ in candidatas}
+    assert distancias['ABC123'] == COSTO_EDICION / 2
+    assert distancias['ABC123'] == min(distancias.values())
+
+
+def test_sin_parecidas(indice):
+    assert indice.buscar_aproximada('QQQ777') == []
+    assert indice.buscar_aproximada('--') == []
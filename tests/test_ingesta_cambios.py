@@ -0,0 +1,179 @@
+import pytest
+
+import ingesta_cambios
+from ingesta_cambios import CambioInvalido, validar_cambio, aplicar_cambio
+from ingesta_paralela import construir_indices
+from servicio_indice import ServicioIndice
+
+from conftest import copiar_instantanea, datos
+
+
+@pytest.fixture
+def servicio(instantanea):
+    """Servicio sin Google Sheets ni archivos, con los índices de la instantánea falsa ya cargados"""
+    servicio = ServicioIndice(None, ruta_indice=None, compartido=False, ruta_instantanea=None)
+    servicio.indice, _, _, servicio.indice_campos = construir_indices(instantanea, 1)
+    return servicio
+
+
+def cambio(hoja, fila, valores, marca=None):
+    return validar_cambio({'hoja': hoja.hoja, 'pestana': hoja.pestana, 'fila': fila, 'valores': valores, 'marca': marca})
+
+
+def fila_editada(hoja, idx_fila, placa):
+    valores = list(hoja.filas[idx_fila])
+    valores[hoja.esquema.columnas_placa[0]] = placa
+    return valores
+
+
+def placa_de(hoja, idx_fila):
+    fila = hoja.filas[idx_fila] if idx_fila < len(hoja.filas) else ()
+    col_placa = hoja.esquema.columnas_placa[0]
+    return fila[col_placa] if col_placa < len(fila) else ''
+
+
+def assert_igual_a_reconstruir(servicio, consultas):
+    """El índice modificado por la ingesta responde igual que uno construido desde cero con las mismas filas"""
+    indice, duplicada_de, _, indice_campos = construir_indices(copiar_instantanea(servicio.indice), 1)
+    for consulta in consultas:
+        claves = indice.buscar_claves(consulta)
+        assert servicio.indice.buscar_claves(consulta) == claves
+        assert datos(servicio.indice.historial(claves)[0]) == datos(indice.historial(claves)[0])
+        assert datos(servicio.indice.estado_actual(claves)) == datos(indice.estado_actual(claves))
+        assert servicio.indice.contar_registros(claves) == indice.contar_registros(claves)
+    assert {clave: sorted(ubicaciones) for clave, ubicaciones in servicio.indice.ubicaciones.items()} == {
+        clave: sorted(ubicaciones) for clave, ubicaciones in indice.ubicaciones.items()
+    }
+    assert servicio.indice.recientes == indice.recientes
+    assert servicio.indice.duplicada_de == duplicada_de
+    assert servicio.indice.copias == indice.copias
+    assert servicio.indice.huellas == indice.huellas
+    for filtros in ({'empresa': 'EMPRESA 1'}, {'sistema': 'GPS'}, {'proyecto': 'PROYECTO 2'}):
+        assert list(servicio.indice_campos.filtrar(filtros)) == list(indice_campos.filtrar(filtros))
+
+
+def test_repetir_un_cambio_con_la_misma_marca_no_hace_nada(servicio):
+    hoja = servicio.indice.hojas[0]
+    editado = cambio(hoja, 5, fila_editada(hoja, 3, 'NEW-001'), marca=100)
+    assert servicio.receptor.recibir(editado) == 'aplicado'
+    generacion = servicio.generacion
+    filas = list(hoja.filas)
+
+    assert servicio.receptor.recibir(editado) == 'repetido'
+    # Una marca anterior llega tarde: tampoco se aplica
+    assert servicio.receptor.recibir(cambio(hoja, 5, fila_editada(hoja, 3, 'OLD-001'), marca=99)) == 'repetido'
+    assert servicio.generacion == generacion
+    assert hoja.filas == filas
+    assert servicio.indice.buscar_claves('OLD001') == []
+    assert servicio.receptor.contadores == {'aplicado': 1, 'repetido': 2}
+
+
+def test_las_marcas_sobreviven_a_la_sincronizacion(servicio, instantanea, monkeypatch):
+    hoja = servicio.indice.hojas[0]
+    assert servicio.receptor.recibir(cambio(hoja, 5, fila_editada(hoja, 3, 'NEW-009'), marca=100)) == 'aplicado'
+    monkeypatch.setattr('servicio_indice.listar_hojas_rrv', lambda gc: instantanea.hojas)
+    monkeypatch.setattr('servicio_indice.descargar_instantanea', lambda gc, al_avanzar, hojas: instantanea)
+    servicio.gc = object()
+    assert servicio.sincronizar()
+
+    # El reintento de una edición anterior llega después de la sincronización: no vuelve atrás la fila
+    hoja = servicio.indice.hojas[0]
+    filas = list(hoja.filas)
+    assert servicio.receptor.recibir(cambio(hoja, 5, fila_editada(hoja, 3, 'OLD-009'), marca=99)) == 'repetido'
+    assert hoja.filas == filas
+    assert servicio.indice.buscar_claves('OLD009') == []
+
+
+def test_aplicar_dos_veces_deja_el_mismo_estado(servicio):
+    hoja = servicio.indice.hojas[1]
+    editado = cambio(hoja, 10, fila_editada(hoja, 10 - 2, 'NEW-002'))
+    assert aplicar_cambio(servicio.indice, servicio.indice_campos, editado) == 'aplicado'
+    ubicaciones = {clave: list(valor) for clave, valor in servicio.indice.ubicaciones.items()}
+    assert aplicar_cambio(servicio.indice, servicio.indice_campos, editado) == 'sin_cambios'
+    assert servicio.indice.ubicaciones == ubicaciones
+
+
+def test_el_resultado_es_igual_a_reconstruir(servicio):
+    primera, segunda, ultima = servicio.indice.hojas[0], servicio.indice.hojas[1], servicio.indice.hojas[-1]
+    # El original de un grupo de copias de la carga (la instantánea falsa copia filas de la primera pestaña en la última)
+    original = (0, 3)
+    copia = servicio.indice.copias[original][0]
+    hoja_original = servicio.indice.hojas[original[0]]
+    cambios = [
+        # Otra placa en una fila existente
+        cambio(primera, 2, fila_editada(primera, 0, 'NEW-003'), marca=1),
+        # Una fila que pasa a ser copia de otra anterior
+        cambio(ultima, 3, list(primera.filas[5]), marca=1),
+        # Una fila que pasa a repetir una posterior: ella queda como original del grupo
+        cambio(primera, 4, list(segunda.filas[9]), marca=1),
+        # El original de un grupo deja de serlo: su primera copia toma su lugar
+        cambio(hoja_original, original[1] + 2, fila_editada(hoja_original, original[1], 'NEW-006'), marca=1),
+        # Una fila nueva más allá del final (las filas vacías del medio son copias entre sí) y la misma fila
+        # editada dos veces
+        cambio(primera, len(primera.filas) + 4, fila_editada(primera, 7, 'NEW-004'), marca=1),
+        cambio(primera, 2, fila_editada(primera, 0, 'NEW-005'), marca=2),
+    ]
+    # Todas las placas que tocan los cambios: las que tenían las filas antes y las que tienen después
+    placas = {'NEW003', 'NEW004', 'NEW005', 'NEW006'}
+    for editado in cambios:
+        hoja = servicio.indice.hojas[servicio.indice.posicion_hoja(editado['hoja'], editado['pestana'])]
+        placas.add(placa_de(hoja, editado['fila'] - 2))
+        assert servicio.receptor.recibir(editado) == 'aplicado'
+        placas.add(placa_de(hoja, editado['fila'] - 2))
+    for editado in cambios:
+        assert servicio.receptor.recibir(editado) == 'repetido'
+    assert servicio.indice.duplicada_de[(len(servicio.indice.hojas) - 1, 1)] == (0, 5)
+    assert servicio.indice.duplicada_de[(1, 9)] == (0, 2)
+    assert copia not in servicio.indice.duplicada_de
+    assert_igual_a_reconstruir(servicio, sorted(placa for placa in placas if placa))
+
+
+def test_los_cambios_sin_indice_esperan_a_la_sincronizacion(instantanea, monkeypatch):
+    servicio = ServicioIndice(None, ruta_indice=None, compartido=False, ruta_instantanea=None)
+    hoja = instantanea.hojas[0]
+    editado = cambio(hoja, 2, fila_editada(hoja, 0, 'NEW-007'), marca=1)
+    assert servicio.receptor.recibir(editado) == 'en_espera'
+    assert servicio.receptor.recibir(editado) == 'repetido'
+    monkeypatch.setattr(ingesta_cambios, 'MAXIMO_EN_ESPERA', 1)
+    assert servicio.receptor.recibir(cambio(hoja, 3, fila_editada(hoja, 1, 'NEW-008'), marca=1)) == 'indice_no_disponible'
+
+    # La sincronización instala el índice con los cambios en espera ya aplicados
+    monkeypatch.setattr('servicio_indice.listar_hojas_rrv', lambda gc: instantanea.hojas)
+    monkeypatch.setattr('servicio_indice.descargar_instantanea', lambda gc, al_avanzar, hojas: instantanea)
+    servicio.gc = object()
+    assert servicio.sincronizar()
+    assert servicio.receptor.en_espera == []
+    assert servicio.indice.buscar_claves('NEW007') == ['NEW007']
+    assert servicio.indice.buscar_claves('NEW008') == []
+
+
+def test_encabezados_y_pestanas_desconocidas_piden_sincronizar(servicio):
+    hoja = servicio.indice.hojas[0]
+    assert servicio.receptor.recibir(cambio(hoja, 1, ['Placa', 'Fecha'])) == 'encabezados'
+    otra = validar_cambio({'hoja': 'RRV 9', 'pestana': 'Hoja 1', 'fila': 2, 'valores': ['ABC-123']})
+    assert servicio.receptor.recibir(otra) == 'pestana_desconocida'
+    assert servicio._sincronizacion_pedida
+
+
+def test_una_fila_muy_lejos_del_final_pide_sincronizar(servicio):
+    hoja = servicio.indice.hojas[0]
+    filas = len(hoja.filas)
+    lejana = cambio(hoja, filas + 2 + ingesta_cambios.MAXIMO_FILAS_NUEVAS, ['ABC-123'])
+    assert servicio.receptor.recibir(lejana) == 'fila_fuera_de_rango'
+    assert len(hoja.filas) == filas
+    assert servicio._sincronizacion_pedida
+
+
+@pytest.mark.parametrize('datos_cambio', [
+    [],
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 2},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 2, 'valores': 'ABC-123'},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 0, 'valores': ['ABC-123']},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 'dos', 'valores': ['ABC-123']},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 10 ** 10, 'valores': ['ABC-123']},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 2, 'valores': ['ABC-123'], 'marca': True},
+    {'hoja': 'RRV 1', 'pestana': 'Hoja 1', 'fila': 2, 'valores': ['ABC-123'], 'marca': '5'},
+])
+def test_cambios_invalidos(datos_cambio):
+    with pytest.raises(CambioInvalido):
+        validar_cambio(datos_cambio)
@@ -0,0 +1,29 @@
+import ingesta_paralela
+from ingesta_paralela import construir_indices
+from indice_placas import IndicePlacas
+from indice_campos import IndiceCampos
+from duplicados import agrupar_duplicados
+
+from conftest import copiar_instantanea, assert_indices_iguales
+
+
+def test_procesos_igual_que_un_proceso(instantanea, monkeypatch):
+    serie = construir_indices(copiar_instantanea(instantanea), 1)
+    # Bloques chicos y sin umbral para que la instantánea de prueba se reparta entre los procesos
+    monkeypatch.setattr(ingesta_paralela, 'UMBRAL_FILAS_PARALELO', 0)
+    monkeypatch.setattr(ingesta_paralela, 'FILAS_POR_BLOQUE', 150)
+    assert len(list(ingesta_paralela._bloques(instantanea.hojas))) > len(instantanea.hojas)
+    paralelo = construir_indices(copiar_instantanea(instantanea), 2)
+    assert_indices_iguales(paralelo, serie)
+
+
+def test_bloques_igual_que_indexar_fila_por_fila(instantanea, monkeypatch):
+    monkeypatch.setattr(ingesta_paralela, 'FILAS_POR_BLOQUE', 150)
+    combinado = construir_indices(copiar_instantanea(instantanea), 1)
+
+    # El camino original: IndicePlacas recorre las filas y las copias se agrupan aparte
+    otra = copiar_instantanea(instantanea)
+    indice = IndicePlacas(otra)
+    duplicada_de, estadisticas = agrupar_duplicados(otra.hojas)
+    indice.marcar_duplicados(duplicada_de)
+    assert_indices_iguales(combinado, (indice, duplicada_de, estadisticas, IndiceCampos(otra.hojas, duplicada_de)))
@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from ingesta_cambios import aplicar_cambio, validar_cambio
+from ingesta_paralela import construir_indices
+from instantanea_columnar import exportar_instantanea, cargar_instantanea, indices_desde_instantanea
+from indice_disco import guardar_indice
+from servicio_indice import ServicioIndice
+
+from conftest import copiar_instantanea, datos, assert_indices_iguales
+
+
+@pytest.fixture(params=['instantanea.parquet', 'instantanea.arrow'])
+def ruta(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def test_ida_y_vuelta_conserva_las_filas(instantanea, ruta):
+    assert exportar_instantanea(instantanea.hojas, ruta, {'origen': 'prueba'}) == instantanea.total_filas()
+    cargada, _, metadatos = cargar_instantanea(ruta)
+    assert metadatos['extra'] == {'origen': 'prueba'}
+    assert [(hoja.hoja, hoja.pestana, hoja.esquema.encabezados) for hoja in cargada.hojas] == [
+        (hoja.hoja, hoja.pestana, hoja.esquema.encabezados) for hoja in instantanea.hojas
+    ]
+    for hoja_cargada, hoja in zip(cargada.hojas, instantanea.hojas):
+        assert len(hoja_cargada.filas) == len(hoja.filas)
+        assert [tuple(hoja_cargada.filas[i]) for i in range(len(hoja.filas))] == hoja.filas
+
+
+def test_indices_iguales_a_construirlos_desde_las_filas(instantanea, ruta):
+    exportar_instantanea(instantanea.hojas, ruta)
+    cargados = indices_desde_instantanea(ruta)[:4]
+    construidos = construir_indices(copiar_instantanea(instantanea), 1)
+    assert_indices_iguales(cargados, construidos)
+    for consulta in ('ABC', '1'):
+        claves = construidos[0].buscar_claves(consulta)
+        assert datos(cargados[0].estado_actual(claves)) == datos(construidos[0].estado_actual(claves))
+
+
+def test_ediciones_sobre_una_instantanea_cargada(instantanea, ruta):
+    exportar_instantanea(instantanea.hojas, ruta)
+    indice, _, _, indice_campos, _ = indices_desde_instantanea(ruta)
+    hoja = indice.hojas[0]
+    valores = list(hoja.filas[0])
+    valores[hoja.esquema.columnas_placa[0]] = 'NEW-040'
+    cambio = validar_cambio({'hoja': hoja.hoja, 'pestana': hoja.pestana, 'fila': 2, 'valores': valores})
+    assert aplicar_cambio(indice, indice_campos, cambio) == 'aplicado'
+    assert hoja.filas[0] == tuple(valores)
+    assert indice.buscar_claves('NEW040') == ['NEW040']
+
+    # Volver a exportar las filas editadas da los mismos índices que el índice modificado
+    exportar_instantanea(indice.hojas, ruta)
+    recargado = indices_desde_instantanea(ruta)[0]
+    assert recargado.buscar_claves('NEW040') == ['NEW040']
+    assert {clave: sorted(ubicaciones) for clave, ubicaciones in recargado.ubicaciones.items()} == {
+        clave: sorted(ubicaciones) for clave, ubicaciones in indice.ubicaciones.items()
+    }
+
+
+def test_exportar_desde_el_indice_en_disco(instantanea, ruta, tmp_path):
+    # Procesos lectores del modo compartido o arranque desde el archivo: no hay filas en memoria
+    indice, _, _, indice_campos = construir_indices(copiar_instantanea(instantanea), 1)
+    ruta_indice = str(tmp_path / 'indice_placas.bin')
+    guardar_indice(indice, ruta_indice, indice_campos)
+    servicio = ServicioIndice(None, ruta_indice=ruta_indice, compartido=False, ruta_instantanea=None)
+    assert servicio.indice is None and servicio.indice_disco is not None
+
+    assert exportar_instantanea(servicio.copiar_hojas(), ruta) == instantanea.total_filas()
+    cargada = cargar_instantanea(ruta)[0]
+    for hoja_cargada, hoja in zip(cargada.hojas, instantanea.hojas):
+        assert [tuple(hoja_cargada.filas[i]) for i in range(len(hoja.filas))] == hoja.filas
+
+
+def test_la_copia_no_ve_ediciones_posteriores(instantanea, ruta):
+    servicio = ServicioIndice(None, ruta_indice=None, compartido=False, ruta_instantanea=None)
+    servicio.indice, _, _, servicio.indice_campos = construir_indices(copiar_instantanea(instantanea), 1)
+    hojas = servicio.copiar_hojas()
+    hoja = servicio.indice.hojas[0]
+    valores = list(hoja.filas[0])
+    valores[hoja.esquema.columnas_placa[0]] = 'NEW-041'
+    cambio = validar_cambio({'hoja': hoja.hoja, 'pestana': hoja.pestana, 'fila': 2, 'valores': valores})
+    assert servicio.receptor.recibir(cambio) == 'aplicado'
+
+    exportar_instantanea(hojas, ruta)
+    assert cargar_instantanea(ruta)[0].hojas[0].filas[0] == instantanea.hojas[0].filas[0]
@@ -0,0 +1,86 @@
+import pytest
+
+import servicio_indice
+from candado_sincronizacion import CandadoSincronizacion
+from ingesta_cambios import validar_cambio
+from ingesta_paralela import construir_indices
+from servicio_indice import ServicioIndice
+
+from conftest import datos
+
+
+@pytest.fixture
+def ruta_indice(tmp_path):
+    return str(tmp_path / 'indice_placas.bin')
+
+
+def test_un_solo_proceso_toma_el_candado(ruta_indice):
+    primero = CandadoSincronizacion(ruta_indice + '.lock')
+    segundo = CandadoSincronizacion(ruta_indice + '.lock')
+    assert primero.intentar_tomar()
+    assert not segundo.intentar_tomar()
+    primero.soltar()
+    assert segundo.intentar_tomar()
+    assert not primero.intentar_tomar()
+    segundo.soltar()
+
+
+def test_el_lector_ve_el_indice_y_las_ediciones_del_lider(instantanea, ruta_indice):
+    lider = ServicioIndice(None, ruta_indice=ruta_indice, compartido=True, ruta_instantanea=None)
+    assert lider._candado.intentar_tomar()
+    lider.indice, _, _, lider.indice_campos = construir_indices(instantanea, 1)
+    lider._guardar()
+
+    lector = ServicioIndice(None, ruta_indice=ruta_indice, compartido=True, ruta_instantanea=None)
+    assert not lector._candado.intentar_tomar()
+    assert lider.es_lider() and not lector.es_lider()
+    assert lector.indice is None and lector.indice_disco is not None
+    for consulta in ('ABC', '1'):
+        claves = lider.indice.buscar_claves(consulta)
+        assert lector.indice_actual().buscar_claves(consulta) == claves
+        assert datos(lector.indice_actual().historial(claves, 30)[0]) == datos(lider.indice.historial(claves, 30)[0])
+
+    # Una edición recibida por el líder llega al lector cuando el líder vuelve a guardar el archivo
+    hoja = lider.indice.hojas[0]
+    valores = list(hoja.filas[0])
+    valores[hoja.esquema.columnas_placa[0]] = 'NEW-036'
+    cambio = validar_cambio({'hoja': hoja.hoja, 'pestana': hoja.pestana, 'fila': 2, 'valores': valores, 'marca': 1})
+    assert lider.receptor.recibir(cambio) == 'aplicado'
+    generacion = lector.generacion
+    lector._seguir_disco()
+    assert lector.indice_actual().buscar_claves('NEW036') == []
+    lider._guardar()
+    lector._seguir_disco()
+    assert lector.generacion > generacion
+    assert lector.indice_actual().buscar_claves('NEW036') == ['NEW036']
+    lider._candado.soltar()
+
+
+def test_guardar_escribe_sin_lock_y_no_particiona_con_cambios_en_el_medio(instantanea, ruta_indice, monkeypatch):
+    servicio = ServicioIndice(None, ruta_indice=ruta_indice, compartido=False, ruta_instantanea=None)
+    servicio.indice, _, _, servicio.indice_campos = construir_indices(instantanea, 1)
+    hoja = servicio.indice.hojas[0]
+    valores = list(hoja.filas[0])
+    valores[hoja.esquema.columnas_placa[0]] = 'NEW-029'
+    cambio = validar_cambio({'hoja': hoja.hoja, 'pestana': hoja.pestana, 'fila': 2, 'valores': valores, 'marca': 1})
+
+    guardar_indice = servicio_indice.guardar_indice
+
+    def guardar_con_una_edicion(*args):
+        # Con lock_datos tomado la ingesta esperaría a que termine la escritura
+        assert not servicio.lock_datos.locked()
+        assert servicio.receptor.recibir(cambio) == 'aplicado'
+        guardar_indice(*args)
+
+    monkeypatch.setattr(servicio_indice, 'MESES_CALIENTES', 1)
+    monkeypatch.setattr(servicio_indice, 'guardar_indice', guardar_con_una_edicion)
+    servicio._guardar()
+    # El archivo es la copia de antes de la edición: las filas siguen en memoria y queda pendiente otro guardado
+    assert servicio.particiones is None and servicio._cambios_sin_guardar
+    assert servicio_indice.abrir_indice(ruta_indice).buscar_claves('NEW029') == []
+
+    monkeypatch.setattr(servicio_indice, 'guardar_indice', guardar_indice)
+    servicio._guardar()
+    assert servicio.particiones is not None and not servicio._cambios_sin_guardar
+    assert servicio_indice.abrir_indice(ruta_indice).buscar_claves('NEW029') == ['NEW029']
+    assert servicio.indice.buscar_claves('NEW029') == ['NEW029']